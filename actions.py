@@ -20,8 +20,11 @@ Misha Schwartz, and Jaisie Sin
 === Module Description ===
 
 This file contains the different actions that can be made by a Player.
+
+pygame is only imported when ACTION_KEY or KEY_ACTION is first used, so that
+games without a display can be played without importing it.
 """
-import pygame
+from typing import Dict, Optional, Tuple
 
 # Actions that can be performed in the game
 ROTATE_CLOCKWISE = ('rotate', 1)
@@ -66,16 +69,36 @@ ACTION_PENALTY = {
     PASS: 0
 }
 
-ACTION_KEY = {
-    ROTATE_CLOCKWISE: pygame.K_d,
-    ROTATE_COUNTER_CLOCKWISE: pygame.K_a,
-    SWAP_HORIZONTAL: pygame.K_q,
-    SWAP_VERTICAL: pygame.K_e,
-    SMASH: pygame.K_SPACE,
-    COMBINE: pygame.K_c,
-    PAINT: pygame.K_r,
-    PASS: pygame.K_TAB
+# The names of the pygame constants for the keys that perform each action
+_ACTION_KEY_NAME = {
+    ROTATE_CLOCKWISE: 'K_d',
+    ROTATE_COUNTER_CLOCKWISE: 'K_a',
+    SWAP_HORIZONTAL: 'K_q',
+    SWAP_VERTICAL: 'K_e',
+    SMASH: 'K_SPACE',
+    COMBINE: 'K_c',
+    PAINT: 'K_r',
+    PASS: 'K_TAB'
 }
 
-# Create a dictionary that is ACTION_KEY inverted
-KEY_ACTION = {value: key for key, value in ACTION_KEY.items()}
+
+def __getattr__(name: str) -> Dict:
+    """Return ACTION_KEY, which maps each action to the pygame key that
+    performs it, or KEY_ACTION, which is ACTION_KEY inverted.
+
+    Both are created the first time either of them is used.
+    """
+    if name not in ('ACTION_KEY', 'KEY_ACTION'):
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+    import pygame
+
+    action_key: Dict[Tuple[str, Optional[int]], int] = {
+        action: getattr(pygame, key_name)
+        for action, key_name in _ACTION_KEY_NAME.items()
+    }
+    globals()['ACTION_KEY'] = action_key
+    # Create a dictionary that is ACTION_KEY inverted
+    globals()['KEY_ACTION'] = {value: key for key, value in action_key.items()}
+
+    return globals()[name]
@@ -0,0 +1,79 @@
+"""CSC148 Assignment 2
+
+=== CSC148 Winter 2020 ===
+Department of Computer Science,
+University of Toronto
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+Authors: Diane Horton, David Liu, Mario Badr, Sophia Huynh, Misha Schwartz,
+and Jaisie Sin
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) Diane Horton, David Liu, Mario Badr, Sophia Huynh,
+Misha Schwartz, and Jaisie Sin.
+
+=== Module Description ===
+
+This file contains a benchmark of how long it takes a new Python process to
+import the modules of the game, e.g.:
+    python bench_startup.py --runs 20 block,goal,player pygame
+"""
+from __future__ import annotations
+from typing import List, Tuple
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# The program run in each new process. It prints the number of seconds the
+# imports took, and whether pygame was imported.
+_PROGRAM = '''
+import sys, time
+start = time.perf_counter()
+import {modules}
+print(time.perf_counter() - start, 'pygame' in sys.modules)
+'''
+
+
+def time_import(modules: str, runs: int) -> Tuple[List[float], bool]:
+    """Return the number of seconds it took to import the comma-separated
+    <modules> in each of <runs> new processes, and whether importing them
+    imported pygame.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    imports_pygame = False
+
+    for dummy in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', _PROGRAM.format(modules=modules)],
+            cwd=directory, env=dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT='1'),
+            capture_output=True, text=True, check=True).stdout
+        seconds, pygame_imported = output.split()
+        times.append(float(seconds))
+        imports_pygame = pygame_imported == 'True'
+
+    return times, imports_pygame
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Time how long new processes take to import modules.')
+    parser.add_argument('imports', nargs='*',
+                        default=['block,goal,player', 'engine,tournament',
+                                 'blocky', 'pygame'],
+                        help='comma-separated modules to import together')
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    for module_list in args.imports:
+        results, uses_pygame = time_import(module_list, args.runs)
+        print(f'{module_list}: median {statistics.median(results) * 1000:.1f} '
+              f'ms, min {min(results) * 1000:.1f} ms over {args.runs} runs'
+              f'{", imports pygame" if uses_pygame else ""}')
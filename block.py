@@ -29,10 +29,13 @@ import math
 from settings import colour_name, COLOUR_LIST
 
 
-def generate_board(max_depth: int, size: int) -> Block:
+def generate_board(max_depth: int, size: int,
+                   rng: Optional[random.Random] = None) -> Block:
     """Return a new game board with a depth of <max_depth> and dimensions of
     <size> by <size>.
 
+    The board is generated using <rng>, or the random module if <rng> is None.
+
     >>> board = generate_board(3, 750)
     >>> board.max_depth
     3
@@ -41,12 +44,45 @@ def generate_board(max_depth: int, size: int) -> Block:
     >>> len(board.children) == 4
     True
     """
-    board = Block((0, 0), size, random.choice(COLOUR_LIST), 0, max_depth)
-    board.smash()
+    if rng is None:
+        rng = random
+
+    board = Block((0, 0), size, rng.choice(COLOUR_LIST), 0, max_depth)
+    board.smash(rng)
 
     return board
 
 
+def _leaf_orbit(colour: Tuple[int, int, int]) -> Tuple[int, ...]:
+    """Return the dihedral hashes of a leaf Block with <colour>.
+
+    A leaf looks the same however it is rotated or reflected.
+    """
+    return (hash((0, colour)),) * 8
+
+
+def _parent_orbit(orbits: List[Tuple[int, ...]]) -> Tuple[int, ...]:
+    """Return the dihedral hashes of a Block whose children have the dihedral
+    hashes in <orbits>, in the usual order of children.
+
+    Index r of the result, for 0 <= r < 4, is the hash of the Block after it
+    is rotated clockwise r times. Index 4 + r is the hash of the Block after it
+    is reflected left to right, then rotated clockwise r times.
+    """
+    ur, ul, ll, lr = orbits
+    # Rotating r times moves the child at index (i + r) % 4 to index i, and
+    # reflecting swaps the upper-right with the upper-left child, and the
+    # lower-left with the lower-right child.
+    return (hash((1, ur[0], ul[0], ll[0], lr[0])),
+            hash((1, ul[1], ll[1], lr[1], ur[1])),
+            hash((1, ll[2], lr[2], ur[2], ul[2])),
+            hash((1, lr[3], ur[3], ul[3], ll[3])),
+            hash((1, ul[4], ur[4], lr[4], ll[4])),
+            hash((1, ur[5], lr[5], ll[5], ul[5])),
+            hash((1, lr[6], ll[6], ul[6], ur[6])),
+            hash((1, ll[7], ul[7], ur[7], lr[7])))
+
+
 class Block:
     """A square Block in the Blocky game, represented as a tree.
 
@@ -91,13 +127,36 @@ class Block:
     - If this Block has no children:
         - its colour is not None.
     - level <= max_depth
+
+    Blocks cache information about their descendants, so once a Block is part
+    of a board, it should only be changed using its methods (smash, swap,
+    rotate, paint and combine).
     """
+    # === Private Attributes ===
+    # _parent:
+    #   The Block that has this Block as a child, or None if this Block is
+    #   the root of the board or has not been attached to a parent yet.
+    # _orbit:
+    #   The cached dihedral hashes of this Block, as computed by
+    #   _parent_orbit, or None if they need to be recomputed.
+    # _squares:
+    #   The cached list of squares returned by squares(), or None if it needs
+    #   to be rebuilt. A cached list is replaced, never mutated, so lists that
+    #   were returned before a change stay valid.
+    #
+    # == Representation Invariants concerning the private attributes ==
+    #   - If _orbit is not None, then _orbit is not None for every descendant.
+    #   - If _squares is not None, then _squares is not None for every
+    #     descendant.
     position: Tuple[int, int]
     size: int
     colour: Optional[Tuple[int, int, int]]
     level: int
     max_depth: int
     children: List[Block]
+    _parent: Optional[Block]
+    _orbit: Optional[Tuple[int, ...]]
+    _squares: Optional[List[Tuple[Tuple[int, int, int], Tuple[int, int], int]]]
 
     def __init__(self, position: Tuple[int, int], size: int,
                  colour: Optional[Tuple[int, int, int]], level: int,
@@ -117,6 +176,9 @@ class Block:
         self.level = level
         self.max_depth = max_depth
         self.children = []
+        self._parent = None
+        self._orbit = None
+        self._squares = None
 
     def __str__(self) -> str:
         """Return this Block in a string format.
@@ -184,6 +246,7 @@ class Block:
         Block.
         """
         self.position = position
+        self._squares = None
 
         if len(self.children) > 0:
             children_pos = self._children_positions()
@@ -200,9 +263,9 @@ class Block:
         """
         return self.level != self.max_depth and len(self.children) == 0
 
-    def smash(self) -> bool:
+    def smash(self, rng: Optional[random.Random] = None) -> bool:
         """Sub-divide this block so that it has four randomly generated
-        children.
+        children, using <rng>, or the random module if <rng> is None.
 
         If this Block's level is <max_depth>, do nothing. If this block has
         children, do nothing.
@@ -212,21 +275,26 @@ class Block:
         if not self.smashable():
             return False
         else:
+            if rng is None:
+                rng = random
+
             self.colour = None
             position = self._children_positions()
             size = self._child_size()
 
             for i in range(len(position)):
                 self.children.append(Block(position[i], size,
-                                           random.choice(COLOUR_LIST),
+                                           rng.choice(COLOUR_LIST),
                                            self.level + 1,
                                            self.max_depth))
+                self.children[i]._parent = self
 
-                r = random.random()
+                r = rng.random()
                 if r < math.exp(-0.25 * self.level) and \
                         self.children[i].smashable():
-                    self.children[i].smash()
+                    self.children[i].smash(rng)
 
+            self._invalidate()
             return True
 
     def swap(self, direction: int) -> bool:
@@ -255,6 +323,7 @@ class Block:
                 self.children[3] = x[0]
 
             self._update_children_positions(self.position)
+            self._invalidate()
             return True
 
     def rotate(self, direction: int) -> bool:
@@ -285,6 +354,7 @@ class Block:
                 for child in self.children:
                     child.rotate(direction)
 
+            self._invalidate()
             return True
 
     def paint(self, colour: Tuple[int, int, int]) -> bool:
@@ -295,6 +365,7 @@ class Block:
         """
         if self.max_depth == self.level and self.colour != colour:
             self.colour = colour
+            self._invalidate()
             return True
 
         return False
@@ -322,6 +393,7 @@ class Block:
 
             self.children = []
             self.colour = x
+            self._invalidate()
             return True
 
     def _find_majority_colour(self) -> Optional[Tuple[int, int, int]]:
@@ -373,10 +445,140 @@ class Block:
         else:
             new_copy.children = []
             for child in self.children:
-                new_copy.children.append(child.create_copy())
+                child_copy = child.create_copy()
+                child_copy._parent = new_copy
+                new_copy.children.append(child_copy)
 
             return new_copy
 
+    def _invalidate(self) -> None:
+        """Forget the cached information about this Block and its ancestors,
+        after this Block has changed.
+        """
+        self._orbit = None
+        self._squares = None
+
+        # An ancestor can only have cached information if its child has
+        block = self._parent
+        while block is not None and \
+                (block._orbit is not None or block._squares is not None):
+            block._orbit = None
+            block._squares = None
+            block = block._parent
+
+    def squares(self) -> List[Tuple[Tuple[int, int, int], Tuple[int, int],
+                                    int]]:
+        """Return a list of tuples describing all of the squares to be drawn
+        in order to render this Block: the colour, position and size of every
+        undivided Block, in that order.
+
+        The list is cached until this Block or one of its descendants changes,
+        and only the lists of the changed Blocks are rebuilt. It is shared, so
+        it must not be mutated.
+        """
+        if self._squares is None:
+            if len(self.children) == 0:
+                self._squares = [(self.colour, self.position, self.size)]
+            else:
+                squares = []
+                for child in self.children:
+                    child._parent = self
+                    squares.extend(child.squares())
+                self._squares = squares
+
+        return self._squares
+
+    def _dihedral_hashes(self) -> Tuple[int, ...]:
+        """Return the hashes of this Block under each rotation and reflection,
+        in the order described by _parent_orbit.
+
+        Two Blocks that are equal apart from their position have the same
+        hashes.
+        """
+        if self._orbit is None:
+            if len(self.children) == 0:
+                self._orbit = _leaf_orbit(self.colour)
+            else:
+                orbits = []
+                for child in self.children:
+                    child._parent = self
+                    orbits.append(child._dihedral_hashes())
+                self._orbit = _parent_orbit(orbits)
+
+        return self._orbit
+
+    def structure_hash(self) -> int:
+        """Return a hash of the colours and shape of this Block and all its
+        descendants, disregarding its position.
+        """
+        return self._dihedral_hashes()[0]
+
+    def canonical_form(self) -> int:
+        """Return a hash of the colours and shape of this Block and all its
+        descendants that is the same for every rotation or reflection of this
+        Block.
+        """
+        return min(self._dihedral_hashes())
+
+    def _hashes_after(self, action: Tuple[str, Optional[int]],
+                      colour: Tuple[int, int, int]) -> \
+            Optional[Tuple[int, ...]]:
+        """Return the dihedral hashes this Block would have after doing
+        <action> on it, painting with <colour>, without changing it.
+
+        Return None if <action> would not be performed, or if its result is
+        random.
+        """
+        kind, direction = action
+        hashes = self._dihedral_hashes()
+
+        if kind == 'rotate' and self.colour is None and self.children != []:
+            # A rotation of a reflection is a reflection rotated the other way
+            turn = 1 if direction == 1 else -1
+            return tuple([hashes[(r + turn) % 4] for r in range(4)] +
+                         [hashes[4 + (r - turn) % 4] for r in range(4)])
+        elif kind == 'swap' and self.colour is None and self.children != []:
+            order = [1, 0, 3, 2] if direction == 0 else [3, 2, 1, 0]
+            return _parent_orbit([self.children[i]._dihedral_hashes()
+                                  for i in order])
+        elif kind == 'paint' and self.max_depth == self.level and \
+                self.colour != colour:
+            return _leaf_orbit(colour)
+        elif kind == 'combine' and self.level == self.max_depth - 1 and \
+                self.children != []:
+            majority = self._find_majority_colour()
+            if majority is not None:
+                return _leaf_orbit(majority)
+
+        return None
+
+    def canonical_form_after(self, action: Tuple[str, Optional[int]],
+                             colour: Tuple[int, int, int]) -> Optional[int]:
+        """Return the canonical form that the whole board containing this Block
+        would have after doing <action> on this Block, painting with <colour>,
+        without changing it.
+
+        Return None if <action> would not be performed, or if its result is
+        random (i.e., for a smash).
+        """
+        hashes = self._hashes_after(action, colour)
+        if hashes is None:
+            return None
+
+        block = self
+        while block._parent is not None:
+            parent = block._parent
+            orbits = []
+            for child in parent.children:
+                if child is block:
+                    orbits.append(hashes)
+                else:
+                    orbits.append(child._dihedral_hashes())
+            hashes = _parent_orbit(orbits)
+            block = parent
+
+        return min(hashes)
+
 
 if __name__ == '__main__':
     import python_ta
@@ -23,15 +23,20 @@ This file contains the different game states for the Blocky game.
 """
 
 from __future__ import annotations
-from typing import Dict, List, Optional, Tuple
-import pygame
+from typing import Hashable, List, Optional, Tuple, TYPE_CHECKING
+import time
 
-from actions import ACTION_MESSAGE, ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE,\
-    SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, PASS, PAINT, COMBINE, ACTION_PENALTY
+from actions import ACTION_MESSAGE, PASS
 from block import Block
+from engine import Engine, GameData, MoveObserver
 from player import Player
-from renderer import Renderer
-from settings import ANIMATION_DURATION
+from settings import ANIMATION_DURATION, ANIMATION_FPS
+
+# GameStates only receive events and a Renderer from the game, so they never
+# need to import pygame themselves.
+if TYPE_CHECKING:
+    import pygame
+    from renderer import Renderer
 
 
 def _block_to_squares(board: Block) -> List[Tuple[Tuple[int, int, int],
@@ -46,81 +51,10 @@ def _block_to_squares(board: Block) -> List[Tuple[Tuple[int, int, int],
     - the size of the block,
     in that order.
 
-    The order of the squares does not matter.
-    """
-    output = list()
-    if len(board.children) == 0:  # Base Case
-        # <board> is a leaf
-        to_add = (board.colour, board.position, board.size)
-        output.append(to_add)
-    else:  # Recursive Case
-        # <board> has more children
-        for child in board.children:
-            output.extend(_block_to_squares(child))
-    return output
-
-
-class GameData:
-    """
-    A bundle of the data needed for a Blocky game.
-
-    === Public Attributes ===
-    max_turns:
-        The maximum number of turns for the game.
-    board:
-        The Blocky board on which this game will be played.
-    players:
-        The entities that are playing this game.
-    smashes:
-        The number of smashes done by each player.
-    combines:
-        The number of combines done by each player.
-    paints:
-        The number of paints done by each player.
-
-    === Representation Invariants ===
-    - len(players) >= 1
+    The order of the squares does not matter. The list is cached by <board>
+    until it changes, so it must not be mutated.
     """
-    max_turns: int
-    board: Block
-    players: List[Player]
-    smashes: Dict[int, int]
-    combines: Dict[int, int]
-    paints: Dict[int, int]
-
-    def __init__(self, board: Block, players: List[Player]) -> None:
-        """Initialize the game data, saving a reference to <board> and
-        <players>.
-
-        Precondition:
-            - len(players) >= 1
-        """
-        self.max_turns = 0
-        self.board = board
-        self.players = players
-
-        self.smashes = {}
-        self.combines = {}
-        self.paints = {}
-
-        # Start off all counts at 0
-        for player in players:
-            self.smashes[player.id] = 0
-            self.combines[player.id] = 0
-            self.paints[player.id] = 0
-
-    def calculate_score(self, player_id: int) -> Tuple[int, int]:
-        """Return a tuple containing first the <player_id>'s score based on
-        their goal in the game and second the deductions from their score based
-        on the actions they've taken.
-        """
-        goal_score = self.players[player_id].goal.score(self.board)
-
-        penalty = self.smashes[player_id] * ACTION_PENALTY[SMASH] + \
-                  self.combines[player_id] * ACTION_PENALTY[COMBINE] + \
-                  self.paints[player_id] * ACTION_PENALTY[PAINT]
-
-        return goal_score, penalty
+    return board.squares()
 
 
 class GameState:
@@ -144,87 +78,58 @@ class GameState:
         """
         raise NotImplementedError
 
+    def frame_key(self) -> Hashable:
+        """Return a value that is only different from the last value returned
+        if render would now draw something different.
+
+        By default, a GameState always draws the same thing.
+        """
+        return None
+
+    def timeout(self) -> Optional[int]:
+        """Return the number of milliseconds after which this GameState must be
+        updated even if no event has happened, or None if it only changes in
+        response to events.
+        """
+        return None
+
 
 class MainState(GameState):
     """A GameState that manages the moves made by different players in Blocky.
     """
     # === Private Attributes ===
-    # _turn:
-    #   The current turn.
     # _data:
     #   A reference to the shared GameData.
-    # _current_player_index:
-    #   The index of the current player in GameData.players.
-    # _current_score:
-    #   The score of the current player, including penalties.
-    _turn: int
+    # _engine:
+    #   The Engine that keeps track of the turns of the game.
     _data: GameData
-    _current_player_index: int
-    _current_score: int
+    _engine: Engine
 
-    def __init__(self, data: GameData) -> None:
-        """Initialize this GameState.
+    def __init__(self, data: GameData,
+                 observers: Optional[List[MoveObserver]] = None) -> None:
+        """Initialize this GameState, telling every observer in <observers>
+        about each successful move.
         """
-        self._turn = 0
         self._data = data
-        self._current_player_index = 0
-
-        score, penalty = self._data.calculate_score(self._current_player().id)
-        self._current_score = score - penalty
+        self._engine = Engine(data)
+        for observer in observers or []:
+            self._engine.add_observer(observer)
 
     def _current_player(self) -> Player:
         """Return the player whose turn it is.
         """
-        return self._data.players[self._current_player_index]
-
-    def _update_player(self) -> None:
-        """Update the player whose turn it is.
-        """
-        self._current_player_index = (self._current_player_index + 1) % len(
-            self._data.players)
-
-        score, penalty = self._data.calculate_score(self._current_player().id)
-        self._current_score = score - penalty
-
-        if self._current_player_index == 0:
-            self._turn += 1
+        return self._engine.current_player()
 
     def _do_move(self, move: Tuple[str, Optional[int], Block]) -> bool:
         """Attempt to do the player's requested move.
         """
-        action = (move[0], move[1])
-        direction = move[1]
-        block = move[2]
-        player = self._current_player()
-        move_successful = False
-
-        if action in [ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE]:
-            move_successful = block.rotate(direction)
-        elif action in [SWAP_HORIZONTAL, SWAP_VERTICAL]:
-            move_successful = block.swap(direction)
-        elif action == SMASH:
-            move_successful = block.smash()
-            self._data.smashes[player.id] += int(move_successful)
-        elif action == PAINT:
-            move_successful = block.paint(self._current_player().goal.colour)
-            self._data.paints[player.id] += int(move_successful)
-        elif action == COMBINE:
-            move_successful = block.combine()
-            self._data.combines[player.id] += int(move_successful)
-        elif action == PASS:
-            # Do nothing
-            move_successful = True
-
-        if move_successful:
-            self._update_player()
-
-        return move_successful
+        return self._engine.do_move(move)
 
     def process_event(self, event: pygame.event.Event) -> None:
         self._current_player().process_event(event)
 
     def update(self) -> GameState:
-        if self._turn >= self._data.max_turns:
+        if self._engine.is_over():
             return GameOverState(self._data)
 
         # Ask the player to make a move
@@ -234,7 +139,9 @@ class MainState(GameState):
             # No move was made, stay in the current state
             return self
         else:
-            # Save what the board looks like before the move
+            # Save what the board looks like before the move. The board
+            # replaces its cached squares rather than changing them, so this
+            # does not copy anything.
             background = _block_to_squares(self._data.board)
             # Also save the current player ID
             player_id = self._current_player().id
@@ -242,11 +149,24 @@ class MainState(GameState):
             # Do the move
             if self._do_move(move):
                 # Animate the move that was just done
-                return AnimateMoveState(self, player_id, move, background)
+                return AnimateMoveState(self, player_id, move, background,
+                                        _block_to_squares(self._data.board))
             else:
                 # The move was not valid, let the player try again
                 return self
 
+    def frame_key(self) -> Hashable:
+        # The board's squares are only replaced when the board changes, so
+        # comparing them is usually as cheap as comparing their identity.
+        player = self._current_player()
+        b = player.get_selected_block(self._data.board)
+        selected = None if b is None else (b.position, b.size)
+        return (self._engine.turn, player.id, selected,
+                _block_to_squares(self._data.board))
+
+    def timeout(self) -> Optional[int]:
+        return self._current_player().poll_interval()
+
     def render(self, renderer: Renderer) -> None:
         renderer.draw_board(_block_to_squares(self._data.board))
 
@@ -255,14 +175,18 @@ class MainState(GameState):
             renderer.highlight_block(b.position, b.size)
 
         p = self._current_player()
-        status = f'Turn {self._turn} | Player {p.id} | ' \
-                 f'Score {self._current_score} | {p.goal.description()}'
+        status = f'Turn {self._engine.turn} | Player {p.id} | ' \
+                 f'Score {self._engine.current_score()} | ' \
+                 f'{p.goal.description()}'
         renderer.draw_status(status)
 
 
 class AnimateMoveState(GameState):
     """A GameState that animates a move made by a player before returning to its
     parent GameState.
+
+    Each frame is made by transforming images of the block before and after
+    the move, which are only drawn once.
     """
     # === Private Attributes ===
     # _parent:
@@ -274,16 +198,28 @@ class AnimateMoveState(GameState):
     # _start_time:
     #   The time that the animation started.
     # _background:
-    #   The board to display behind the animation.
+    #   The squares of the board to display behind the animation.
+    # _foreground:
+    #   The squares of the board after the move.
+    # _snapshot:
+    #   An image of <_background>, or None if it has not been drawn yet.
+    # _images:
+    #   Images of the moved block before and after the move, or None if they
+    #   have not been drawn yet.
     _parent: GameState
     _player_id: int
     _move: Tuple[str, Optional[int], Block]
-    _start_time: int
+    _start_time: float
     _background: List[Tuple[Tuple[int, int, int], Tuple[int, int], int]]
+    _foreground: List[Tuple[Tuple[int, int, int], Tuple[int, int], int]]
+    _snapshot: Optional[pygame.Surface]
+    _images: Optional[Tuple[pygame.Surface, pygame.Surface]]
 
     def __init__(self, parent: GameState, player_id: int,
                  move: Tuple[str, Optional[int], Block],
                  background: List[Tuple[Tuple[int, int, int], Tuple[int, int],
+                                        int]],
+                 foreground: List[Tuple[Tuple[int, int, int], Tuple[int, int],
                                         int]]) -> None:
         """Initialize this GameState.
         """
@@ -291,13 +227,16 @@ class AnimateMoveState(GameState):
         self._player_id = player_id
         self._move = move
         self._background = background
-        self._start_time = pygame.time.get_ticks()
+        self._foreground = foreground
+        self._snapshot = None
+        self._images = None
+        self._start_time = time.monotonic()
 
     def process_event(self, event: pygame.event.Event) -> None:
         return  # Ignore the event
 
     def update(self) -> GameState:
-        elapsed_seconds = (pygame.time.get_ticks() - self._start_time) / 1000
+        elapsed_seconds = time.monotonic() - self._start_time
 
         if elapsed_seconds > ANIMATION_DURATION:
             # The animation is complete, do the move, go back to the last
@@ -307,16 +246,48 @@ class AnimateMoveState(GameState):
             # The animation is still running, remain in this GameState
             return self
 
+    def _frame(self) -> int:
+        """Return the number of the frame of the animation to show now, from 0
+        up to ANIMATION_DURATION * ANIMATION_FPS for the last frame.
+        """
+        elapsed_seconds = time.monotonic() - self._start_time
+        return min(int(elapsed_seconds * ANIMATION_FPS),
+                   ANIMATION_DURATION * ANIMATION_FPS)
+
+    def frame_key(self) -> Hashable:
+        return self._frame()
+
+    def timeout(self) -> Optional[int]:
+        elapsed_seconds = time.monotonic() - self._start_time
+        remaining = max(0, int((ANIMATION_DURATION - elapsed_seconds) * 1000)
+                        + 1)
+        return min(remaining, 1000 // ANIMATION_FPS)
+
     def render(self, renderer: Renderer) -> None:
-        renderer.draw_board(self._background)
+        b = self._move[2]
+        action = (self._move[0], self._move[1])
+
+        # Draw the board and the block once, then transform the images of the
+        # block for every frame
+        if self._snapshot is None:
+            self._snapshot = renderer.snapshot_board(self._background)
+            after = renderer.snapshot_board(self._foreground)
+            self._images = (
+                renderer.block_image(self._snapshot, b.position, b.size),
+                renderer.block_image(after, b.position, b.size))
+        renderer.draw_snapshot(self._snapshot)
+
+        progress = self._frame() / (ANIMATION_DURATION * ANIMATION_FPS)
+        before, after = self._images
+        renderer.draw_move(action, before, after, b.position, b.size,
+                           progress)
 
         # Draw an outline around the selected block
-        b = self._move[2]
         renderer.highlight_block(b.position, b.size)
 
-        # Draw the image representing the move
-        action = (self._move[0], self._move[1])
-        renderer.draw_image(action, b.position, b.size)
+        # Draw the image representing a pass, which does not change the block
+        if action == PASS:
+            renderer.draw_image(action, b.position, b.size)
 
         # Update the status message based on the action being performed.
         status = f'Player {self._player_id} is {ACTION_MESSAGE[action]}'
@@ -337,12 +308,9 @@ class GameOverState(GameState):
     def __init__(self, data: GameData) -> None:
         """Initialize this GameState.
         """
-        self._scores = []
-        for p in data.players:
-            goal_score, penalty = data.calculate_score(p.id)
-            self._scores.append((p.id, goal_score, penalty))
-
-        self._winner = max(self._scores, key=lambda item: item[1] - item[2])[0]
+        engine = Engine(data)
+        self._scores = engine.scores()
+        self._winner = engine.winner()
 
     def process_event(self, event: pygame.event.Event) -> None:
         # Simply ignore the event
@@ -374,7 +342,8 @@ if __name__ == '__main__':
         'allowed-io': ['run_game'],
         'allowed-import-modules': [
             'doctest', 'python_ta', 'random', 'typing', 'pygame', '__future__',
-            'block', 'player', 'renderer', 'settings', 'actions'
+            'time', 'block', 'player', 'renderer', 'settings', 'actions',
+            'engine'
         ],
         'generated-members': 'pygame.*'
     })
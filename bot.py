@@ -0,0 +1,317 @@
+"""CSC148 Assignment 2
+
+=== CSC148 Winter 2020 ===
+Department of Computer Science,
+University of Toronto
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+Authors: Diane Horton, David Liu, Mario Badr, Sophia Huynh, Misha Schwartz,
+and Jaisie Sin
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) Diane Horton, David Liu, Mario Badr, Sophia Huynh,
+Misha Schwartz, and Jaisie Sin.
+
+=== Module Description ===
+
+This file contains a Player whose moves are chosen by a bot running in another
+process, and a bot that can be run in that process.
+
+The game and the bot talk over the bot's stdin and stdout, one line per
+message. The game sends:
+    init <player ID> <goal> <colour> <size> <max depth> <board>
+        Sent once, before any other message. <goal> is the name of the goal
+        class, <colour> is an index in COLOUR_LIST and <board> is the board
+        encoded by replay.encode_board in hexadecimal.
+    move <player ID> <action> <x> <y> <level> <argument>
+        Sent after every successful move by any player, including the bot.
+        The fields are those of a move in a replay log, so the bot can keep
+        its own copy of the board up to date with replay.redo_move.
+    go <sequence number>
+        Sent when the bot should choose its next move, as soon as the move
+        before its turn is done. The bot can think while that move is still
+        being animated.
+The bot answers each go with:
+    <sequence number> <action> <x> <y> <level>
+Answers to earlier requests are ignored.
+
+Run this file to start the default bot, which plays like a SmartPlayer, e.g.:
+    python bot.py --difficulty 5
+"""
+from __future__ import annotations
+from typing import List, Optional, TextIO, Tuple, TYPE_CHECKING
+import argparse
+import os
+import queue
+import subprocess
+import sys
+import threading
+
+from block import Block
+from engine import MoveObserver
+from actions import PASS
+from goal import BlobGoal, Goal, PerimeterGoal
+from player import Player, SmartPlayer
+from replay import ACTIONS, decode_board, encode_board, find_block, \
+    move_argument, redo_move
+from settings import COLOUR_LIST
+
+if TYPE_CHECKING:
+    import pygame
+    from engine import Engine
+
+# The goal classes, by the names used in init messages
+_GOALS = {'PerimeterGoal': PerimeterGoal, 'BlobGoal': BlobGoal}
+
+# The most times a BotPlayer asks its bot again for a move, after answers that
+# are malformed or choose a block that does not exist, before it passes
+BOT_RETRIES = 3
+
+
+class BotPlayer(Player, MoveObserver):
+    """A computer player whose moves are chosen by a bot in a subprocess.
+
+    A BotPlayer must be added as an observer of the Engine playing its game,
+    so that it can send the bot every move.
+
+    === Public Attributes ===
+    wait:
+        The most seconds generate_move waits for the bot's answer, or None to
+        wait as long as it takes.
+    """
+    # === Private Attributes ===
+    # _process:
+    #   The process running the bot.
+    # _answers:
+    #   The lines written by the bot, put there by a thread reading them. An
+    #   empty line means that the bot has stopped.
+    # _started:
+    #   True iff the bot has been sent the init message.
+    # _sequence:
+    #   The sequence number of the last go message sent, or None if no move
+    #   has been requested since the bot's last move.
+    # _next_sequence:
+    #   The sequence number of the next go message.
+    # _retries:
+    #   The number of times the bot has been asked again for its next move.
+    # _proceed:
+    #   True when the player should make a move, False when the player
+    #   should wait.
+    wait: Optional[float]
+    _process: subprocess.Popen
+    _answers: queue.Queue
+    _started: bool
+    _sequence: Optional[int]
+    _next_sequence: int
+    _retries: int
+    _proceed: bool
+
+    def __init__(self, player_id: int, goal: Goal, command: List[str],
+                 wait: Optional[float] = 0.0) -> None:
+        """Initialize this BotPlayer and start its bot by running <command>.
+        """
+        super().__init__(player_id, goal)
+        self.wait = wait
+        self._process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+            bufsize=1)
+        self._answers = queue.Queue()
+        self._started = False
+        self._sequence = None
+        self._next_sequence = 0
+        self._retries = 0
+        self._proceed = False
+
+        reader = threading.Thread(target=self._read_answers, daemon=True)
+        reader.start()
+
+    def _read_answers(self) -> None:
+        """Put every line written by the bot in self._answers.
+        """
+        for line in self._process.stdout:
+            self._answers.put(line)
+        self._answers.put('')
+
+    def _send(self, message: str) -> None:
+        """Send <message> to the bot.
+        """
+        self._process.stdin.write(message + '\n')
+        self._process.stdin.flush()
+
+    def _start(self, board: Block) -> None:
+        """Send the bot the init message for <board>, if it has not been sent.
+        """
+        if not self._started:
+            self._started = True
+            goal = self.goal
+            self._send(f'init {self.id} {type(goal).__name__} '
+                       f'{COLOUR_LIST.index(goal.colour)} {board.size} '
+                       f'{board.max_depth} {encode_board(board).hex()}')
+
+    def _request_move(self) -> None:
+        """Ask the bot for its next move.
+        """
+        self._sequence = self._next_sequence
+        self._next_sequence += 1
+        self._send(f'go {self._sequence}')
+
+    def move_done(self, engine: Engine, player: Player,
+                  move: Tuple[str, Optional[int], Block],
+                  seed: Optional[int]) -> None:
+        if not self._started:
+            # The bot is sent the board as it is now, so it has nothing to redo
+            self._start(engine.data.board)
+        else:
+            action = (move[0], move[1])
+            block = move[2]
+            self._send(f'move {player.id} {ACTIONS.index(action)} '
+                       f'{block.position[0]} {block.position[1]} '
+                       f'{block.level} {move_argument(player, action, seed)}')
+
+        if player is self:
+            self._sequence = None
+        if engine.current_player() is self and not engine.is_over():
+            self._request_move()
+
+    def get_selected_block(self, board: Block) -> Optional[Block]:
+        return None
+
+    def process_event(self, event: pygame.event.Event) -> None:
+        import pygame
+
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            self.allow_move()
+
+    def allow_move(self) -> None:
+        self._proceed = True
+
+    def poll_interval(self) -> Optional[int]:
+        return 10 if self._proceed else None
+
+    def generate_move(self, board: Block) ->\
+            Optional[Tuple[str, Optional[int], Block]]:
+        """Return the move chosen by the bot, or None if the bot has not
+        answered within self.wait seconds.
+
+        The bot is asked again after an answer that is malformed or chooses a
+        block that does not exist, up to BOT_RETRIES times. After that, the
+        move is to pass.
+
+        This function does not mutate <board>.
+        """
+        if not self._proceed:
+            return None  # Do not remove
+
+        self._start(board)
+        if self._sequence is None:
+            self._request_move()
+
+        while True:
+            try:
+                if self.wait == 0.0:
+                    answer = self._answers.get_nowait()
+                else:
+                    answer = self._answers.get(timeout=self.wait)
+            except queue.Empty:
+                return None
+
+            if answer == '':
+                raise RuntimeError(f'the bot of player {self.id} stopped')
+
+            fields = _parse_answer(answer)
+            if fields is not None and fields[0] != self._sequence:
+                continue  # An answer to an earlier request
+
+            block = None
+            if fields is not None:
+                block = find_block(board, (fields[2], fields[3]), fields[4])
+            if block is None and self._retries < BOT_RETRIES:
+                # The answer is malformed or chose a block that does not
+                # exist, so ask again
+                self._retries += 1
+                self._request_move()
+                continue
+
+            self._proceed = False  # Must set to False before returning!
+            self._sequence = None
+            self._retries = 0
+            if block is None:
+                return PASS[0], PASS[1], board
+            action = ACTIONS[fields[1]]
+            return action[0], action[1], block
+
+    def close(self) -> None:
+        """Stop the bot.
+        """
+        self._process.stdin.close()
+        self._process.wait()
+
+
+def _parse_answer(answer: str) -> Optional[List[int]]:
+    """Return the sequence number, action code, x, y and level in <answer>, a
+    line written by a bot, or None if it is not a valid answer.
+
+    >>> _parse_answer('3 0 375 0 1')
+    [3, 0, 375, 0, 1]
+    >>> _parse_answer('3 99 375 0 1') is None
+    True
+    """
+    try:
+        fields = [int(field) for field in answer.split()]
+    except ValueError:
+        return None
+    if len(fields) != 5 or not 0 <= fields[1] < len(ACTIONS):
+        return None
+    return fields
+
+
+def bot_command(difficulty: int) -> List[str]:
+    """Return the command that runs the bot in this file as a SmartPlayer
+    of <difficulty>.
+    """
+    return [sys.executable, os.path.abspath(__file__),
+            '--difficulty', str(difficulty)]
+
+
+def run_bot(difficulty: int, input_file: TextIO, output_file: TextIO) -> None:
+    """Play as a SmartPlayer of <difficulty>, reading messages from the game
+    from <input_file> and writing answers to <output_file>, until
+    <input_file> is closed.
+    """
+    board = None
+    player = None
+
+    for line in input_file:
+        fields = line.split()
+        if fields[0] == 'init':
+            player_id, goal_name, colour, size, max_depth, codes = fields[1:]
+            goal = _GOALS[goal_name](COLOUR_LIST[int(colour)])
+            player = SmartPlayer(int(player_id), goal, difficulty)
+            board = decode_board(bytes.fromhex(codes), int(size),
+                                 int(max_depth))
+        elif fields[0] == 'move':
+            code, x, y, level, argument = [int(field) for field in fields[2:]]
+            redo_move(board, ACTIONS[code], (x, y), level, argument)
+        elif fields[0] == 'go':
+            player.allow_move()
+            move = player.generate_move(board)
+            action = (move[0], move[1])
+            block = move[2]
+            output_file.write(f'{fields[1]} {ACTIONS.index(action)} '
+                              f'{block.position[0]} {block.position[1]} '
+                              f'{block.level}\n')
+            output_file.flush()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Run a Blocky bot that plays like a SmartPlayer.')
+    parser.add_argument('--difficulty', type=int, default=5)
+    arguments = parser.parse_args()
+
+    run_bot(arguments.difficulty, sys.stdin, sys.stdout)
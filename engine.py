@@ -0,0 +1,303 @@
+"""CSC148 Assignment 2
+
+=== CSC148 Winter 2020 ===
+Department of Computer Science,
+University of Toronto
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+Authors: Diane Horton, David Liu, Mario Badr, Sophia Huynh, Misha Schwartz,
+and Jaisie Sin
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) Diane Horton, David Liu, Mario Badr, Sophia Huynh,
+Misha Schwartz, and Jaisie Sin
+
+=== Module Description ===
+
+This file contains the Engine class, which plays the turns of a Blocky game
+without a display, along with the data that a game shares between its states.
+"""
+from __future__ import annotations
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+import random
+
+from actions import ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, \
+    SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, PASS, PAINT, COMBINE, ACTION_PENALTY
+from block import Block
+
+if TYPE_CHECKING:
+    from player import Player
+
+
+def apply_move(move: Tuple[str, Optional[int], Block],
+               colour: Tuple[int, int, int],
+               rng: Optional[random.Random] = None) -> bool:
+    """Perform <move> on the block it refers to, painting with <colour> if the
+    move is a PAINT. Return True iff the move was successfully performed.
+
+    A SMASH uses <rng>, or the random module if <rng> is None.
+
+    This has the same semantics as a move made during the game, but it does
+    not keep track of penalties or whose turn it is.
+    """
+    action = (move[0], move[1])
+    block = move[2]
+
+    if action in [ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE]:
+        return block.rotate(move[1])
+    elif action in [SWAP_HORIZONTAL, SWAP_VERTICAL]:
+        return block.swap(move[1])
+    elif action == SMASH:
+        return block.smash(rng)
+    elif action == PAINT:
+        return block.paint(colour)
+    elif action == COMBINE:
+        return block.combine()
+    elif action == PASS:
+        return True
+
+    return False
+
+
+class GameData:
+    """
+    A bundle of the data needed for a Blocky game.
+
+    === Public Attributes ===
+    max_turns:
+        The maximum number of turns for the game.
+    board:
+        The Blocky board on which this game will be played.
+    players:
+        The entities that are playing this game.
+    smashes:
+        The number of smashes done by each player.
+    combines:
+        The number of combines done by each player.
+    paints:
+        The number of paints done by each player.
+    rng:
+        The random number generator used for random events in this game, or
+        None if the random module is used instead.
+
+    === Representation Invariants ===
+    - len(players) >= 1
+    """
+    max_turns: int
+    board: Block
+    players: List[Player]
+    smashes: Dict[int, int]
+    combines: Dict[int, int]
+    paints: Dict[int, int]
+    rng: Optional[random.Random]
+
+    def __init__(self, board: Block, players: List[Player],
+                 rng: Optional[random.Random] = None) -> None:
+        """Initialize the game data, saving a reference to <board>, <players>
+        and <rng>.
+
+        Precondition:
+            - len(players) >= 1
+        """
+        self.max_turns = 0
+        self.board = board
+        self.players = players
+        self.rng = rng
+
+        self.smashes = {}
+        self.combines = {}
+        self.paints = {}
+
+        # Start off all counts at 0
+        for player in players:
+            self.smashes[player.id] = 0
+            self.combines[player.id] = 0
+            self.paints[player.id] = 0
+
+    def calculate_score(self, player_id: int) -> Tuple[int, int]:
+        """Return a tuple containing first the <player_id>'s score based on
+        their goal in the game and second the deductions from their score based
+        on the actions they've taken.
+        """
+        goal_score = self.players[player_id].goal.score(self.board)
+
+        penalty = self.smashes[player_id] * ACTION_PENALTY[SMASH] + \
+                  self.combines[player_id] * ACTION_PENALTY[COMBINE] + \
+                  self.paints[player_id] * ACTION_PENALTY[PAINT]
+
+        return goal_score, penalty
+
+
+class MoveObserver:
+    """Something that is told about every successful move in a game.
+
+    This is an abstract class. Only child classes should be instantiated.
+    """
+
+    def move_done(self, engine: Engine, player: Player,
+                  move: Tuple[str, Optional[int], Block],
+                  seed: Optional[int]) -> None:
+        """Respond to <player> having successfully done <move> in the game
+        played by <engine>, which has already made it the next player's turn.
+
+        If <move> is a SMASH, <seed> is the seed of the random.Random that
+        generated the new children, so that random.Random(seed) can be used to
+        smash the same block the same way. Otherwise, <seed> is None.
+        """
+        raise NotImplementedError
+
+
+class Engine:
+    """The rules of a Blocky game: whose turn it is, which moves they make, and
+    what they score. An Engine does not draw anything or wait for events, so
+    games between computer players run as fast as the players can move.
+
+    === Public Attributes ===
+    data:
+        The data of the game being played.
+    turn:
+        The current turn. A turn is over once every player has moved.
+    """
+    # === Private Attributes ===
+    # _current_player_index:
+    #   The index of the current player in data.players.
+    # _current_score:
+    #   The score of the current player, including penalties, or None if it
+    #   has not been calculated since the last move.
+    # _observers:
+    #   The observers to tell about every successful move.
+    data: GameData
+    turn: int
+    _current_player_index: int
+    _current_score: Optional[int]
+    _observers: List[MoveObserver]
+
+    def __init__(self, data: GameData) -> None:
+        """Initialize this Engine to play the game in <data> from the start.
+        """
+        self.data = data
+        self.turn = 0
+        self._current_player_index = 0
+        self._current_score = None
+        self._observers = []
+
+    def add_observer(self, observer: MoveObserver) -> None:
+        """Tell <observer> about every successful move from now on.
+        """
+        self._observers.append(observer)
+
+    def current_player(self) -> Player:
+        """Return the player whose turn it is.
+        """
+        return self.data.players[self._current_player_index]
+
+    def current_score(self) -> int:
+        """Return the score of the current player, including penalties.
+        """
+        if self._current_score is None:
+            score, penalty = self.data.calculate_score(
+                self.current_player().id)
+            self._current_score = score - penalty
+        return self._current_score
+
+    def is_over(self) -> bool:
+        """Return True iff the maximum number of turns has been played.
+        """
+        return self.turn >= self.data.max_turns
+
+    def do_move(self, move: Tuple[str, Optional[int], Block]) -> bool:
+        """Attempt to do the current player's requested move. If it was
+        successful, record its penalty and make it the next player's turn.
+
+        Return True iff the move was successful.
+        """
+        action = (move[0], move[1])
+        player = self.current_player()
+
+        # Smash with a generator of its own, so that the smash can be repeated
+        # from its seed alone.
+        seed = None
+        rng = self.data.rng
+        if action == SMASH:
+            seed = (random if rng is None else rng).getrandbits(32)
+            rng = random.Random(seed)
+
+        move_successful = apply_move(move, player.goal.colour, rng)
+
+        if action == SMASH:
+            self.data.smashes[player.id] += int(move_successful)
+        elif action == PAINT:
+            self.data.paints[player.id] += int(move_successful)
+        elif action == COMBINE:
+            self.data.combines[player.id] += int(move_successful)
+
+        if move_successful:
+            self._current_score = None
+            self._current_player_index = (self._current_player_index + 1) \
+                % len(self.data.players)
+            if self._current_player_index == 0:
+                self.turn += 1
+
+            for observer in self._observers:
+                observer.move_done(self, player, move, seed)
+
+        return move_successful
+
+    def play_turn(self) -> Optional[Tuple[str, Optional[int], Block]]:
+        """Ask the current player for a move without waiting for any events,
+        and do it.
+
+        Return the move if it was successful, or None if the player did not
+        make a move or the move was not valid.
+        """
+        player = self.current_player()
+        player.allow_move()
+        move = player.generate_move(self.data.board)
+
+        if move is not None and self.do_move(move):
+            return move
+        return None
+
+    def play(self) -> List[Tuple[int, int, int]]:
+        """Play the game until the maximum number of turns has been played,
+        and return the final scores, as returned by scores().
+
+        Precondition: no player in the game needs events to make a move (i.e.,
+        there are no human players).
+        """
+        while not self.is_over():
+            self.play_turn()
+
+        return self.scores()
+
+    def scores(self) -> List[Tuple[int, int, int]]:
+        """Return a list of tuples containing each player ID, goal score, and
+        penalty, in the order of the players.
+        """
+        scores = []
+        for p in self.data.players:
+            goal_score, penalty = self.data.calculate_score(p.id)
+            scores.append((p.id, goal_score, penalty))
+        return scores
+
+    def winner(self) -> int:
+        """Return the ID of the player with the highest score, including
+        penalties.
+        """
+        return max(self.scores(), key=lambda item: item[1] - item[2])[0]
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'typing', '__future__', 'actions', 'block',
+            'player', 'random'
+        ]
+    })
@@ -23,17 +23,41 @@ This file contains some sample tests for Assignment 2.
 Please use this as a starting point to check your work and write your own
 tests!
 """
+from types import SimpleNamespace
 from typing import List, Optional, Tuple
+import asyncio
+import json
 import os
+import random
+import sys
+import numpy
 import pygame
 import pytest
 
-from block import Block
-from blocky import _block_to_squares
-from goal import BlobGoal, PerimeterGoal, _flatten
-from player import _get_block
-from renderer import Renderer
-from settings import COLOUR_LIST
+from actions import PASS, ROTATE_CLOCKWISE, SWAP_HORIZONTAL, SMASH
+from bench_startup import time_import
+from block import Block, generate_board
+from blocky import _block_to_squares, AnimateMoveState, MainState
+from bot import BOT_RETRIES, BotPlayer, bot_command
+from engine import Engine, GameData, MoveObserver
+from export import animate_move, EXPORT_FPS, export_gif, game_frames, \
+    GifWriter, HOLD_DURATION
+from game import Game
+from goal import BlobGoal, EvaluationCache, PerimeterGoal, _flatten
+from perf import FrameStats, PHASES
+from player import _get_block, create_players, MCTSPlayer, RandomPlayer, \
+    SmartPlayer
+from raster import board_frame, draw_squares, grid_frame, new_frame, \
+    rasterize, to_rgb, to_rgbx
+from renderer import _draw_squares, ICON_CACHE_SIZE, Renderer, \
+    TEXT_CACHE_SIZE
+from replay import _HEADER, decode_board, encode_board, Replayer, \
+    ReplayWriter
+from server import GameServer
+from settings import ANIMATION_DURATION, ANIMATION_FPS, BACKGROUND_COLOUR, \
+    BOARD_SIZE, COLOUR_LIST
+from thumbnails import make_atlases, THUMBNAIL_OUTLINE
+from tournament import generate_tasks, play_game
 
 
 def set_children(block: Block, colours: List[Optional[Tuple[int, int, int]]]) \
@@ -56,8 +80,8 @@ def set_children(block: Block, colours: List[Optional[Tuple[int, int, int]]]) \
 
 
 @pytest.fixture
-def renderer() -> Renderer:
-    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+def renderer(monkeypatch) -> Renderer:
+    monkeypatch.setenv('SDL_VIDEODRIVER', 'dummy')
     pygame.init()
     return Renderer(750)
 
@@ -164,6 +188,234 @@ def test_block_to_squares_reference(board_16x16) -> None:
     assert squares == expected
 
 
+def test_block_to_squares_cached(board_16x16) -> None:
+    """Test that the squares of an unchanged board are not rebuilt, and that
+    they are correct after every kind of move.
+    """
+    def expected_squares(block: Block) -> list:
+        if len(block.children) == 0:
+            return [(block.colour, block.position, block.size)]
+        return [square for child in block.children
+                for square in expected_squares(child)]
+
+    squares = _block_to_squares(board_16x16)
+    assert _block_to_squares(board_16x16) is squares
+    upper_right = _block_to_squares(board_16x16.children[0])
+    upper_left = _block_to_squares(board_16x16.children[1])
+
+    assert board_16x16.children[0].children[0].paint(COLOUR_LIST[2])
+    assert _block_to_squares(board_16x16) == expected_squares(board_16x16)
+    assert _block_to_squares(board_16x16.children[0]) is not upper_right
+    assert _block_to_squares(board_16x16.children[1]) is upper_left
+
+    for move in [lambda: board_16x16.swap(0),
+                 lambda: board_16x16.rotate(1),
+                 lambda: board_16x16.children[1].smash(),
+                 lambda: board_16x16.children[1].rotate(3),
+                 lambda: [child.combine() for child in board_16x16.children]]:
+        before = list(squares)
+        move()
+        assert squares == before
+        squares = _block_to_squares(board_16x16)
+        assert squares == expected_squares(board_16x16)
+
+
+def test_core_modules_import_without_pygame() -> None:
+    """Test that the modules needed to play a game without a display do not
+    import pygame.
+    """
+    times, imports_pygame = time_import('block,goal,player,engine,replay', 1)
+    assert len(times) == 1
+    assert not imports_pygame
+
+
+def test_game_server() -> None:
+    """Test that a GameServer plays the computer players' moves after each
+    move by a human player, and reports invalid requests.
+    """
+    async def play() -> None:
+        server = GameServer()
+        owned = set()
+        state = await server.handle_request(
+            {'op': 'new', 'humans': 1, 'smart': [2], 'seed': 3, 'id': 'a'},
+            owned)
+        assert state['ok'] and state['id'] == 'a' and state['human']
+        assert owned == {state['game']}
+
+        game = state['game']
+        state = await server.handle_request(
+            {'op': 'move', 'game': game, 'action': 'pass'}, owned)
+        assert state['turn'] == 1 and state['player'] == 0
+
+        error = await server.handle_request(
+            {'op': 'move', 'game': game, 'action': 'combine'}, owned)
+        assert not error['ok']
+
+        # An unexpected error only fails its own request
+        error = await server.handle_request(
+            {'op': 'new', 'max_depth': float('inf'), 'id': 'b'}, owned)
+        assert not error['ok'] and error['id'] == 'b'
+
+        await server.handle_request({'op': 'close', 'game': game}, owned)
+        assert len(server) == 0 and owned == set()
+
+    asyncio.run(play())
+
+
+def test_export_gif(tmp_path) -> None:
+    """Test that an exported GIF starts with the board of a recorded game, has
+    a frame for every step of every move, and that its compressed pixels can
+    be read back.
+    """
+    rng = random.Random(6)
+    board = generate_board(2, 96, rng)
+    data = GameData(board, create_players(0, 2, [], rng), rng)
+    data.max_turns = 2
+    log_path = str(tmp_path / 'game.log')
+    writer = ReplayWriter(log_path, data)
+    engine = Engine(data)
+    engine.add_observer(writer)
+    engine.play()
+    writer.close()
+
+    replay = Replayer(log_path)
+    frames = list(game_frames(replay))
+    hold = round(HOLD_DURATION * EXPORT_FPS)
+    steps = round(ANIMATION_DURATION * EXPORT_FPS)
+    assert len(frames) == 2 * hold + len(replay) * (steps + 1)
+    first = frames[0]
+    assert (first == board_frame(replay.board_at(0))).all()
+    assert all(frame is first for frame in frames[:hold])
+
+    # Each move is animated between the frames held before and after it
+    during = frames[hold + steps // 2]
+    assert (during != first).any()
+    assert (during != frames[hold + steps]).any()
+
+    gif_path = str(tmp_path / 'game.gif')
+    with open(gif_path, 'wb') as gif:
+        export_gif(replay, gif)
+    image = pygame.image.load(gif_path)
+    assert pygame.image.tostring(image, 'RGB') == to_rgb(first).tobytes()
+
+    # Enough different runs of pixels to fill the LZW table many times
+    noise = numpy.array([rng.choice([0, 0, 1, 2, 3]) for dummy in range(
+        96 * 96)], dtype=numpy.uint8).reshape(96, 96)
+    with open(gif_path, 'wb') as gif:
+        writer = GifWriter(gif, 96)
+        writer.write(noise)
+        writer.close()
+    image = pygame.image.load(gif_path)
+    assert pygame.image.tostring(image, 'RGB') == to_rgb(noise).tobytes()
+
+
+def test_export_animation() -> None:
+    """Test that exported animations of moves start from the board before the
+    move and end at the board after it.
+    """
+    board = generate_board(3, 96, random.Random(7))
+    before = board_frame(board)
+    board.swap(0)
+    swapped = board_frame(board)
+    for action in [ROTATE_CLOCKWISE, SWAP_HORIZONTAL, SMASH]:
+        frame = animate_move(before, swapped, action, (0, 0), 96, 0)
+        assert (frame == before).all()
+
+    slid = animate_move(before, swapped, SWAP_HORIZONTAL, (0, 0), 96,
+                        1 - 1e-9)
+    assert (slid == swapped).all()
+    rotated = animate_move(before, swapped, ROTATE_CLOCKWISE, (0, 0), 96,
+                           1 - 1e-9)
+    assert (rotated == numpy.rot90(before, -1)).mean() > 0.99
+
+
+def test_frame_stats() -> None:
+    """Test that frame statistics are computed from the most recent frames
+    only, and can be exported as JSON.
+    """
+    stats = FrameStats(4)
+    for leaves in range(10):
+        stats.begin()
+        for phase in PHASES:
+            stats.lap(phase)
+        stats.end_frame(leaves)
+    stats.add_think(0.5)
+
+    summary = json.loads(stats.to_json())
+    assert summary['frames'] == 10
+    assert summary['leaves_p50'] == 7 and summary['leaves_p99'] == 9
+    assert summary['think_p99_ms'] == 500
+    assert summary['fps'] is not None
+    assert all(summary[phase + '_p99_ms'] is not None for phase in PHASES)
+    assert FrameStats().summary()['frame_p50_ms'] is None
+
+
+def test_game_think_time(renderer, monkeypatch, tmp_path) -> None:
+    """Test that the main loop records the time taken by the update in which
+    a move is made, but not by the other changes of GameState around it.
+    """
+    # Time only passes while the game waits for events, and the game ends
+    # when it would wait for an event with no timeout
+    now = [0.0]
+
+    def wait(timeout: int = 0) -> pygame.event.Event:
+        if timeout == 0:
+            return pygame.event.Event(pygame.QUIT)
+        now[0] += timeout / 1000
+        return pygame.event.Event(pygame.NOEVENT)
+
+    monkeypatch.setattr('blocky.time',
+                        SimpleNamespace(monotonic=lambda: now[0]))
+    monkeypatch.setattr(pygame.event, 'wait', wait)
+    path = str(tmp_path / 'stats.json')
+    game = Game(2, 0, 1, [], seed=0, stats_path=path)
+
+    # Make a move, let it be animated, then end the game
+    pygame.event.clear()
+    pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=1,
+                                         pos=(0, 0)))
+    game.run_game(1)
+
+    assert now[0] > ANIMATION_DURATION
+    assert len(game._stats._think) == 1
+    with open(path) as file:
+        assert json.load(file)['think_p50_ms'] is not None
+
+
+def test_game_warm_up(renderer) -> None:
+    """Test that the images of actions are only loaded and scaled before a game
+    starts when asked to.
+    """
+    assert len(Game(2, 0, 1, [], seed=0)._renderer._scaled) == 0
+    assert len(Game(2, 0, 1, [], seed=0, warm_up=True)._renderer._scaled) \
+        == 3 * 8
+
+
+def test_thumbnail_atlases(tmp_path) -> None:
+    """Test that thumbnails of boards are drawn from their encoding into PNG
+    atlases, with a file listing the atlases.
+    """
+    rng = random.Random(7)
+    boards = [encode_board(generate_board(depth, 750, rng))
+              for depth in range(5)]
+    directory = str(tmp_path / 'atlases')
+    assert make_atlases(iter(boards), directory, 32, 2, 2, processes=2) == 5
+
+    with open(os.path.join(directory, 'atlases.json')) as file:
+        layout = json.load(file)
+    assert layout['count'] == 5
+    assert layout['atlases'] == ['atlas00000.png', 'atlas00001.png']
+
+    atlas = pygame.image.load(os.path.join(directory, 'atlas00001.png'))
+    assert atlas.get_size() == (64, 32)
+    expected = new_frame(32)
+    draw_squares(expected, decode_board(boards[4], 32, 4).squares(),
+                 THUMBNAIL_OUTLINE)
+    thumbnail = atlas.subsurface((0, 0, 32, 32))
+    assert pygame.image.tostring(thumbnail, 'RGB') == \
+        to_rgb(expected).tobytes()
+
+
 class TestRender:
     """A collection of methods that show you a way to save the boards in your
     test cases to image (i.e., PNG) files.
@@ -205,6 +457,182 @@ class TestRender:
         renderer.draw_board(_block_to_squares(board_16x16))
         renderer.save_to_file('your-rotate-1.png')
 
+    def test_dirty_rectangles(self, renderer) -> None:
+        """Test that redrawing only the changed parts of the board, after moves
+        and highlights, gives the same image as drawing the whole board.
+        """
+        rng = random.Random(3)
+        board = generate_board(4, 750, rng)
+        blocks = [board] + board.children + board.children[0].children
+        renderer.clear()
+        renderer.draw_board(_block_to_squares(board))
+
+        for block in blocks:
+            block.smash(rng) or block.rotate(1)
+            renderer.clear()
+            renderer.draw_board(_block_to_squares(board))
+            renderer.highlight_block(block.position, block.size)
+            renderer.draw_status(f'{block.position}')
+            renderer.flip()
+
+        renderer.clear()
+        renderer.draw_board(_block_to_squares(board))
+        screen = renderer._screen.subsurface((0, 0, 750, 750))
+        # A new list is drawn from scratch, rather than copied from the image
+        # of the board that the changed parts were drawn onto
+        expected = renderer.snapshot_board(list(_block_to_squares(board)))
+        assert pygame.image.tostring(screen, 'RGB') == \
+            pygame.image.tostring(expected, 'RGB')
+
+    def test_scaled_images_cached(self, renderer) -> None:
+        """Test that action images are scaled once per size, and that the
+        cache of scaled images stays bounded.
+        """
+        renderer.warm_up(2)
+        assert len(renderer._scaled) == 3 * 8
+        image = renderer._scaled_image(('smash', None), 188)
+        assert image.get_size() == (188, 188)
+        assert renderer._scaled_image(('smash', None), 188) is image
+
+        for size in range(1, ICON_CACHE_SIZE + 10):
+            renderer.draw_image(('pass', None), (0, 0), size)
+        assert len(renderer._scaled) == ICON_CACHE_SIZE
+
+    def test_text_cached(self, renderer) -> None:
+        """Test that each line of text is rendered once while it is cached,
+        and that the cache of rendered text stays bounded.
+        """
+        renderer.print('Player 0 wins!', 10, 10)
+        image = renderer._text_image('Player 0 wins!')
+        renderer.clear()
+        renderer.draw_status('Player 0 wins!')
+        assert renderer._text_image('Player 0 wins!') is image
+        assert renderer._text_image('Player 0 wins!', COLOUR_LIST[0]) \
+            is not image
+
+        for turn in range(TEXT_CACHE_SIZE + 10):
+            renderer.draw_status(f'Turn {turn}')
+        assert len(renderer._texts) == TEXT_CACHE_SIZE
+
+    def test_snapshot_board(self, renderer, board_16x16) -> None:
+        """Test that drawing a snapshot of a board looks the same as drawing
+        the board, even after the board has changed.
+        """
+        squares = _block_to_squares(board_16x16)
+        renderer.clear()
+        renderer.draw_board(squares)
+        expected = pygame.image.tostring(renderer._screen, 'RGB')
+
+        snapshot = renderer.snapshot_board(squares)
+        board_16x16.rotate(1)
+        renderer.clear()
+        renderer.draw_board(_block_to_squares(board_16x16))
+        renderer.clear()
+        renderer.draw_snapshot(snapshot)
+        assert pygame.image.tostring(renderer._screen, 'RGB') == expected
+
+    def test_animate_move(self, renderer, board_16x16) -> None:
+        """Test that the animation of a move asks to be redrawn every frame,
+        and that its last frame shows the board after the move.
+        """
+        block = board_16x16.children[0]
+        before = _block_to_squares(board_16x16)
+        block.rotate(1)
+        after = _block_to_squares(board_16x16)
+        state = AnimateMoveState(None, 0, ('rotate', 1, block), before, after)
+        assert state.frame_key() == 0
+        assert 0 < state.timeout() <= 1000 // ANIMATION_FPS
+
+        board_area = renderer._screen.subsurface((0, 0, 750, 750))
+        renderer.clear()
+        state.render(renderer)
+        first = pygame.image.tostring(board_area, 'RGB')
+        renderer.clear()
+        renderer.draw_board(after)
+        renderer.highlight_block(block.position, block.size)
+        expected = pygame.image.tostring(board_area, 'RGB')
+        assert first != expected
+
+        state._start_time -= ANIMATION_DURATION
+        assert state.frame_key() == ANIMATION_DURATION * ANIMATION_FPS
+        renderer.clear()
+        state.render(renderer)
+        assert pygame.image.tostring(board_area, 'RGB') == expected
+
+    def test_grid_board(self, renderer, monkeypatch) -> None:
+        """Test that a board of BOARD_SIZE with many squares, whose sizes are
+        rounded, is drawn by upscaling a grid of cells, and looks the same as
+        when drawn square by square.
+        """
+        squares = generate_board(5, BOARD_SIZE, random.Random(10)).squares()
+        expected = pygame.Surface((BOARD_SIZE, BOARD_SIZE))
+        expected.fill(BACKGROUND_COLOUR)
+        _draw_squares(expected, squares)
+
+        filled = []
+        monkeypatch.setattr('renderer._draw_squares',
+                            lambda surface, drawn: filled.append(drawn))
+        renderer.clear()
+        renderer.draw_board(squares)
+        assert filled == []
+        board = renderer._screen.subsurface((0, 0, BOARD_SIZE, BOARD_SIZE))
+        assert pygame.image.tostring(board, 'RGB') == \
+            pygame.image.tostring(expected, 'RGB')
+
+        # A few small squares are filled one by one instead
+        renderer.clear()
+        renderer.draw_board(squares[:3])
+        assert filled == [squares[:3]]
+
+        frame = new_frame(BOARD_SIZE)
+        draw_squares(frame, squares[-3:])
+        assert (grid_frame(squares[-3:], BOARD_SIZE) == frame).all()
+        assert (grid_frame(squares[-3:], BOARD_SIZE, packed=True)
+                == to_rgbx(frame)).all()
+
+    def test_stats_overlay(self, renderer, board_16x16) -> None:
+        """Test that the statistics overlay is removed when the board is drawn
+        again, and that the squares drawn are counted.
+        """
+        squares = _block_to_squares(board_16x16)
+        renderer.clear()
+        renderer.draw_board(squares)
+        assert renderer.squares_drawn() == len(squares)
+        expected = pygame.image.tostring(renderer._screen, 'RGB')
+
+        renderer.draw_stats(FrameStats().overlay_lines())
+        assert pygame.image.tostring(renderer._screen, 'RGB') != expected
+        renderer.clear()
+        renderer.draw_board(squares)
+        assert renderer.squares_drawn() == 0
+        assert pygame.image.tostring(renderer._screen, 'RGB') == expected
+
+    def test_rasterize(self, renderer) -> None:
+        """Test that the NumPy rasterizer draws the same pixels as the renderer.
+        """
+        board = generate_board(4, 750, random.Random(9))
+        highlight = board.children[2].children[1]
+        renderer.clear()
+        renderer.draw_board(_block_to_squares(board))
+        renderer.highlight_block(highlight.position, highlight.size)
+        expected = pygame.image.tostring(
+            renderer._screen.subsurface((0, 0, 750, 750)), 'RGB')
+        assert rasterize(board, highlight).tobytes() == expected
+
+        # Squares that overlap in any way, or stick out of the frame, are
+        # drawn in order
+        rng = random.Random(2)
+        squares = [(rng.choice(COLOUR_LIST), (rng.randint(0, 740),
+                                              rng.randint(0, 740)),
+                    rng.randint(1, 200)) for dummy in range(60)]
+        expected = pygame.Surface((750, 750))
+        expected.fill(BACKGROUND_COLOUR)
+        _draw_squares(expected, squares)
+        frame = new_frame(750)
+        draw_squares(frame, squares)
+        assert to_rgb(frame).tobytes() == \
+            pygame.image.tostring(expected, 'RGB')
+
 
 class TestBlock:
     """A collection of methods that test the Block class.
@@ -257,6 +685,28 @@ class TestBlock:
         board_16x16.children[0].rotate(1)
         assert board_16x16 == board_16x16_rotate1
 
+    def test_canonical_form(self, board_16x16, board_16x16_rotate1) -> None:
+        """Test that the canonical form of a board is the same when it is
+        rotated or reflected, and is updated when the board changes.
+        """
+        form = board_16x16.canonical_form()
+        shape = board_16x16.structure_hash()
+        after = board_16x16.canonical_form_after(('rotate', 1), COLOUR_LIST[0])
+
+        board_16x16.rotate(1)
+        assert board_16x16.canonical_form() == form == after
+        assert board_16x16.structure_hash() != shape
+
+        # The subdivided child moved from index 0 to index 3
+        block = board_16x16.children[3].children[0]
+        after = block.canonical_form_after(('paint', None), COLOUR_LIST[2])
+        assert after != form
+
+        block.paint(COLOUR_LIST[2])
+        assert board_16x16.canonical_form() == after
+        assert board_16x16.canonical_form() == \
+            board_16x16.create_copy().canonical_form()
+
 
 class TestPlayer:
     """A collection of methods for testing the methods and functions in the
@@ -283,6 +733,246 @@ class TestPlayer:
         assert _get_block(board_16x16, top_right, 2) == \
             board_16x16.children[0].children[0]
 
+    def test_mcts_player_does_not_mutate(self, board_16x16) -> None:
+        """Test that an MCTSPlayer returns a move on the given board without
+        changing the board.
+        """
+        copy = board_16x16.create_copy()
+        player = MCTSPlayer(0, PerimeterGoal(COLOUR_LIST[3]), 50)
+        player.process_event(pygame.event.Event(pygame.MOUSEBUTTONDOWN,
+                                                button=1))
+        move = player.generate_move(board_16x16)
+
+        assert board_16x16 == copy
+        assert _get_block(board_16x16, move[2].position, move[2].level) is \
+            move[2]
+        assert player.playouts_per_second > 0
+
+    def test_smart_player_time_budget(self, board_16x16) -> None:
+        """Test that a SmartPlayer with a time budget still returns a move on
+        the given board without changing the board.
+        """
+        copy = board_16x16.create_copy()
+        player = SmartPlayer(0, PerimeterGoal(COLOUR_LIST[0]), 0,
+                             time_budget=10)
+        player.process_event(pygame.event.Event(pygame.MOUSEBUTTONDOWN,
+                                                button=1))
+        move = player.generate_move(board_16x16)
+
+        assert board_16x16 == copy
+        assert move[0] != 'pass'
+        assert _get_block(board_16x16, move[2].position, move[2].level) is \
+            move[2]
+
+
+class TestEngine:
+    """A collection of methods for testing the Engine class.
+    """
+    def test_play_game(self, board_16x16) -> None:
+        """Test that a game between computer players is played to the end
+        without any events.
+        """
+        players = [RandomPlayer(0, PerimeterGoal(COLOUR_LIST[0])),
+                   SmartPlayer(1, BlobGoal(COLOUR_LIST[1]), 3)]
+        data = GameData(board_16x16, players)
+        data.max_turns = 4
+        engine = Engine(data)
+
+        scores = engine.play()
+
+        assert engine.turn == 4
+        assert engine.is_over()
+        assert [item[0] for item in scores] == [0, 1]
+        assert scores[1][1] == BlobGoal(COLOUR_LIST[1]).score(board_16x16)
+        assert engine.winner() in [0, 1]
+
+    def test_tournament_game_seeded(self) -> None:
+        """Test that a tournament game gives the same result every time it is
+        played with the same seed.
+        """
+        tasks = list(generate_tasks([2, 3], [(1, 1)], [2, 4], 2, 3, seed=7))
+        assert len(tasks) == 8
+        assert [task[0] for task in tasks] == list(range(7, 15))
+
+        first = play_game(tasks[5])
+        second = play_game(tasks[5])
+        assert first['scores'] == second['scores']
+        assert first['winner'] == second['winner']
+
+    def test_interleaved_games_seeded(self) -> None:
+        """Test that games using their own random number generators give the
+        same results when their turns are interleaved as when they are played
+        one after the other.
+        """
+        def new_engine(seed: int) -> Engine:
+            rng = random.Random(seed)
+            board = generate_board(3, 750, rng)
+            data = GameData(board, create_players(0, 1, [3], rng), rng)
+            data.max_turns = 5
+            return Engine(data)
+
+        expected = [new_engine(seed).play() for seed in [1, 2]]
+
+        engines = [new_engine(1), new_engine(2)]
+        while not all(engine.is_over() for engine in engines):
+            for engine in engines:
+                if not engine.is_over():
+                    engine.play_turn()
+                    random.random()  # The global generator is not used
+
+        assert [engine.scores() for engine in engines] == expected
+
+    def test_do_move_penalty(self, board_16x16) -> None:
+        """Test that a successful move records its penalty and passes the turn
+        to the next player.
+        """
+        players = [RandomPlayer(0, PerimeterGoal(COLOUR_LIST[0])),
+                   RandomPlayer(1, PerimeterGoal(COLOUR_LIST[1]))]
+        data = GameData(board_16x16, players)
+        engine = Engine(data)
+
+        assert not engine.do_move(('combine', None, board_16x16))
+        assert engine.current_player().id == 0
+        assert engine.do_move(('smash', None, board_16x16.children[1]))
+        assert engine.current_player().id == 1
+        assert data.calculate_score(0)[1] == 3
+
+    def test_frame_key(self, board_16x16) -> None:
+        """Test that the main GameState only asks to be redrawn after the board
+        or the current player changes.
+        """
+        rng = random.Random(0)
+        players = [RandomPlayer(0, PerimeterGoal(COLOUR_LIST[0]), rng),
+                   RandomPlayer(1, PerimeterGoal(COLOUR_LIST[1]), rng)]
+        data = GameData(board_16x16, players)
+        data.max_turns = 5
+        state = MainState(data)
+        key = state.frame_key()
+        assert state.frame_key() == key
+        assert state.timeout() is None
+
+        assert state.update() is state
+        assert state.frame_key() == key
+
+        players[0].allow_move()
+        animation = state.update()
+        assert animation is not state
+        assert animation.timeout() is not None
+        assert state.frame_key() != key
+
+    def test_bot_player(self) -> None:
+        """Test that a bot in another process keeps its board up to date from
+        the moves it is sent, so that every move it chooses is valid.
+        """
+        rng = random.Random(4)
+        board = generate_board(3, 750, rng)
+        bot = BotPlayer(1, BlobGoal(COLOUR_LIST[2]), bot_command(3), wait=None)
+        players = [RandomPlayer(0, PerimeterGoal(COLOUR_LIST[0]), rng), bot]
+        data = GameData(board, players, rng)
+        data.max_turns = 8
+        engine = Engine(data)
+        engine.add_observer(bot)
+
+        try:
+            engine.play()
+        finally:
+            bot.close()
+
+        assert engine.turn == 8
+        assert bot._next_sequence == 8
+
+    def test_bot_bad_answers(self) -> None:
+        """Test that a bot is asked again after answers that are malformed or
+        choose a block that does not exist, and that its player passes after
+        BOT_RETRIES of them.
+        """
+        script = (
+            'import sys\n'
+            'answers = ["{} 99 0 0 0", "{} rotate", "oops", "{} 0 1 1 0"]\n'
+            'for line in sys.stdin:\n'
+            '    fields = line.split()\n'
+            '    if fields[0] == "go":\n'
+            '        n = int(fields[1])\n'
+            '        print(answers[n % 4].format(n), flush=True)\n')
+        board = generate_board(2, 750, random.Random(4))
+        bot = BotPlayer(0, BlobGoal(COLOUR_LIST[2]), [sys.executable, '-c',
+                                                     script], wait=None)
+        bot.allow_move()
+        try:
+            move = bot.generate_move(board)
+        finally:
+            bot.close()
+
+        assert move == (PASS[0], PASS[1], board)
+        assert bot._next_sequence == BOT_RETRIES + 1
+
+    def test_replay(self, tmp_path) -> None:
+        """Test that a replay log recreates the board and penalties after every
+        move of a game, starting from any checkpoint.
+        """
+        class Snapshots(MoveObserver):
+            def __init__(self) -> None:
+                self.boards = []
+
+            def move_done(self, engine, player, move, seed) -> None:
+                self.boards.append(encode_board(engine.data.board))
+
+        rng = random.Random(5)
+        board = generate_board(3, 750, rng)
+        data = GameData(board, create_players(0, 2, [2], rng), rng)
+        data.max_turns = 6
+        path = str(tmp_path / 'game.log')
+
+        snapshots = Snapshots()
+        writer = ReplayWriter(path, data, interval=4)
+        initial = encode_board(board)
+        engine = Engine(data)
+        engine.add_observer(writer)
+        engine.add_observer(snapshots)
+        engine.play()
+        writer.close()
+
+        replay = Replayer(path)
+        assert len(replay) == 18
+        assert encode_board(replay.board_at(0)) == initial
+        for i, expected in enumerate(snapshots.boards):
+            assert encode_board(replay.board_at(i + 1)) == expected
+        assert encode_board(replay.board_at_turn(6)) == encode_board(board)
+
+        counts = replay.state_at(len(replay))[1]
+        for player_id in range(3):
+            assert counts[player_id] == (data.smashes[player_id],
+                                         data.combines[player_id],
+                                         data.paints[player_id])
+
+    def test_replay_cut_off(self, tmp_path) -> None:
+        """Test that a replay log that was cut off anywhere after its header
+        is read up to its last whole record.
+        """
+        rng = random.Random(6)
+        data = GameData(generate_board(2, 750, rng),
+                        create_players(0, 2, [], rng), rng)
+        data.max_turns = 3
+        path = str(tmp_path / 'game.log')
+        writer = ReplayWriter(path, data, interval=2)
+        engine = Engine(data)
+        engine.add_observer(writer)
+        engine.play()
+        writer.close()
+
+        full = Replayer(path)
+        with open(path, 'rb') as file:
+            log = file.read()
+        cut_path = str(tmp_path / 'cut.log')
+        for length in range(_HEADER.size, len(log)):
+            with open(cut_path, 'wb') as file:
+                file.write(log[:length])
+            replay = Replayer(cut_path)
+            assert replay.moves == full.moves[:len(replay)]
+            if len(replay._checkpoints) > 0:
+                assert encode_board(replay.board_at(len(replay))) == \
+                    encode_board(full.board_at(len(replay)))
+
 
 class TestGoal:
     """A collection of methods for testing the sub-classes of Goal.
@@ -328,6 +1018,45 @@ class TestGoal:
             goal = PerimeterGoal(colour)
             assert goal.score(board_16x16) == expected
 
+    def test_cached_score(self, board_16x16) -> None:
+        """Test that cached scores match the scores computed from scratch, and
+        that the cache forgets its least recently used entries.
+        """
+        cache = EvaluationCache(3)
+        for colour in COLOUR_LIST:
+            for goal in [PerimeterGoal(colour), BlobGoal(colour)]:
+                assert goal.cached_score(board_16x16, cache) == \
+                    goal.score(board_16x16)
+                assert len(cache) <= 3
+
+        cache.store(('a',), 1)
+        cache.store(('b',), 2)
+        cache.store(('c',), 3)
+        assert cache.lookup(('a',)) == 1
+        cache.store(('d',), 4)
+        assert cache.lookup(('b',)) is None
+        assert cache.lookup(('a',)) == 1
+        assert cache.evictions > 0
+
+    def test_move_hints(self, board_16x16) -> None:
+        """Test that moves which cannot change a goal's score are recognized.
+        """
+        interior = board_16x16.children[0].children[2]
+        corner = board_16x16.children[0].children[0]
+
+        goal = PerimeterGoal(COLOUR_LIST[0])
+        hints = goal.move_hints(board_16x16)
+        assert goal.is_neutral(('paint', None), interior, hints)
+        assert not goal.is_neutral(('paint', None), corner, hints)
+        assert goal.is_neutral(('rotate', 1), board_16x16.children[1], hints)
+
+        goal = BlobGoal(COLOUR_LIST[2])
+        hints = goal.move_hints(board_16x16)
+        assert hints.target_cells(board_16x16) == 4
+        assert goal.is_neutral(('paint', None), corner, hints)
+        assert not goal.is_neutral(('paint', None), interior, hints)
+        assert not goal.is_neutral(('swap', 0), board_16x16, hints)
+
 
 if __name__ == '__main__':
     pytest.main(['example_tests.py'])
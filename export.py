@@ -0,0 +1,499 @@
+"""CSC148 Assignment 2
+
+=== CSC148 Winter 2020 ===
+Department of Computer Science,
+University of Toronto
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+Authors: Diane Horton, David Liu, Mario Badr, Sophia Huynh, Misha Schwartz,
+and Jaisie Sin
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) Diane Horton, David Liu, Mario Badr, Sophia Huynh,
+Misha Schwartz, and Jaisie Sin.
+
+=== Module Description ===
+
+This file contains functions that turn a recorded game into an animated GIF
+or raw video frames, without a display, e.g.:
+    python export.py game.log game.gif
+    python export.py game.log - --raw | ffmpeg -f rawvideo -pix_fmt rgb24 \\
+        -s 750x750 -r 25 -i - game.mp4
+
+Frames are generated one at a time from the replay log, so only a few of them
+are ever in memory, however long the game is. Each move is animated like
+AnimateMoveState animates it, with the block highlighted: rotations turn the
+block, swaps slide its halves past each other, smashes grow the new block from
+its centre, other moves fade from the block before the move to the block after
+it, and a pass shows its image.
+"""
+from __future__ import annotations
+from typing import BinaryIO, Iterator, Optional, Tuple
+import argparse
+import os
+import sys
+import numpy
+
+from actions import ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, \
+    SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, PASS
+from raster import board_frame, draw_highlight, PALETTE
+from replay import find_block, redo_move, Replayer
+from settings import ANIMATION_DURATION
+
+# The number of frames per second of an export.
+EXPORT_FPS = 25
+
+# The number of seconds that the first and last boards are shown for.
+HOLD_DURATION = 2
+
+# The colours of the pixels of exported frames: the colours of raster.PALETTE,
+# followed by a cube of 6 levels of red, green and blue for the images of
+# moves and the fades between boards.
+EXPORT_PALETTE = PALETTE + [(r * 51, g * 51, b * 51) for r in range(6)
+                            for g in range(6) for b in range(6)]
+
+_COLOURS = numpy.array(EXPORT_PALETTE, dtype=numpy.int32)
+
+# The index in EXPORT_PALETTE of the first colour of the cube
+_CUBE = len(PALETTE)
+
+# The codes that clear the table and end the image in GIF LZW data
+_CLEAR = 256
+_END = 257
+
+# The scaled images for each action, by the action and the size they were
+# scaled to, as arrays of RGB pixels and of alpha values
+_IMAGES = {}
+
+
+def _quantize(pixels: numpy.ndarray) -> numpy.ndarray:
+    """Return the index in EXPORT_PALETTE of the colour of the cube that is
+    closest to each of the RGB <pixels>.
+    """
+    levels = (pixels + 25) // 51
+    return (_CUBE + levels[..., 0] * 36 + levels[..., 1] * 6
+            + levels[..., 2]).astype(numpy.uint8)
+
+
+def _image(action: Tuple[str, Optional[int]], size: int) -> \
+        Optional[Tuple[numpy.ndarray, numpy.ndarray]]:
+    """Return the image for <action> stretched to <size> by <size>, as an array
+    of RGB pixels and an array of alpha values, both indexed by row, then
+    column, or None if <action> has no image.
+    """
+    # pygame is only needed to read and scale the images
+    import pygame
+    from renderer import load_action_image
+
+    key = (action, size)
+    if key not in _IMAGES:
+        image = load_action_image(action)
+        if image is None:
+            return None
+        image = pygame.transform.scale(image, (size, size))
+        _IMAGES[key] = (pygame.surfarray.array3d(image).transpose(1, 0, 2),
+                        pygame.surfarray.array_alpha(image).transpose())
+    return _IMAGES[key]
+
+
+def draw_image(frame: numpy.ndarray, action: Tuple[str, Optional[int]],
+               pos: Tuple[int, int], size: int) -> None:
+    """Draw the image for <action> at <pos>, stretched to <size>, onto the
+    <frame> of indices in EXPORT_PALETTE, as Renderer.draw_image does.
+
+    If the action has no image, nothing is drawn.
+    """
+    image = _image(action, size)
+    if image is None:
+        return
+
+    x, y = pos
+    area = frame[y:y + size, x:x + size]
+    # Rounded block sizes can make the image stick out of the frame
+    height, width = area.shape
+    pixels = image[0][:height, :width]
+    alpha = image[1][:height, :width]
+    shown = alpha > 0
+    weight = alpha[shown, None].astype(numpy.int32)
+    below = _COLOURS[area[shown]]
+    blended = (pixels[shown] * weight + below * (255 - weight) + 127) // 255
+    area[shown] = _quantize(blended)
+
+
+def _fade(before: numpy.ndarray, after: numpy.ndarray, pos: Tuple[int, int],
+          size: int, fraction: float) -> numpy.ndarray:
+    """Return a copy of <after> where the square at <pos> with <size> is
+    <fraction> of the way from how it looks in <before> to how it looks in
+    <after>.
+    """
+    frame = after.copy()
+    x, y = pos
+    old = before[y:y + size, x:x + size]
+    new = after[y:y + size, x:x + size]
+    changed = old != new
+    mixed = _COLOURS[old[changed]] * (1 - fraction) \
+        + _COLOURS[new[changed]] * fraction
+    frame[y:y + size, x:x + size][changed] = _quantize(
+        mixed.round().astype(numpy.int32))
+    return frame
+
+
+def _rotated(block: numpy.ndarray, angle: float) -> numpy.ndarray:
+    """Return the square <block> of pixels turned clockwise by <angle> degrees
+    about its centre, with BACKGROUND_COLOUR where no pixel of <block> lands.
+    """
+    size = block.shape[0]
+    radians = numpy.radians(angle)
+    cos, sin = numpy.cos(radians), numpy.sin(radians)
+    # Find the pixel of <block> that lands on each pixel, from its centre
+    offsets = numpy.arange(size) + 0.5 - size / 2
+    dx = offsets[None, :]
+    dy = offsets[:, None]
+    source_x = numpy.floor(cos * dx + sin * dy + size / 2).astype(int)
+    source_y = numpy.floor(cos * dy - sin * dx + size / 2).astype(int)
+    inside = (source_x >= 0) & (source_x < size) & (source_y >= 0) \
+        & (source_y < size)
+    rotated = numpy.zeros_like(block)
+    rotated[inside] = block[source_y[inside], source_x[inside]]
+    return rotated
+
+
+def _slid(block: numpy.ndarray, vertical: bool,
+          fraction: float) -> numpy.ndarray:
+    """Return the square <block> of pixels with its halves <fraction> of the
+    way through sliding past each other, left and right or top and bottom if
+    <vertical> is True.
+    """
+    if vertical:
+        return _slid(block.T, False, fraction).T
+
+    size = block.shape[0]
+    # The halves are split where Block puts its children
+    half = round(size / 2.0)
+    offset = round(half * fraction)
+    slid = numpy.zeros_like(block)
+    slid[:, half - offset:size - offset] = block[:, half:]
+    slid[:, offset:offset + half] = block[:, :min(half, size - offset)]
+    return slid
+
+
+def _grown(before: numpy.ndarray, after: numpy.ndarray,
+           fraction: float) -> numpy.ndarray:
+    """Return the square <before> of pixels with <after> scaled by <fraction>
+    drawn over its centre.
+    """
+    size = before.shape[0]
+    grown = max(round(size * fraction), 1)
+    pixels = numpy.arange(grown) * size // grown
+    start = (size - grown) // 2
+    block = before.copy()
+    block[start:start + grown, start:start + grown] = \
+        after[pixels[:, None], pixels[None, :]]
+    return block
+
+
+def animate_move(before: numpy.ndarray, after: numpy.ndarray,
+                 action: Tuple[str, Optional[int]], pos: Tuple[int, int],
+                 size: int, fraction: float) -> numpy.ndarray:
+    """Return a frame of the animation of <action> on the block at <pos> with
+    <size>, <fraction> of the way from the frame <before> the move to the
+    frame <after> it, as Renderer.draw_move draws it.
+
+    A rotation turns the block, a swap slides its halves past each other and
+    a smash grows the new block from its centre. Other moves fade from the
+    block before the move to the block after it.
+    """
+    if action not in [ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE,
+                      SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH]:
+        return _fade(before, after, pos, size, fraction)
+
+    # The block as a square, even where rounded sizes make it stick out of
+    # the frame
+    x, y = pos
+    area = before[y:y + size, x:x + size]
+    height, width = area.shape
+    old = numpy.zeros((size, size), dtype=numpy.uint8)
+    old[:height, :width] = area
+    new = numpy.zeros((size, size), dtype=numpy.uint8)
+    new[:height, :width] = after[y:y + size, x:x + size]
+
+    if action == ROTATE_CLOCKWISE:
+        block = _rotated(old, 90 * fraction)
+    elif action == ROTATE_COUNTER_CLOCKWISE:
+        block = _rotated(old, -90 * fraction)
+    elif action in [SWAP_HORIZONTAL, SWAP_VERTICAL]:
+        block = _slid(old, action == SWAP_VERTICAL, fraction)
+    else:
+        block = _grown(old, new, fraction)
+
+    frame = before.copy()
+    frame[y:y + size, x:x + size] = block[:height, :width]
+    return frame
+
+
+def game_frames(replay: Replayer, fps: int = EXPORT_FPS,
+                hold_duration: float = HOLD_DURATION) -> \
+        Iterator[numpy.ndarray]:
+    """Yield the frames of a video of the game recorded in <replay>, <fps>
+    frames per second, as arrays of indices in EXPORT_PALETTE indexed by row,
+    then column.
+
+    A frame that is shown for longer than 1 / <fps> seconds is yielded again
+    as the same array, which must not be mutated.
+    """
+    board = replay.board_at(0)
+    current = board_frame(board)
+    for dummy in range(round(hold_duration * fps)):
+        yield current
+
+    for _, action, position, level, argument in replay.moves:
+        size = find_block(board, position, level).size
+        redo_move(board, action, position, level, argument)
+        after = board_frame(board)
+
+        # Animate the move with the block highlighted, like AnimateMoveState.
+        # A pass does not change the block, so its image is shown instead.
+        steps = round(ANIMATION_DURATION * fps)
+        if action == PASS:
+            frame = current.copy()
+            draw_highlight(frame, position, size)
+            draw_image(frame, action, position, size)
+            for dummy in range(steps):
+                yield frame
+        else:
+            for step in range(steps):
+                frame = animate_move(current, after, action, position, size,
+                                     step / steps)
+                draw_highlight(frame, position, size)
+                yield frame
+
+        current = after
+        yield current
+
+    for dummy in range(round(hold_duration * fps)):
+        yield current
+
+
+def _lzw_compress(data: bytes) -> bytes:
+    """Return <data>, a sequence of 8-bit palette indices, compressed with the
+    variant of LZW used by GIF images.
+
+    Only strings of a single repeated index are used, which compresses a
+    little less than looking for every string, but only takes a step per
+    string instead of a step per index.
+    """
+    indices = numpy.frombuffer(data, dtype=numpy.uint8)
+    starts = numpy.flatnonzero(indices[1:] != indices[:-1]) + 1
+    values = indices[numpy.concatenate(([0], starts))].tolist() \
+        if len(indices) > 0 else []
+    lengths = numpy.diff(numpy.concatenate(
+        ([0], starts, [len(indices)]))).tolist()
+
+    output = bytearray()
+    bits = _CLEAR  # The codes that are not in output yet, first code lowest
+    num_bits = width = 9
+    next_code = _END + 1
+    # The codes of the strings of each index repeated 1, 2, ... times
+    repeats = {}
+    # The index and the number of times it is repeated in the last string,
+    # or None if no string was written since the table was cleared
+    last = None
+
+    for value, length in zip(values, lengths):
+        while length > 0:
+            if value not in repeats:
+                repeats[value] = [value]
+            codes = repeats[value]
+            count = min(length, len(codes))
+            bits |= codes[count - 1] << num_bits
+            num_bits += width
+            length -= count
+
+            if last is not None:
+                # The decoder adds the last string followed by the first
+                # index of this one to its table
+                if last == (value, len(codes)):
+                    codes.append(next_code)
+                next_code += 1
+                if next_code == 1 << width and width < 12:
+                    width += 1
+            last = (value, count)
+
+            if next_code == 4096:
+                # The table is full, so start again with an empty one
+                bits |= _CLEAR << num_bits
+                num_bits += width
+                width = 9
+                next_code = _END + 1
+                repeats = {}
+                last = None
+
+            if num_bits >= 4096:
+                output += (bits & ((1 << 4032) - 1)).to_bytes(504, 'little')
+                bits >>= 4032
+                num_bits -= 4032
+
+    bits |= _END << num_bits
+    num_bits += width
+    output += bits.to_bytes((num_bits + 7) // 8, 'little')
+    return bytes(output)
+
+
+class GifWriter:
+    """A writer of an animated GIF, one frame at a time.
+
+    Each frame only stores the smallest rectangle that changed since the last
+    frame, and frames that did not change at all are stored once, shown for
+    longer.
+    """
+    # === Private Attributes ===
+    # _file:
+    #   The file the GIF is written to.
+    # _fps:
+    #   The number of frames per second.
+    # _shown:
+    #   The last frame that was written, or None if none was.
+    # _pending:
+    #   The last frame given to write, which is not written until it is known
+    #   how long it is shown, or None if there is no such frame.
+    # _repeats:
+    #   The number of times _pending was given to write in a row.
+    _file: BinaryIO
+    _fps: int
+    _shown: Optional[numpy.ndarray]
+    _pending: Optional[numpy.ndarray]
+    _repeats: int
+
+    def __init__(self, file: BinaryIO, size: int, fps: int = EXPORT_FPS) -> \
+            None:
+        """Initialize this GifWriter to write a GIF of <size> by <size> frames,
+        shown <fps> frames per second, to <file>, and write its header.
+        """
+        self._file = file
+        self._fps = fps
+        self._shown = None
+        self._pending = None
+        self._repeats = 0
+
+        palette = bytearray()
+        for colour in EXPORT_PALETTE:
+            palette += bytes(colour)
+        palette += bytes(3 * (256 - len(EXPORT_PALETTE)))
+
+        # The header, with a global table of 256 colours, and an application
+        # extension that loops the animation forever
+        file.write(b'GIF89a' + size.to_bytes(2, 'little') * 2
+                   + b'\xf7\x00\x00' + palette
+                   + b'\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00')
+
+    def write(self, frame: numpy.ndarray) -> None:
+        """Add <frame>, an array of indices in EXPORT_PALETTE, to the GIF.
+        """
+        if self._pending is not None and (
+                frame is self._pending
+                or numpy.array_equal(frame, self._pending)):
+            self._repeats += 1
+            return
+
+        self._flush()
+        self._pending = frame
+        self._repeats = 1
+
+    def _flush(self) -> None:
+        """Write the pending frame, if there is one.
+        """
+        if self._pending is None:
+            return
+
+        frame = self._pending
+        if self._shown is None:
+            top, left = 0, 0
+            bottom, right = frame.shape
+        else:
+            changed = frame != self._shown
+            rows = numpy.flatnonzero(changed.any(axis=1))
+            columns = numpy.flatnonzero(changed.any(axis=0))
+            if len(rows) == 0:
+                # Only a single pixel is written, to show the frame for longer
+                rows = columns = numpy.zeros(1, dtype=int)
+            top, bottom = rows[0], rows[-1] + 1
+            left, right = columns[0], columns[-1] + 1
+
+        delay = round(self._repeats * 100 / self._fps)
+        data = _lzw_compress(frame[top:bottom, left:right].tobytes())
+
+        # A graphic control extension with the delay, keeping the last frame
+        # under this one, then the image descriptor and the compressed pixels
+        # in blocks of at most 255 bytes
+        record = bytearray(b'\x21\xf9\x04\x04' + min(delay, 0xffff).to_bytes(
+            2, 'little') + b'\x00\x00')
+        record += b'\x2c' + b''.join(int(n).to_bytes(2, 'little') for n in (
+            left, top, right - left, bottom - top)) + b'\x00\x08'
+        for i in range(0, len(data), 255):
+            chunk = data[i:i + 255]
+            record += bytes([len(chunk)]) + chunk
+        record += b'\x00'
+        self._file.write(record)
+
+        self._shown = frame
+        self._pending = None
+
+    def close(self) -> None:
+        """Write the last frame and the end of the GIF.
+        """
+        self._flush()
+        self._file.write(b'\x3b')
+
+
+def export_gif(replay: Replayer, file: BinaryIO, fps: int = EXPORT_FPS) -> \
+        None:
+    """Write the game recorded in <replay> to <file> as an animated GIF, <fps>
+    frames per second.
+    """
+    writer = GifWriter(file, replay.size, fps)
+    for frame in game_frames(replay, fps):
+        writer.write(frame)
+    writer.close()
+
+
+def export_raw(replay: Replayer, file: BinaryIO, fps: int = EXPORT_FPS) -> \
+        None:
+    """Write the frames of the game recorded in <replay>, <fps> frames per
+    second, to <file> as raw video: the RGB bytes of each pixel of each frame,
+    row by row.
+    """
+    colours = numpy.array(EXPORT_PALETTE, dtype=numpy.uint8)
+    last = None
+    data = b''
+    for frame in game_frames(replay, fps):
+        if frame is not last:
+            data = colours.take(frame, axis=0).tobytes()
+            last = frame
+        file.write(data)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Export a recorded Blocky game as a GIF or raw video.')
+    parser.add_argument('log', help='the replay log of the game')
+    parser.add_argument('output', help='the file to write, or - for stdout')
+    parser.add_argument('--raw', action='store_true',
+                        help='write raw RGB24 frames instead of a GIF')
+    parser.add_argument('--fps', type=int, default=EXPORT_FPS)
+    arguments = parser.parse_args()
+
+    # Stop pygame from printing a message to stdout, among the raw frames
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+    game = Replayer(arguments.log)
+    export = export_raw if arguments.raw else export_gif
+    if arguments.output == '-':
+        export(game, sys.stdout.buffer, arguments.fps)
+    else:
+        with open(arguments.output, 'wb') as output_file:
+            export(game, output_file, arguments.fps)
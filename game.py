@@ -25,14 +25,24 @@ Blocky game.
 At the bottom of the file, there are some function that you
 can call to try playing the game in several different configurations.
 """
-from typing import List
+from typing import List, Optional
+import random
 import pygame
 
 from block import generate_board
-from blocky import GameData, GameState, MainState
+from blocky import AnimateMoveState, GameState, MainState
+from engine import GameData
+from perf import FrameStats
 from player import create_players
 from renderer import Renderer
-from settings import BOARD_SIZE
+from replay import ReplayWriter
+from settings import ANIMATION_FPS, BOARD_SIZE
+
+# The key that shows and hides the statistics of the recent frames.
+STATS_KEY = pygame.K_F3
+
+# The most milliseconds between updates of the statistics on the screen.
+STATS_INTERVAL = 500
 
 
 class Game:
@@ -45,85 +55,195 @@ class Game:
     #   The data of the game that can be shared with other GameState objects.
     # _state:
     #   The current GameState.
+    # _replay:
+    #   The replay log that every move is recorded to, or None if the game is
+    #   not recorded.
+    # _stats:
+    #   The time spent in each phase of the recent frames.
+    # _stats_path:
+    #   The path of the file that the statistics of the recent frames are
+    #   written to as JSON when the game ends, or None if they are not.
+    # _show_stats:
+    #   True iff the statistics of the recent frames are drawn on the screen.
     _renderer: Renderer
     _data: GameData
     _state: GameState
+    _replay: Optional[ReplayWriter]
+    _stats: FrameStats
+    _stats_path: Optional[str]
+    _show_stats: bool
 
     def __init__(self, max_depth: int,
                  num_human: int,
                  num_random: int,
-                 smart_players: List[int]) -> None:
+                 smart_players: List[int],
+                 seed: Optional[int] = None,
+                 replay_path: Optional[str] = None,
+                 stats_path: Optional[str] = None,
+                 show_stats: bool = False,
+                 warm_up: bool = False) -> None:
         """Initialize this game, as described in the Assignment 2 handout.
 
+        If <seed> is not None, the board, the goals and every random choice
+        made during the game are the same each time a game is created with
+        that <seed>. If <replay_path> is not None, every move is recorded to a
+        replay log at that path.
+
+        The statistics of the recent frames are drawn on the screen if
+        <show_stats> is True, and can be shown or hidden with STATS_KEY. If
+        <stats_path> is not None, they are written to that path as JSON when
+        the game ends.
+
+        If <warm_up> is True, the images of the actions are loaded and scaled
+        to every block size before the game starts, rather than when they are
+        first drawn. This makes the first moves smoother, but the game slower
+        to start.
+
         Precondition:
             2 <= max_depth <= 5
         """
-        board = generate_board(max_depth, BOARD_SIZE)
-        players = create_players(num_human, num_random, smart_players)
+        rng = random.Random(seed)
+        board = generate_board(max_depth, BOARD_SIZE, rng)
+        players = create_players(num_human, num_random, smart_players, rng)
 
         self._renderer = Renderer(BOARD_SIZE)
-        self._data = GameData(board, players)
-        self._state = MainState(self._data)
+        if warm_up:
+            self._renderer.warm_up(max_depth)
+        self._data = GameData(board, players, rng)
+        self._stats = FrameStats()
+        self._stats_path = stats_path
+        self._show_stats = show_stats
+
+        if replay_path is None:
+            self._replay = None
+            self._state = MainState(self._data)
+        else:
+            self._replay = ReplayWriter(replay_path, self._data)
+            self._state = MainState(self._data, [self._replay])
 
     def run_game(self, num_turns: int) -> None:
         """Start the main game loop and stop after num_turns.
+
+        The loop sleeps until there is an event or the current GameState needs
+        to be updated, and only redraws the screen when what the GameState
+        draws has changed.
         """
         self._data.max_turns = num_turns
-        clock = pygame.time.Clock()
+        frame_time = 1000 // ANIMATION_FPS
+        render_time = 0
+        # The GameState and frame key of the last frame drawn
+        last_frame = None
+        # Whether the last update changed the GameState
+        changed = True
 
         while True:
-            clock.tick(30)
+            # Wait for an event, unless the GameState needs to be updated
+            # sooner. Waits are shortened by the time spent drawing, so that
+            # animations keep their frame rate when drawing is slow.
+            timeout = self._state.timeout()
+            if self._show_stats:
+                timeout = STATS_INTERVAL if timeout is None \
+                    else min(timeout, STATS_INTERVAL)
+            if changed or timeout == 0:
+                events = pygame.event.get()
+            elif timeout is None:
+                events = [pygame.event.wait()] + pygame.event.get()
+            else:
+                wait = max(1, min(timeout, frame_time - render_time))
+                events = [pygame.event.wait(wait)] + pygame.event.get()
+            self._stats.begin()
 
             # Process events
-            for e in pygame.event.get():
+            for e in events:
                 if e.type == pygame.QUIT:
+                    self._end()
                     return
-                else:
+                elif e.type == pygame.KEYDOWN and e.key == STATS_KEY:
+                    self._show_stats = not self._show_stats
+                elif e.type != pygame.NOEVENT:
                     self._state.process_event(e)
+            self._stats.lap('events')
 
             # Update the state of the game
-            self._state = self._state.update()
-
-            # Render the new state of the game
-            self._renderer.clear()
-            self._state.render(self._renderer)
+            state = self._state.update()
+            changed = state is not self._state
+            self._state = state
+            think_time = self._stats.lap('update')
+            if changed and isinstance(state, AnimateMoveState):
+                # A move was just made, which is when computer players think.
+                # Other changes of GameState take next to no time.
+                self._stats.add_think(think_time)
+
+            # Render the new state of the game, if it looks any different
+            frame = (state, state.frame_key(), self._stats_frame())
+            if frame != last_frame:
+                start = pygame.time.get_ticks()
+                self._renderer.clear()
+                state.render(self._renderer)
+                if self._show_stats:
+                    self._renderer.draw_stats(self._stats.overlay_lines())
+                self._stats.lap('render')
+
+                # Update the screen
+                self._renderer.flip()
+                self._stats.lap('flip')
+                self._stats.end_frame(self._renderer.squares_drawn())
+                render_time = pygame.time.get_ticks() - start
+                last_frame = frame
+
+    def _stats_frame(self) -> Optional[int]:
+        """Return a number that changes every STATS_INTERVAL milliseconds if
+        the statistics of the recent frames are shown, or None if they are
+        not.
+        """
+        if not self._show_stats:
+            return None
+        return pygame.time.get_ticks() // STATS_INTERVAL
 
-            # Update the screen
-            pygame.display.flip()
+    def _end(self) -> None:
+        """Close the replay log and write the statistics of the recent frames,
+        if they were asked for.
+        """
+        if self._replay is not None:
+            self._replay.close()
+        if self._stats_path is not None:
+            with open(self._stats_path, 'w') as file:
+                file.write(self._stats.to_json())
 
 
-def create_auto_game() -> Game:
+def create_auto_game(seed: Optional[int] = None) -> Game:
     """Run a game with two computer players of different "difficulty".
     """
-    return Game(3, 0, 0, [5, 10])
+    return Game(3, 0, 0, [5, 10], seed)
 
 
-def create_two_player_game() -> Game:
+def create_two_player_game(seed: Optional[int] = None) -> Game:
     """Run a game with two human players.
     """
-    return Game(3, 2, 0, [])
+    return Game(3, 2, 0, [], seed)
 
 
-def create_solitaire_game() -> Game:
+def create_solitaire_game(seed: Optional[int] = None) -> Game:
     """Run a game with one human player.
     """
-    return Game(3, 1, 0, [])
+    return Game(3, 1, 0, [], seed)
 
 
-def create_sample_game() -> Game:
+def create_sample_game(seed: Optional[int] = None) -> Game:
     """Run a sample game with one human player, one random player,
     and one smart player.
     """
-    return Game(3, 1, 1, [6])
+    return Game(3, 1, 1, [6], seed)
 
 
 if __name__ == '__main__':
     import python_ta
     python_ta.check_all(config={
-        'allowed-io': ['run_game'],
+        'allowed-io': ['run_game', '_end'],
         'allowed-import-modules': [
             'doctest', 'python_ta', 'random', 'typing', 'pygame', 'blocky',
-            'block', 'goal', 'player', 'renderer', 'settings'
+            'block', 'goal', 'player', 'renderer', 'settings', 'engine',
+            'replay', 'perf'
         ],
         'generated-members': 'pygame.*'
     })
@@ -131,9 +251,8 @@ if __name__ == '__main__':
     pygame.init()
 
     # If you want to run the same game sequence each time, to assist with
-    # debugging, uncomment-out the call to random.seed.
-    # import random
-    # random.seed(1001)
+    # debugging, pass a seed to one of the functions below, e.g.
+    # create_solitaire_game(1001).
 
     # game = create_sample_game()
     # game = create_auto_game()
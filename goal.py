@@ -23,14 +23,18 @@ This file contains the hierarchy of Goal classes.
 """
 from __future__ import annotations
 import random
-from typing import List, Tuple
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
 from block import Block
 from settings import colour_name, COLOUR_LIST
 
 
-def generate_goals(num_goals: int) -> List[Goal]:
+def generate_goals(num_goals: int,
+                   rng: Optional[random.Random] = None) -> List[Goal]:
     """Return a randomly generated list of goals with length num_goals.
 
+    The goals are generated using <rng>, or the random module if <rng> is None.
+
     All elements of the list must be the same type of goal, but each goal
     must have a different randomly generated colour from COLOUR_LIST. No two
     goals can have the same colour.
@@ -38,17 +42,20 @@ def generate_goals(num_goals: int) -> List[Goal]:
     Precondition:
         - num_goals <= len(COLOUR_LIST)
     """
-    x = random.randint(0, 1)
+    if rng is None:
+        rng = random
+
+    x = rng.randint(0, 1)
     lst = []
     unused_colours = COLOUR_LIST.copy()
     if x == 0:
         for dummy in range(num_goals):
-            random_colour = random.choice(unused_colours)
+            random_colour = rng.choice(unused_colours)
             unused_colours.remove(random_colour)
             lst.append(BlobGoal(random_colour))
     else:
         for dummy in range(num_goals):
-            random_colour = random.choice(unused_colours)
+            random_colour = rng.choice(unused_colours)
             unused_colours.remove(random_colour)
             lst.append(PerimeterGoal(random_colour))
 
@@ -124,6 +131,178 @@ def _flatten(block: Block) -> List[List[Tuple[int, int, int]]]:
     return output
 
 
+class MoveHints:
+    """Facts about every block in a board that tell whether a move on that block
+    can change the score of a goal with a given target colour.
+
+    === Public Attributes ===
+    colour:
+        The target colour these hints were computed for.
+    cells:
+        The board flattened into unit cells, as returned by _flatten.
+    """
+    # === Private Attributes ===
+    # _blocks:
+    #   Maps the id of each block in the board to the column and row of its
+    #   upper-left unit cell, the number of unit cells along its side, and the
+    #   number of its unit cells that are of the target colour.
+    colour: Tuple[int, int, int]
+    cells: List[List[Tuple[int, int, int]]]
+    _blocks: Dict[int, Tuple[int, int, int, int]]
+
+    def __init__(self, board: Block, colour: Tuple[int, int, int]) -> None:
+        """Initialize the hints for every block in <board> for a goal whose
+        target colour is <colour>.
+        """
+        self.colour = colour
+        self.cells = _flatten(board)
+        self._blocks = {}
+        self._add_block(board, 0, 0)
+
+    def _add_block(self, block: Block, col: int, row: int) -> int:
+        """Record the hints for <block> and its descendants, given that the
+        upper-left unit cell of <block> is at <col> and <row>.
+
+        Return the number of unit cells of <block> with the target colour.
+        """
+        span = 2 ** (block.max_depth - block.level)
+
+        if len(block.children) == 0:
+            target = span * span if block.colour == self.colour else 0
+        else:
+            half = span // 2
+            offsets = [(half, 0), (0, 0), (0, half), (half, half)]
+            target = 0
+            for i in range(4):
+                target += self._add_block(block.children[i],
+                                          col + offsets[i][0],
+                                          row + offsets[i][1])
+
+        self._blocks[id(block)] = (col, row, span, target)
+        return target
+
+    def bounds(self, block: Block) -> Tuple[int, int, int]:
+        """Return the column and row of the upper-left unit cell of <block>,
+        and the number of unit cells along its side.
+        """
+        col, row, span, _ = self._blocks[id(block)]
+        return col, row, span
+
+    def touches_edge(self, block: Block) -> bool:
+        """Return True iff <block> has a unit cell on the perimeter of the
+        board.
+        """
+        col, row, span, _ = self._blocks[id(block)]
+        length = len(self.cells)
+        return col == 0 or row == 0 or col + span == length or \
+            row + span == length
+
+    def target_cells(self, block: Block) -> int:
+        """Return the number of unit cells of <block> with the target colour.
+        """
+        return self._blocks[id(block)][3]
+
+    def is_uniform(self, block: Block) -> bool:
+        """Return True iff either all or none of the unit cells of <block> have
+        the target colour.
+        """
+        span = self._blocks[id(block)][2]
+        return self.target_cells(block) in (0, span * span)
+
+    def next_to_target(self, block: Block) -> bool:
+        """Return True iff a unit cell next to <block>, but outside of it, has
+        the target colour.
+        """
+        col, row, span = self.bounds(block)
+        length = len(self.cells)
+
+        for i in range(span):
+            neighbours = [(col - 1, row + i), (col + span, row + i),
+                          (col + i, row - 1), (col + i, row + span)]
+            for c, r in neighbours:
+                if 0 <= c < length and 0 <= r < length and \
+                        self.cells[c][r] == self.colour:
+                    return True
+
+        return False
+
+
+class EvaluationCache:
+    """A cache of goal scores that holds at most a fixed number of entries,
+    forgetting the least recently used entry when it is full.
+
+    Entries are keyed by tuples that include the hash of the shape and colours
+    of the Block they were computed for, so they stay valid as long as a Block
+    with the same structure is evaluated again, e.g. on a later turn.
+
+    === Public Attributes ===
+    capacity:
+        The maximum number of entries in this cache.
+    hits:
+        The number of lookups that found an entry.
+    misses:
+        The number of lookups that did not find an entry.
+    evictions:
+        The number of entries forgotten to make room for new ones.
+
+    === Representation Invariants ===
+    - capacity >= 1
+    - len(self) <= capacity
+    """
+    # === Private Attributes ===
+    # _entries:
+    #   The cached values, from least to most recently used.
+    capacity: int
+    hits: int
+    misses: int
+    evictions: int
+    _entries: OrderedDict
+
+    def __init__(self, capacity: int = 100000) -> None:
+        """Initialize an empty cache that holds at most <capacity> entries.
+
+        Precondition: capacity >= 1
+        """
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        """Return the number of entries in this cache.
+        """
+        return len(self._entries)
+
+    def lookup(self, key: Tuple) -> Optional[int]:
+        """Return the value stored for <key>, or None if there is none.
+        """
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        return value
+
+    def store(self, key: Tuple, value: int) -> None:
+        """Store <value> for <key>, forgetting the least recently used entry
+        if this cache is full.
+        """
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def hit_rate(self) -> float:
+        """Return the fraction of lookups that found an entry, or 0.0 if there
+        were no lookups.
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+
 class Goal:
     """A player goal in the game of Blocky.
 
@@ -153,6 +332,63 @@ class Goal:
         """
         raise NotImplementedError
 
+    def score_key(self, board: Block, form: Optional[int] = None) -> Tuple:
+        """Return the key under which the score of <board> for this goal is
+        kept in an EvaluationCache.
+
+        <form> is the canonical form of <board>, if it is already known.
+        Scores do not change when a board is rotated or reflected, so boards
+        with the same canonical form share a key.
+        """
+        if form is None:
+            form = board.canonical_form()
+        return ('score', type(self).__name__, self.colour, board.level,
+                board.max_depth, form)
+
+    def cached_score(self, board: Block, cache: EvaluationCache) -> int:
+        """Return the current score for this goal on the given board, using
+        and updating the scores in <cache>.
+        """
+        key = self.score_key(board)
+        score = cache.lookup(key)
+        if score is None:
+            score = self.evaluate(board, cache)
+            cache.store(key, score)
+        return score
+
+    def evaluate(self, board: Block, cache: EvaluationCache) -> int:
+        """Return the current score for this goal on the given board, without
+        looking it up in <cache>, but possibly using and updating the entries
+        of <cache> for parts of the board.
+        """
+        return self.score(board)
+
+    def move_hints(self, board: Block) -> MoveHints:
+        """Return the hints needed to judge moves on <board> for this goal.
+        """
+        return MoveHints(board, self.colour)
+
+    def is_neutral(self, action: Tuple[str, Optional[int]], block: Block,
+                   hints: MoveHints) -> bool:
+        """Return True iff doing <action> on <block> is certain not to change
+        the score of this goal. <hints> must have been computed by move_hints
+        for the board containing <block>.
+
+        The score of a goal only depends on which unit cells have its target
+        colour, so rotating, swapping or combining a block whose unit cells
+        are either all or none of the target colour cannot change it.
+        """
+        if action[0] in ['rotate', 'swap', 'combine']:
+            return hints.is_uniform(block)
+        return False
+
+    def move_priority(self, action: Tuple[str, Optional[int]], block: Block,
+                      hints: MoveHints) -> int:
+        """Return how promising doing <action> on <block> is for this goal.
+        Moves with a lower priority should be considered first.
+        """
+        return 0 if not hints.is_uniform(block) else 1
+
 
 class PerimeterGoal(Goal):
     """A goal of getting the largest number of unit cells of the goal colour
@@ -180,6 +416,56 @@ class PerimeterGoal(Goal):
         return 'Most unit cells of ' + \
             colour_name(self.colour) + ' on the perimeter'
 
+    def evaluate(self, board: Block, cache: EvaluationCache) -> int:
+        # The top, bottom, left and right side are all on the perimeter
+        return self._contribution(board, (True, True, True, True), cache)
+
+    def _contribution(self, block: Block, sides: Tuple[bool, bool, bool, bool],
+                      cache: EvaluationCache) -> int:
+        """Return the number of unit cells of <block> with the target colour
+        along the perimeter, counting a cell once for every side of the board
+        it is on.
+
+        <sides> tells whether the top, bottom, left and right side of <block>
+        are on the perimeter of the board. Contributions of subtrees are kept
+        in <cache>, since they do not depend on the rest of the board.
+        """
+        if not any(sides):
+            return 0
+        elif len(block.children) == 0:
+            if block.colour != self.colour:
+                return 0
+            return 2 ** (block.max_depth - block.level) * sum(sides)
+
+        key = ('perimeter', self.colour, block.level, block.max_depth,
+               block.structure_hash(), sides)
+        count = cache.lookup(key)
+        if count is None:
+            top, bottom, left, right = sides
+            count = self._contribution(block.children[0],
+                                       (top, False, False, right), cache) + \
+                self._contribution(block.children[1],
+                                   (top, False, left, False), cache) + \
+                self._contribution(block.children[2],
+                                   (False, bottom, left, False), cache) + \
+                self._contribution(block.children[3],
+                                   (False, bottom, False, right), cache)
+            cache.store(key, count)
+        return count
+
+    def is_neutral(self, action: Tuple[str, Optional[int]], block: Block,
+                   hints: MoveHints) -> bool:
+        # Blocks away from the perimeter cannot change it
+        if not hints.touches_edge(block):
+            return True
+        return Goal.is_neutral(self, action, block, hints)
+
+    def move_priority(self, action: Tuple[str, Optional[int]], block: Block,
+                      hints: MoveHints) -> int:
+        if action[0] == 'paint' or not hints.is_uniform(block):
+            return 0
+        return 1
+
 
 class BlobGoal(Goal):
     """A goal of getting the largest blob of the target colour.
@@ -267,13 +553,28 @@ class BlobGoal(Goal):
     def description(self) -> str:
         return 'Create a largest “blob” of ' + colour_name(self.colour)
 
+    def is_neutral(self, action: Tuple[str, Optional[int]], block: Block,
+                   hints: MoveHints) -> bool:
+        # Painting a unit cell that is not next to the target colour only
+        # makes a blob of size 1, which cannot beat an existing blob.
+        if action[0] == 'paint' and hints.target_cells(block) == 0 and \
+                not hints.next_to_target(block):
+            return any(self.colour in column for column in hints.cells)
+        return Goal.is_neutral(self, action, block, hints)
+
+    def move_priority(self, action: Tuple[str, Optional[int]], block: Block,
+                      hints: MoveHints) -> int:
+        if action[0] == 'paint' or hints.is_uniform(block):
+            return 0 if hints.next_to_target(block) else 1
+        return 0
+
 
 if __name__ == '__main__':
     import python_ta
     python_ta.check_all(config={
         'allowed-import-modules': [
             'doctest', 'python_ta', 'random', 'typing', 'block', 'settings',
-            'math', '__future__'
+            'math', '__future__', 'collections'
         ],
         'max-attributes': 15
     })
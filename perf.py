@@ -0,0 +1,227 @@
+"""CSC148 Assignment 2
+
+=== CSC148 Winter 2020 ===
+Department of Computer Science,
+University of Toronto
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+Authors: Diane Horton, David Liu, Mario Badr, Sophia Huynh, Misha Schwartz,
+and Jaisie Sin
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) Diane Horton, David Liu, Mario Badr, Sophia Huynh,
+Misha Schwartz, and Jaisie Sin.
+
+=== Module Description ===
+
+This file contains the classes that measure where the time of each frame of
+Game.run_game goes, over the most recent frames.
+"""
+from __future__ import annotations
+from typing import Deque, Dict, List, Optional
+import collections
+import json
+import math
+import time
+
+# The phases of each pass of the main loop, in order.
+PHASES = ['events', 'update', 'render', 'flip']
+
+# The number of recent samples that statistics are computed from.
+STATS_WINDOW = 240
+
+
+class RollingSamples:
+    """The most recent samples of a measurement.
+    """
+    # === Private Attributes ===
+    # _samples:
+    #   The samples, oldest first.
+    _samples: Deque[float]
+
+    def __init__(self, size: int = STATS_WINDOW) -> None:
+        """Initialize this RollingSamples to keep the last <size> samples.
+        """
+        self._samples = collections.deque(maxlen=size)
+
+    def __len__(self) -> int:
+        """Return the number of samples kept.
+        """
+        return len(self._samples)
+
+    def add(self, value: float) -> None:
+        """Add the sample <value>, dropping the oldest sample if there are
+        too many.
+        """
+        self._samples.append(value)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """Return the smallest sample that is at least as large as <percent>
+        percent of the samples, or None if there are no samples.
+
+        >>> samples = RollingSamples(3)
+        >>> for value in [5.0, 1.0, 2.0, 3.0]:
+        ...     samples.add(value)
+        >>> samples.percentile(50)
+        2.0
+        >>> samples.percentile(99)
+        3.0
+        """
+        if len(self._samples) == 0:
+            return None
+        ordered = sorted(self._samples)
+        rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+        return ordered[rank - 1]
+
+
+class FrameStats:
+    """The time spent in each phase of the recent passes of the main loop,
+    and how fast frames were drawn.
+
+    A pass starts with begin, and each of its phases ends with lap. Passes
+    that draw a frame end with end_frame.
+
+    === Public Attributes ===
+    frames:
+        The number of frames drawn since this FrameStats was created.
+    """
+    # === Private Attributes ===
+    # _phases:
+    #   The recent durations of each phase, in seconds.
+    # _frame_times:
+    #   The recent durations of the passes that drew a frame, in seconds.
+    # _frame_ends:
+    #   The times at which the recent frames were drawn.
+    # _think:
+    #   The recent durations of the updates in which a move was made, in
+    #   seconds. This is mostly the time computer players took to choose
+    #   their moves.
+    # _leaves:
+    #   The number of squares drawn in each recent frame.
+    # _mark:
+    #   The time at which the current phase started.
+    # _elapsed:
+    #   The number of seconds spent in the phases of the current pass.
+    frames: int
+    _phases: Dict[str, RollingSamples]
+    _frame_times: RollingSamples
+    _frame_ends: Deque[float]
+    _think: RollingSamples
+    _leaves: RollingSamples
+    _mark: float
+    _elapsed: float
+
+    def __init__(self, size: int = STATS_WINDOW) -> None:
+        """Initialize this FrameStats to keep the last <size> samples of each
+        measurement.
+        """
+        self.frames = 0
+        self._phases = {phase: RollingSamples(size) for phase in PHASES}
+        self._frame_times = RollingSamples(size)
+        self._frame_ends = collections.deque(maxlen=size)
+        self._think = RollingSamples(size)
+        self._leaves = RollingSamples(size)
+        self._mark = time.perf_counter()
+        self._elapsed = 0.0
+
+    def begin(self) -> None:
+        """Start a new pass of the main loop.
+        """
+        self._mark = time.perf_counter()
+        self._elapsed = 0.0
+
+    def lap(self, phase: str) -> float:
+        """Record that <phase> of the current pass has just ended, and return
+        how many seconds it took.
+        """
+        now = time.perf_counter()
+        seconds = now - self._mark
+        self._phases[phase].add(seconds)
+        self._elapsed += seconds
+        self._mark = now
+        return seconds
+
+    def add_think(self, seconds: float) -> None:
+        """Record that an update in which a move was made took <seconds>.
+        """
+        self._think.add(seconds)
+
+    def end_frame(self, leaves: int) -> None:
+        """Record that the current pass drew a frame with <leaves> squares.
+        """
+        self.frames += 1
+        self._frame_times.add(self._elapsed)
+        self._frame_ends.append(self._mark)
+        self._leaves.add(leaves)
+
+    def fps(self) -> Optional[float]:
+        """Return the number of frames drawn per second recently, or None if
+        fewer than two frames were drawn.
+        """
+        ends = self._frame_ends
+        if len(ends) < 2 or ends[-1] == ends[0]:
+            return None
+        return (len(ends) - 1) / (ends[-1] - ends[0])
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        """Return the recent statistics: the frames per second, the 50th and
+        99th percentiles of the times taken by frames, each phase and the
+        updates in which moves were made, in milliseconds, and of the number
+        of squares drawn per frame.
+
+        A statistic with no samples is None.
+        """
+        def milliseconds(value: Optional[float]) -> Optional[float]:
+            return None if value is None else value * 1000
+
+        stats = {'frames': self.frames, 'fps': self.fps()}
+        measurements = [('frame', self._frame_times), ('think', self._think)]
+        measurements.extend((phase, self._phases[phase]) for phase in PHASES)
+        for name, samples in measurements:
+            for percent in [50, 99]:
+                stats[f'{name}_p{percent}_ms'] = milliseconds(
+                    samples.percentile(percent))
+        stats['leaves_p50'] = self._leaves.percentile(50)
+        stats['leaves_p99'] = self._leaves.percentile(99)
+        return stats
+
+    def overlay_lines(self) -> List[str]:
+        """Return the lines of text of an overlay showing the recent
+        statistics.
+        """
+        stats = self.summary()
+
+        def show(value: Optional[float], digits: int = 1) -> str:
+            return '-' if value is None else f'{value:.{digits}f}'
+
+        lines = [f'FPS {show(stats["fps"])}',
+                 f'frame p50 {show(stats["frame_p50_ms"])} '
+                 f'p99 {show(stats["frame_p99_ms"])} ms',
+                 f'AI think p50 {show(stats["think_p50_ms"])} '
+                 f'p99 {show(stats["think_p99_ms"])} ms']
+        for phase in PHASES:
+            lines.append(f'{phase} p50 {show(stats[phase + "_p50_ms"], 2)} '
+                         f'p99 {show(stats[phase + "_p99_ms"], 2)} ms')
+        lines.append(f'leaves p50 {show(stats["leaves_p50"], 0)} '
+                     f'p99 {show(stats["leaves_p99"], 0)}')
+        return lines
+
+    def to_json(self) -> str:
+        """Return the recent statistics returned by summary as JSON.
+        """
+        return json.dumps(self.summary())
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'typing', '__future__', 'collections',
+            'json', 'math', 'time'
+        ]
+    })
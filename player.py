@@ -22,19 +22,26 @@ Misha Schwartz, and Jaisie Sin.
 This file contains the hierarchy of player classes.
 """
 from __future__ import annotations
-from typing import List, Optional, Tuple
+from typing import List, Optional, Tuple, TYPE_CHECKING
+import math
 import random
-import pygame
+import time
 
 from block import Block
-from goal import Goal, generate_goals
+from engine import apply_move
+from goal import EvaluationCache, Goal, generate_goals
 
-from actions import KEY_ACTION, ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, \
-    SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, PASS, PAINT, COMBINE
+from actions import ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, \
+    SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, PASS, PAINT, COMBINE, ACTION_PENALTY
 
+# pygame is only needed to respond to events, so it is imported when the first
+# event arrives rather than by every program that uses players.
+if TYPE_CHECKING:
+    import pygame
 
-def create_players(num_human: int, num_random: int, smart_players: List[int]) \
-        -> List[Player]:
+
+def create_players(num_human: int, num_random: int, smart_players: List[int],
+                   rng: Optional[random.Random] = None) -> List[Player]:
     """Return a new list of Player objects.
 
     <num_human> is the number of human player, <num_random> is the number of
@@ -45,22 +52,25 @@ def create_players(num_human: int, num_random: int, smart_players: List[int]) \
     <num_random> RandomPlayer objects, then the same number of SmartPlayer
     objects as the length of <smart_players>. The difficulty levels in
     <smart_players> should be applied to each SmartPlayer object, in order.
+
+    The goals are generated, and the computer players make their random
+    choices, using <rng>, or the random module if <rng> is None.
     """
     players = []
 
     x = 0
-    goals = generate_goals(num_human + num_random + len(smart_players))
+    goals = generate_goals(num_human + num_random + len(smart_players), rng)
 
     for dummy in range(num_human):
         players.append(HumanPlayer(x, goals[x]))
         x += 1
 
     for dummy in range(num_random):
-        players.append(RandomPlayer(x, goals[x]))
+        players.append(RandomPlayer(x, goals[x], rng))
         x += 1
 
     for player in smart_players:
-        players.append(SmartPlayer(x, goals[x], player))
+        players.append(SmartPlayer(x, goals[x], player, rng=rng))
         x += 1
 
     return players
@@ -111,18 +121,23 @@ def _get_block(block: Block, location: Tuple[int, int], level: int) -> \
         return current
 
 
-def _find_random_block(board: Block) -> Block:
+def _find_random_block(board: Block,
+                       rng: Optional[random.Random] = None) -> Block:
     """Find a random block where the
     board.level <= block.level <= depth
     if block the block does not have children, return that block
 
+    The block is chosen using <rng>, or the random module if <rng> is None.
     """
-    depth = random.randint(0, board.max_depth)
+    if rng is None:
+        rng = random
+
+    depth = rng.randint(0, board.max_depth)
     position = board.position
     size = board.size - 1
 
-    x_random = random.randint(position[0], position[0] + size)
-    y_random = random.randint(position[1], position[1] + size)
+    x_random = rng.randint(position[0], position[0] + size)
+    y_random = rng.randint(position[1], position[1] + size)
 
     block = _get_block(board, (x_random, y_random), depth)
     return block
@@ -206,6 +221,20 @@ class Player:
         """
         raise NotImplementedError
 
+    def allow_move(self) -> None:
+        """Let this player make its next move without waiting for an event.
+
+        Players that need input from a person ignore this.
+        """
+        return
+
+    def poll_interval(self) -> Optional[int]:
+        """Return the number of milliseconds after which generate_move should
+        be called again even if no event has happened, or None if this player
+        only makes moves in response to events.
+        """
+        return None
+
     def generate_move(self, board: Block) -> \
             Optional[Tuple[str, Optional[int], Block]]:
         """Return a potential move to make on the game board.
@@ -225,6 +254,49 @@ def _create_move(action: Tuple[str, Optional[int]], block: Block) -> \
     return action[0], action[1], block
 
 
+def _all_valid_moves(board: Block, colour: Tuple[int, int, int]) -> \
+        List[Tuple[str, Optional[int], Block]]:
+    """Return the list of valid moves on <board> and on every one of its
+    descendants.
+
+    <colour> is the goal colour to check if PAINT action is valid.
+    """
+    output = _valid_moves(board, colour)
+
+    for child in board.children:
+        output.extend(_all_valid_moves(child, colour))
+
+    return output
+
+
+def _useful_moves(board: Block, goal: Goal,
+                  rng: Optional[random.Random] = None) -> \
+        List[Tuple[str, Optional[int], Block]]:
+    """Return the list of valid moves on <board> and on every one of its
+    descendants that might change the score of <goal>.
+
+    The moves are in the order they should be considered: the most promising
+    moves for <goal> first, and among those, moves on larger blocks first.
+    Moves that are otherwise equal are shuffled using <rng>, or the random
+    module if <rng> is None.
+    """
+    if rng is None:
+        rng = random
+
+    hints = goal.move_hints(board)
+    output = []
+
+    for move in _all_valid_moves(board, goal.colour):
+        action = (move[0], move[1])
+        if not goal.is_neutral(action, move[2], hints):
+            output.append((goal.move_priority(action, move[2], hints),
+                           move[2].level, move))
+
+    rng.shuffle(output)
+    output.sort(key=lambda item: (item[0], item[1]))
+    return [item[2] for item in output]
+
+
 class HumanPlayer(Player):
     """A human player.
     """
@@ -256,6 +328,8 @@ class HumanPlayer(Player):
 
         If no block is selected by the player, return None.
         """
+        import pygame
+
         mouse_pos = pygame.mouse.get_pos()
         block = _get_block(board, mouse_pos, self._level)
 
@@ -266,6 +340,9 @@ class HumanPlayer(Player):
         the mapping in KEY_ACTION, as well as the W and S keys for changing
         the level.
         """
+        import pygame
+        from actions import KEY_ACTION
+
         if event.type == pygame.KEYDOWN:
             if event.key in KEY_ACTION:
                 self._desired_action = KEY_ACTION[event.key]
@@ -300,19 +377,28 @@ class RandomPlayer(Player):
     === Private Attributes ===
     _proceed: True when the player should make a move,
               False when the player should wait.
+    _rng: The random number generator used to choose moves.
     """
     _proceed: bool
+    _rng: random.Random
 
-    def __init__(self, player_id: int, goal: Goal) -> None:
+    def __init__(self, player_id: int, goal: Goal,
+                 rng: Optional[random.Random] = None) -> None:
         super().__init__(player_id, goal)
         self._proceed = False
+        self._rng = random if rng is None else rng
 
     def get_selected_block(self, board: Block) -> Optional[Block]:
         return None
 
     def process_event(self, event: pygame.event.Event) -> None:
+        import pygame
+
         if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-            self._proceed = True
+            self.allow_move()
+
+    def allow_move(self) -> None:
+        self._proceed = True
 
     def generate_move(self, board: Block) ->\
             Optional[Tuple[str, Optional[int], Block]]:
@@ -333,11 +419,11 @@ class RandomPlayer(Player):
             valid_list = _valid_moves(board, colour)
             if len(valid_list) == 0:  # no valid moves
                 return self.generate_move(board)
-            random_index = random.randint(0, len(valid_list) - 1)
+            random_index = self._rng.randint(0, len(valid_list) - 1)
             return valid_list[random_index]
 
         # find random block at random depth
-        block = _find_random_block(board)
+        block = _find_random_block(board, self._rng)
 
         # generate valid moves on that random block
         copy = block.create_copy()
@@ -347,7 +433,7 @@ class RandomPlayer(Player):
             return self.generate_move(board)
 
         # Make a random selection
-        random_index = random.randint(0, len(valid_list) - 1)
+        random_index = self._rng.randint(0, len(valid_list) - 1)
         move = valid_list[random_index][0]
         direction = valid_list[random_index][1]
         return move, direction, block
@@ -357,6 +443,13 @@ class SmartPlayer(Player):
     """A computer player that chooses moves more intelligently: It generates a
     set of random moves and, for each move, checks what its score would be if
     it were to make that move. Then it picks the one that yields the best score.
+
+    If it is given a time budget, it instead considers every valid move that
+    might change its score, most promising first, and picks the best one it
+    could assess before the budget ran out.
+    === Public Attributes ===
+    cache:
+      The scores this player has evaluated, kept from turn to turn.
     === Private Attributes ===
     _proceed:
       True when the player should make a move, False when the player should
@@ -364,21 +457,43 @@ class SmartPlayer(Player):
     _difficulty:
       A level indicating how difficult the smart player
       is to play against.
+    _time_budget:
+      The number of milliseconds this player may spend assessing moves, or
+      None if the number of moves assessed is set by <_difficulty> instead.
+    _rng:
+      The random number generator used to choose and assess moves.
     """
+    cache: EvaluationCache
     _proceed: bool
     _difficulty: int
+    _time_budget: Optional[int]
+    _rng: random.Random
 
-    def __init__(self, player_id: int, goal: Goal, difficulty: int) -> None:
+    def __init__(self, player_id: int, goal: Goal, difficulty: int,
+                 time_budget: Optional[int] = None,
+                 cache: Optional[EvaluationCache] = None,
+                 rng: Optional[random.Random] = None) -> None:
         super().__init__(player_id, goal)
         self._difficulty = difficulty
+        self._time_budget = time_budget
         self._proceed = False
+        self._rng = random if rng is None else rng
+
+        if cache is None:
+            cache = EvaluationCache()
+        self.cache = cache
 
     def get_selected_block(self, board: Block) -> Optional[Block]:
         return None
 
     def process_event(self, event: pygame.event.Event) -> None:
+        import pygame
+
         if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-            self._proceed = True
+            self.allow_move()
+
+    def allow_move(self) -> None:
+        self._proceed = True
 
     def generate_move(self, board: Block) ->\
             Optional[Tuple[str, Optional[int], Block]]:
@@ -397,14 +512,21 @@ class SmartPlayer(Player):
 
         self._proceed = False  # Must set to False before returning!
 
+        deadline = None
+        if self._time_budget is not None:
+            deadline = time.perf_counter() + self._time_budget / 1000
+
         main_copy = board.create_copy()
 
-        moves = self._valid_move_list(main_copy, self._difficulty)
+        if deadline is None:
+            moves = self._valid_move_list(main_copy, self._difficulty)
+        else:
+            moves = _useful_moves(main_copy, self.goal, self._rng)
 
         if moves == []:
             return _create_move(PASS, board)
 
-        x = self._calculate_best_move(board, moves)
+        x = self._calculate_best_move(board, moves, deadline)
 
         # find the block corresponding to the <board>
         block_being_moved = _get_block(board, x[2].position,
@@ -416,44 +538,52 @@ class SmartPlayer(Player):
         return x[0], x[1], block_being_moved
 
     def _calculate_best_move(self, board: Block,
-                             moves: List[Tuple[str, Optional[int], Block]]) \
+                             moves: List[Tuple[str, Optional[int], Block]],
+                             deadline: Optional[float] = None) \
             -> [Tuple[str, Optional[int], Block]]:
         """Return the best move that would result in the highest score
         disregarding penalties on the board.
 
+        If <deadline> is not None, stop assessing <moves> once
+        time.perf_counter() passes it, and return the best move so far.
+
         The method does not mutate <board>.
         """
-        best_score = self.goal.score(board)
+        best_score = self.goal.cached_score(board, self.cache)
         best_move = ('pass', None)
         current_block = board
 
-        for move in moves:
-            main_copy = board.create_copy()
-            block_being_moved = _get_block(main_copy, move[2].position,
-                                           move[2].level)
-
-            if move[0] == 'swap' and move[1] == 0:
-                block_being_moved.swap(0)
-
-            elif move[0] == 'swap' and move[1] == 1:
-                block_being_moved.swap(1)
-
-            elif move[0] == 'combine':
-                block_being_moved.combine()
-
-            elif move[0] == 'paint':
-                block_being_moved.paint(self.goal.colour)
-
-            elif move[0] == 'rotate' and move[1] == 1:
-                block_being_moved.rotate(1)
-
-            elif move[0] == 'rotate' and move[1] == 3:
-                block_being_moved.rotate(3)
-
-            elif move[0] == 'smash':
-                block_being_moved.smash()
+        # Goal scores do not change when the board is rotated or reflected,
+        # so only one move per resulting canonical form needs to be scored.
+        scored = {board.canonical_form()}
 
-            cur_score = self.goal.score(main_copy)
+        for move in moves:
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+
+            form = move[2].canonical_form_after((move[0], move[1]),
+                                                self.goal.colour)
+            if form in scored:
+                continue
+            elif form is not None:
+                scored.add(form)
+
+            cur_score = None
+            if form is not None:
+                key = self.goal.score_key(board, form)
+                cur_score = self.cache.lookup(key)
+
+            if cur_score is None:
+                main_copy = board.create_copy()
+                block_being_moved = _get_block(main_copy, move[2].position,
+                                               move[2].level)
+
+                apply_move(_create_move((move[0], move[1]), block_being_moved),
+                           self.goal.colour, self._rng)
+
+                cur_score = self.goal.evaluate(main_copy, self.cache)
+                if form is not None:
+                    self.cache.store(key, cur_score)
             if cur_score > best_score:
                 best_score = cur_score
                 best_move = (move[0], move[1])
@@ -469,16 +599,261 @@ class SmartPlayer(Player):
 
         moves = []
         colour = self.goal.colour
+        hints = self.goal.move_hints(board)
 
         for dummy in range(difficulty):
             # find random block, the moves do not need to be unique
-            block = _find_random_block(board)
-            moves.extend(_valid_moves(block, colour))
+            block = _find_random_block(board, self._rng)
+            for move in _valid_moves(block, colour):
+                # skip the moves that cannot change the score
+                if not self.goal.is_neutral((move[0], move[1]), block, hints):
+                    moves.append(move)
         if len(moves) > difficulty:
-            moves = random.sample(moves, difficulty)
+            moves = self._rng.sample(moves, difficulty)
         return moves
 
 
+class _MCTSNode:
+    """A node in the search tree of an MCTSPlayer.
+
+    === Public Attributes ===
+    board:
+        The board after the moves leading to this node have been performed.
+    move:
+        The move that lead from the parent to this node, as an action and the
+        (position, level) of the block it was performed on. None for the root.
+    parent:
+        The node this node was expanded from, or None for the root.
+    children:
+        The nodes that have been expanded from this node.
+    untried:
+        The moves from this node that have not been expanded yet, or None if
+        they have not been listed yet.
+    penalty:
+        The total penalty of the moves leading from the root to this node.
+    visits:
+        The number of playouts that went through this node.
+    total:
+        The sum of the rewards of the playouts that went through this node.
+    """
+    board: Block
+    move: Optional[Tuple[Tuple[str, Optional[int]], Tuple[int, int], int]]
+    parent: Optional[_MCTSNode]
+    children: List[_MCTSNode]
+    untried: Optional[List[Tuple[Tuple[str, Optional[int]], Tuple[int, int],
+                                 int]]]
+    penalty: int
+    visits: int
+    total: float
+
+    def __init__(self, board: Block,
+                 move: Optional[Tuple[Tuple[str, Optional[int]],
+                                      Tuple[int, int], int]] = None,
+                 parent: Optional[_MCTSNode] = None,
+                 penalty: int = 0) -> None:
+        """Initialize this node for <board>.
+        """
+        self.board = board
+        self.move = move
+        self.parent = parent
+        self.children = []
+        self.untried = None
+        self.penalty = penalty
+        self.visits = 0
+        self.total = 0.0
+
+    def list_moves(self, goal: Goal, rng: random.Random) -> None:
+        """Set <untried> to every valid move on this node's board that might
+        change the score of <goal>, and PASS, shuffling equally promising
+        moves using <rng>.
+        """
+        # Skip moves that lead to a rotation or reflection of a board that
+        # another move leads to, since they have the same score.
+        self.untried = []
+        forms = {self.board.canonical_form()}
+        for m in _useful_moves(self.board, goal, rng):
+            form = m[2].canonical_form_after((m[0], m[1]), goal.colour)
+            if form is None or form not in forms:
+                forms.add(form)
+                self.untried.append(((m[0], m[1]), m[2].position, m[2].level))
+
+        # Moves are expanded from the end, so put the most promising last
+        self.untried.reverse()
+        self.untried.insert(0, (PASS, self.board.position, self.board.level))
+
+    def best_child(self, exploration: float) -> _MCTSNode:
+        """Return the child with the highest upper confidence bound.
+
+        Precondition: len(self.children) > 0
+        """
+        log_visits = math.log(self.visits)
+        best = self.children[0]
+        best_bound = -math.inf
+
+        for child in self.children:
+            bound = child.total / child.visits + \
+                exploration * math.sqrt(log_visits / child.visits)
+            if bound > best_bound:
+                best = child
+                best_bound = bound
+
+        return best
+
+
+class MCTSPlayer(Player):
+    """A computer player that chooses moves using Monte Carlo tree search.
+
+    For each move, it runs a number of random playouts from the current board
+    and picks the move whose playouts led to the best score for its goal,
+    including penalties. The part of the search tree below the chosen move is
+    kept, and reused on the next turn if the board has not changed since.
+
+    === Public Attributes ===
+    playouts_per_second:
+        The number of playouts per second achieved when the last move was
+        generated.
+
+    === Private Attributes ===
+    _proceed:
+      True when the player should make a move, False when the player should
+      wait.
+    _playouts:
+      The number of playouts to run for each move.
+    _horizon:
+      The number of random moves made in each playout after leaving the tree.
+    _exploration:
+      The exploration constant of the upper confidence bound.
+    _root:
+      The node of the search tree for the board this player expects to see on
+      its next turn, or None if there is no tree to reuse.
+    _rng:
+      The random number generator used for the playouts.
+    """
+    playouts_per_second: float
+    _proceed: bool
+    _playouts: int
+    _horizon: int
+    _exploration: float
+    _root: Optional[_MCTSNode]
+    _rng: random.Random
+
+    def __init__(self, player_id: int, goal: Goal, playouts: int,
+                 horizon: int = 2, exploration: float = math.sqrt(2),
+                 rng: Optional[random.Random] = None) -> None:
+        super().__init__(player_id, goal)
+        self.playouts_per_second = 0.0
+        self._proceed = False
+        self._playouts = playouts
+        self._horizon = horizon
+        self._exploration = exploration
+        self._root = None
+        self._rng = random if rng is None else rng
+
+    def get_selected_block(self, board: Block) -> Optional[Block]:
+        return None
+
+    def process_event(self, event: pygame.event.Event) -> None:
+        import pygame
+
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            self.allow_move()
+
+    def allow_move(self) -> None:
+        self._proceed = True
+
+    def generate_move(self, board: Block) ->\
+            Optional[Tuple[str, Optional[int], Block]]:
+        """Return the move that was explored most often by the search, which
+        may be PASS.
+
+        This function does not mutate <board>.
+        """
+        if not self._proceed:
+            return None  # Do not remove
+
+        self._proceed = False  # Must set to False before returning!
+
+        if self._root is None or self._root.board != board:
+            self._root = _MCTSNode(board.create_copy())
+
+        start = time.perf_counter()
+        for dummy in range(self._playouts):
+            self._search(self._root)
+        elapsed = time.perf_counter() - start
+        if elapsed > 0:
+            self.playouts_per_second = self._playouts / elapsed
+
+        if self._root.children == []:
+            self._root = None
+            return _create_move(PASS, board)
+
+        best = max(self._root.children, key=lambda node: node.visits)
+        action, position, level = best.move
+
+        # Keep the subtree of the chosen move for the next turn
+        best.parent = None
+        self._root = best
+
+        if action == PASS:
+            return _create_move(PASS, board)
+
+        return _create_move(action, _get_block(board, position, level))
+
+    def _search(self, root: _MCTSNode) -> None:
+        """Run one playout from <root>, expanding the tree by at most one node
+        and updating the statistics of every node on the path.
+        """
+        # Selection, listing the moves of a node only once it is reached
+        node = root
+        if node.untried is None:
+            node.list_moves(self.goal, self._rng)
+        while node.untried == [] and node.children != []:
+            node = node.best_child(self._exploration)
+            if node.untried is None:
+                node.list_moves(self.goal, self._rng)
+
+        # Expansion
+        if node.untried != []:
+            action, position, level = node.untried.pop()
+            board = node.board.create_copy()
+            block = _get_block(board, position, level)
+            apply_move(_create_move(action, block), self.goal.colour,
+                       self._rng)
+
+            child = _MCTSNode(board, (action, position, level), node,
+                              node.penalty + ACTION_PENALTY[action])
+            node.children.append(child)
+            node = child
+
+        reward = self._playout(node)
+
+        # Backpropagation
+        while node is not None:
+            node.visits += 1
+            node.total += reward
+            node = node.parent
+
+    def _playout(self, node: _MCTSNode) -> float:
+        """Return the reward of making random moves from the board of <node>.
+
+        The reward is the score for this player's goal minus the penalties of
+        the moves made, as a fraction of the number of unit cells on the board.
+        """
+        board = node.board.create_copy()
+        colour = self.goal.colour
+        penalty = node.penalty
+
+        for dummy in range(self._horizon):
+            moves = _valid_moves(_find_random_block(board, self._rng), colour)
+            if moves != []:
+                move = self._rng.choice(moves)
+                if apply_move(move, colour, self._rng):
+                    penalty += ACTION_PENALTY[(move[0], move[1])]
+
+        cells = 4 ** (board.max_depth - board.level)
+        return (self.goal.score(board) - penalty) / cells
+
+
 if __name__ == '__main__':
     import python_ta
 
@@ -486,7 +861,7 @@ if __name__ == '__main__':
         'allowed-io': ['process_event'],
         'allowed-import-modules': [
             'doctest', 'python_ta', 'random', 'typing', 'actions', 'block',
-            'goal', 'pygame', '__future__'
+            'goal', 'pygame', '__future__', 'math', 'time'
         ],
         'max-attributes': 10,
         'generated-members': 'pygame.*'
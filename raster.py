@@ -0,0 +1,280 @@
+"""CSC148 Assignment 2
+
+=== CSC148 Winter 2020 ===
+Department of Computer Science,
+University of Toronto
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+Authors: Diane Horton, David Liu, Mario Badr, Sophia Huynh, Misha Schwartz,
+and Jaisie Sin
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) Diane Horton, David Liu, Mario Badr, Sophia Huynh,
+Misha Schwartz, and Jaisie Sin.
+
+=== Module Description ===
+
+This file contains functions that draw boards into NumPy arrays of pixels,
+without pygame or a display, e.g. on servers or in worker processes.
+
+The pixels are the same as those drawn by Renderer.draw_board and
+Renderer.highlight_block for the board area of the screen.
+"""
+from __future__ import annotations
+from typing import List, Optional, Tuple
+import numpy
+
+from block import Block
+from settings import BACKGROUND_COLOUR, OUTLINE_COLOUR, OUTLINE_THICKNESS, \
+    HIGHLIGHT_COLOUR, HIGHLIGHT_THICKNESS, COLOUR_LIST
+
+# The colours of every pixel that can be drawn. Frames are drawn as indices
+# in this list, which is much faster than drawing RGB pixels.
+PALETTE = [BACKGROUND_COLOUR, OUTLINE_COLOUR, HIGHLIGHT_COLOUR] + COLOUR_LIST
+
+# The index in PALETTE of each colour
+_INDEX = {colour: i for i, colour in reversed(list(enumerate(PALETTE)))}
+
+# The index drawn by _cells for cells that no square covers
+_NONE = 255
+
+# The colours of PALETTE packed into 4 bytes each, red first, so that a frame
+# can be turned into RGB pixels with a single lookup
+_PACKED = numpy.array([r | (g << 8) | (b << 16) for r, g, b in PALETTE],
+                      dtype='<u4')
+
+
+def new_frame(size: int) -> numpy.ndarray:
+    """Return a new <size> by <size> frame filled with BACKGROUND_COLOUR, as
+    an array of indices in PALETTE indexed by row, then column.
+    """
+    return numpy.zeros((size, size), dtype=numpy.uint8)
+
+
+def _draw_outline(frame: numpy.ndarray, pos: Tuple[int, int], size: int,
+                  index: int, thickness: int) -> None:
+    """Draw the outline of the square at <pos> with <size> onto <frame>, in
+    the colour at <index> in PALETTE, <thickness> pixels thick and inside the
+    square.
+    """
+    x, y = pos
+    thickness = min(thickness, size)
+    frame[y:y + thickness, x:x + size] = index
+    frame[y + size - thickness:y + size, x:x + size] = index
+    frame[y:y + size, x:x + thickness] = index
+    frame[y:y + size, x + size - thickness:x + size] = index
+
+
+def _ranges(lengths: numpy.ndarray) -> numpy.ndarray:
+    """Return the numbers from 0 up to each of <lengths>, one after another.
+
+    >>> _ranges(numpy.array([2, 0, 3])).tolist()
+    [0, 1, 0, 1, 2]
+    """
+    ends = numpy.cumsum(lengths)
+    return numpy.arange(ends[-1] if len(ends) > 0 else 0) \
+        - numpy.repeat(ends - lengths, lengths)
+
+
+def _cells(squares: List[Tuple[Tuple[int, int, int], Tuple[int, int], int]],
+           thickness: int) -> \
+        Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """Return the pixels of <squares> drawn in order, with an outline
+    <thickness> pixels thick, as a grid of cells of one colour each.
+
+    Return the x coordinates of the left edge of each column of cells and of
+    the right edge of the last one, the same for the y coordinates of the
+    rows, and the index in PALETTE of the colour of each cell, or _NONE if no
+    square covers it, indexed by row, then column. The cells are split at
+    every edge of a square and of its outline, so each is either inside or
+    outside each square, its fill and its outline.
+    """
+    table = numpy.array([(_INDEX[colour], pos[0], pos[1], size)
+                         for colour, pos, size in squares], dtype=numpy.int32)
+    colours, left, top, length = table.T
+    inset = numpy.minimum(length, thickness)
+    inner_left, inner_top = left + inset, top + inset
+    right, bottom = left + length, top + length
+    inner_right, inner_bottom = right - inset, bottom - inset
+    xs = numpy.unique(numpy.concatenate((left, inner_left, inner_right,
+                                         right)))
+    ys = numpy.unique(numpy.concatenate((top, inner_top, inner_bottom,
+                                         bottom)))
+
+    # List every cell covered by each square, row by row, with whether it is
+    # in the outline of the square
+    first_column = numpy.searchsorted(xs, left)
+    columns = numpy.searchsorted(xs, right) - first_column
+    left_columns = numpy.searchsorted(xs, inner_left) - first_column
+    right_columns = numpy.searchsorted(xs, inner_right) - first_column
+    first_row = numpy.searchsorted(ys, top)
+    rows = numpy.searchsorted(ys, bottom) - first_row
+    top_rows = numpy.searchsorted(ys, inner_top) - first_row
+    bottom_rows = numpy.searchsorted(ys, inner_bottom) - first_row
+
+    row_owners = numpy.repeat(numpy.arange(len(squares)), rows)
+    row = _ranges(rows)
+    row_outline = (row < top_rows[row_owners]) \
+        | (row >= bottom_rows[row_owners])
+    widths = columns[row_owners]
+    column = _ranges(widths)
+    owners = numpy.repeat(row_owners, widths)
+    outline = numpy.repeat(row_outline, widths) \
+        | (column < left_columns[owners]) | (column >= right_columns[owners])
+    cells = numpy.repeat((first_row[row_owners] + row) * (xs.size - 1)
+                         + first_column[row_owners], widths) + column
+
+    # Keep the square drawn last over each cell, which decides its colour.
+    # Squares are numbered from 1, so the cells that none covers stay 0.
+    drawn = numpy.zeros((ys.size - 1) * (xs.size - 1), dtype=numpy.int32)
+    numpy.maximum.at(drawn, cells,
+                     ((owners + 1) * 2 + outline).astype(numpy.int32))
+    drawn = drawn.reshape(ys.size - 1, xs.size - 1)
+    kinds = numpy.empty(2 * len(squares) + 2, dtype=numpy.uint8)
+    kinds[0::2] = numpy.append(_NONE, colours)
+    kinds[1::2] = _INDEX[OUTLINE_COLOUR]
+    return xs, ys, kinds[drawn]
+
+
+def _upscale(cells: numpy.ndarray, xs: numpy.ndarray, ys: numpy.ndarray,
+             width: int, height: int) -> numpy.ndarray:
+    """Return the pixels of <cells> with the edges <xs> and <ys> returned by
+    _cells, for the part of them inside a <width> by <height> frame at the
+    top left corner, indexed by row, then column.
+    """
+    xs = numpy.clip(xs, 0, width)
+    ys = numpy.clip(ys, 0, height)
+    return numpy.repeat(numpy.repeat(cells, numpy.diff(xs), axis=1),
+                        numpy.diff(ys), axis=0)
+
+
+def draw_squares(frame: numpy.ndarray,
+                 squares: List[Tuple[Tuple[int, int, int], Tuple[int, int],
+                                     int]],
+                 thickness: int = OUTLINE_THICKNESS) -> None:
+    """Draw each square in <squares> onto <frame>, with an outline <thickness>
+    pixels thick, in the same way as Renderer.draw_board.
+
+    Parts of squares outside <frame> are not drawn. The squares are drawn
+    all at once, by upscaling the grid of cells returned by _cells.
+    """
+    if len(squares) == 0:
+        return
+    xs, ys, kinds = _cells(squares, thickness)
+    height, width = frame.shape
+    pixels = _upscale(kinds, xs, ys, width, height)
+    x = min(max(xs[0], 0), width)
+    y = min(max(ys[0], 0), height)
+    area = frame[y:y + pixels.shape[0], x:x + pixels.shape[1]]
+    drawn = pixels != _NONE
+    if not drawn.all():
+        area[drawn] = pixels[drawn]
+    else:
+        area[:, :] = pixels
+
+
+def draw_highlight(frame: numpy.ndarray, pos: Tuple[int, int],
+                   size: int) -> None:
+    """Draw a highlighted square border at <pos> with <size> onto <frame>, in
+    the same way as Renderer.highlight_block.
+    """
+    _draw_outline(frame, pos, size, _INDEX[HIGHLIGHT_COLOUR],
+                  HIGHLIGHT_THICKNESS)
+
+
+def grid_frame(squares: List[Tuple[Tuple[int, int, int], Tuple[int, int],
+                                   int]], size: int, packed: bool = False) -> \
+        numpy.ndarray:
+    """Return a <size> by <size> frame with <squares> drawn onto it, as by
+    draw_squares.
+
+    If <packed> is True, the pixels are returned as by to_rgbx instead. Then
+    the grid of cells returned by _cells is packed before it is upscaled,
+    which is much faster than packing every pixel of the frame.
+    """
+    frame = new_frame(size)
+    if len(squares) == 0:
+        return to_rgbx(frame) if packed else frame
+
+    xs, ys, kinds = _cells(squares, OUTLINE_THICKNESS)
+    kinds[kinds == _NONE] = _INDEX[BACKGROUND_COLOUR]
+    if packed:
+        kinds = _PACKED.take(kinds)
+    pixels = _upscale(kinds, xs, ys, size, size)
+    if pixels.shape == frame.shape:
+        return pixels
+
+    if packed:
+        frame = to_rgbx(frame)
+    x = min(max(xs[0], 0), size)
+    y = min(max(ys[0], 0), size)
+    frame[y:y + pixels.shape[0], x:x + pixels.shape[1]] = pixels
+    return frame
+
+
+def to_rgbx(frame: numpy.ndarray) -> numpy.ndarray:
+    """Return the pixels of <frame> as an array of 4-byte pixels indexed by
+    row, then column, whose bytes are red, green, blue and zero.
+
+    The array is contiguous, so its bytes can be used by
+    pygame.image.frombuffer as 'RGBX' pixels.
+    """
+    return _PACKED.take(frame)
+
+
+def to_rgb(frame: numpy.ndarray) -> numpy.ndarray:
+    """Return the pixels of <frame> as an array of RGB pixels indexed by row,
+    then column.
+
+    The array is a view of a new array, and is not contiguous.
+    """
+    packed = to_rgbx(frame)
+    return packed.view(numpy.uint8).reshape(frame.shape + (4,))[:, :, :3]
+
+
+def board_frame(board: Block, highlight: Optional[Block] = None) -> \
+        numpy.ndarray:
+    """Return a frame showing <board>, with <highlight> highlighted if it is
+    not None, as an array of indices in PALETTE indexed by row, then column.
+
+    The frame is board.size by board.size pixels, and shows the board as if it
+    was at the top left corner of the frame.
+    """
+    squares = board.squares()
+    x, y = board.position
+    if (x, y) != (0, 0):
+        squares = [(colour, (pos[0] - x, pos[1] - y), size)
+                   for colour, pos, size in squares]
+
+    frame = grid_frame(squares, board.size)
+    if highlight is not None:
+        draw_highlight(frame, (highlight.position[0] - x,
+                               highlight.position[1] - y), highlight.size)
+    return frame
+
+
+def rasterize(board: Block, highlight: Optional[Block] = None) -> \
+        numpy.ndarray:
+    """Return an image of <board>, with <highlight> highlighted if it is not
+    None, as an array of RGB pixels indexed by row, then column.
+
+    See board_frame for where the board is in the image.
+    """
+    return to_rgb(board_frame(board, highlight))
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'typing', '__future__', 'numpy', 'block',
+            'settings'
+        ],
+        'generated-members': 'numpy.*'
+    })
@@ -21,7 +21,9 @@ Misha Schwartz, and Jaisie Sin.
 
 This file contains the class that "renders" the image of our game.
 """
-from typing import Dict, List, Tuple, Optional
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+import os
 import pygame
 
 from actions import ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE,\
@@ -30,8 +32,43 @@ from actions import ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE,\
 from settings import BACKGROUND_COLOUR, TEXT_COLOUR, OUTLINE_THICKNESS, \
     OUTLINE_COLOUR, HIGHLIGHT_THICKNESS, HIGHLIGHT_COLOUR, COLOUR_LIST, \
     colour_name
+from raster import grid_frame
 
 Y_FONT_PADDING = 2
+# The space between the box of draw_stats and its text
+STATS_PADDING = 4
+
+
+# The image file displayed for each action
+_IMAGE_FILES = {
+    ROTATE_CLOCKWISE: 'images/rotate-cw.png',
+    ROTATE_COUNTER_CLOCKWISE: 'images/rotate-ccw.png',
+    SWAP_HORIZONTAL: 'images/swap-horizontal.png',
+    SWAP_VERTICAL: 'images/swap-vertical.png',
+    SMASH: 'images/smash.png',
+    COMBINE: 'images/combine.png',
+    PAINT: 'images/paint.png',
+    PASS: 'images/pass.png'
+}
+
+
+# The most scaled images that a Renderer keeps. This is enough for every action
+# at every block size of a board with a max_depth of 5.
+ICON_CACHE_SIZE = 64
+
+# The most lines of text that a Renderer keeps rendered. This is enough for the
+# status message, the final scores and every line of the statistics overlay.
+TEXT_CACHE_SIZE = 64
+
+# Estimates of the time taken to draw a board, in nanoseconds, which decide
+# how _draw_board_squares draws it. Filling a square with pygame costs
+# PYGAME_SQUARE_COST, plus PYGAME_PIXEL_COST per pixel of the square. Drawing
+# the whole board with raster.grid_frame costs GRID_PIXEL_COST per pixel of
+# the board, plus GRID_SQUARE_COST per square.
+PYGAME_SQUARE_COST = 13000
+PYGAME_PIXEL_COST = 2.0
+GRID_PIXEL_COST = 1.0
+GRID_SQUARE_COST = 2300
 
 
 def _load_image(path_to_file: str) -> pygame.Surface:
@@ -50,6 +87,62 @@ def _load_image(path_to_file: str) -> pygame.Surface:
     return image
 
 
+def load_action_image(action: Tuple[str, Optional[int]]) -> \
+        Optional[pygame.Surface]:
+    """Load the image for <action>, or return None if <action> has no image.
+
+    The image is found relative to this file's directory, so it can be loaded
+    from any working directory. If an error occurs, print it before exiting
+    the program.
+    """
+    if action not in _IMAGE_FILES:
+        return None
+    return _load_image(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                    _IMAGE_FILES[action]))
+
+
+def _draw_squares(surface: pygame.Surface,
+                  squares: List[Tuple[Tuple[int, int, int], Tuple[int, int],
+                                      int]]) -> None:
+    """Draw each square in <squares> onto <surface>, with an outline.
+
+    The squares are filled rather than drawn with pygame.draw.rect, which draws
+    the outline along the edge of the clipping area of <surface> instead of
+    the edge of the square. The pixels are the same otherwise.
+    """
+    for colour, pos, size in squares:
+        x, y = pos
+        thickness = min(OUTLINE_THICKNESS, size)
+        surface.fill(colour, (x, y, size, size))
+        surface.fill(OUTLINE_COLOUR, (x, y, size, thickness))
+        surface.fill(OUTLINE_COLOUR, (x, y + size - thickness, size, thickness))
+        surface.fill(OUTLINE_COLOUR, (x, y, thickness, size))
+        surface.fill(OUTLINE_COLOUR, (x + size - thickness, y, thickness, size))
+
+
+def _draw_board_squares(surface: pygame.Surface,
+                        squares: List[Tuple[Tuple[int, int, int],
+                                            Tuple[int, int], int]],
+                        size: int) -> None:
+    """Draw each square in <squares> onto <surface>, as by _draw_squares, for
+    a board with dimensions <size> x <size> at the top left of <surface>.
+
+    The board must have been cleared with BACKGROUND_COLOUR. The squares are
+    filled one by one, or the whole board is drawn with raster.grid_frame,
+    whichever is estimated to be faster.
+    """
+    area = sum(square[2] * square[2] for square in squares)
+    fill_cost = len(squares) * PYGAME_SQUARE_COST + area * PYGAME_PIXEL_COST
+    grid_cost = size * size * GRID_PIXEL_COST \
+        + len(squares) * GRID_SQUARE_COST
+    if fill_cost <= grid_cost:
+        _draw_squares(surface, squares)
+    else:
+        frame = grid_frame(squares, size, packed=True)
+        surface.blit(pygame.image.frombuffer(frame, (size, size), 'RGBX'),
+                     (0, 0))
+
+
 def _print_to_image(text: str, x: int, y: int, font: pygame.font.Font,
                     image: pygame.Surface,
                     colour: Tuple[int, int, int] = TEXT_COLOUR) -> None:
@@ -142,6 +235,9 @@ def _print_instructions(screen: pygame.Surface,
 class Renderer:
     """
     A class designed to handle drawing the different aspects of a Blocky game.
+
+    The Renderer remembers what it drew in the last frame, and only redraws the
+    parts of the screen that change. Call flip to show each frame.
     """
     # === Private Attributes ===
     # _screen:
@@ -150,14 +246,64 @@ class Renderer:
     #   The font to use for text being drawn.
     # _images:
     #   A dictionary mapping actions to images that are displayed in the game.
+    #   Each image is only loaded the first time it is displayed.
+    # _scaled:
+    #   The images scaled to the sizes they were displayed at, keyed by action
+    #   and size, from least to most recently used. There are at most
+    #   ICON_CACHE_SIZE of them.
+    # _texts:
+    #   The lines of text rendered with <_font>, keyed by text and colour, from
+    #   least to most recently used. There are at most TEXT_CACHE_SIZE of them.
     # _status_position:
     #   The (x, y) position of the status messages.
+    # _board_size:
+    #   The height and width of the board.
+    # _board:
+    #   An image of the board made of <_board_squares>, kept off the screen.
+    # _board_squares:
+    #   The squares last drawn by draw_board, or None if there are none. The
+    #   list is only compared by identity, since a board replaces its list of
+    #   squares whenever it changes.
+    # _board_set:
+    #   The squares in <_board_squares>, as a set.
+    # _board_shown:
+    #   True iff <_board> is on the screen, apart from <_overlays>.
+    # _snapshot:
+    #   The image from snapshot_board on the screen, apart from <_overlays>,
+    #   or None if there is none.
+    # _overlays:
+    #   The areas drawn over the board since it was last drawn, such as
+    #   highlights, images and text.
+    # _status:
+    #   The status message on the screen, or None if it needs to be drawn.
+    # _dirty:
+    #   The areas of the screen changed since the last flip, or None if the
+    #   whole screen needs to be shown.
+    # _needs_base:
+    #   True iff clear has been called, but the board has not been drawn since.
+    # _squares_drawn:
+    #   The number of squares drawn since clear was last called.
     _screen: pygame.Surface
     _instructions: pygame.Surface
     _images: Dict[Tuple[str, Optional[int]], pygame.Surface]
+    _scaled: OrderedDict
+    _texts: OrderedDict
     _font: pygame.font.Font
     _status_position: Tuple[int, int]
-    _clear_rect: Tuple[Tuple[int, int], Tuple[int, int]]
+    _clear_rect: pygame.Rect
+    _status_rect: pygame.Rect
+    _board_size: int
+    _board: pygame.Surface
+    _board_squares: Optional[List[Tuple[Tuple[int, int, int], Tuple[int, int],
+                                        int]]]
+    _board_set: Set[Tuple[Tuple[int, int, int], Tuple[int, int], int]]
+    _board_shown: bool
+    _snapshot: Optional[pygame.Surface]
+    _overlays: List[pygame.Rect]
+    _status: Optional[str]
+    _dirty: Optional[List[pygame.Rect]]
+    _needs_base: bool
+    _squares_drawn: int
 
     def __init__(self, size: int) -> None:
         """Initialize this Renderer for a board with dimensions <size> x <size>.
@@ -174,23 +320,70 @@ class Renderer:
                                                  height)
 
         self._status_position = (10, size + Y_FONT_PADDING)
-        self._clear_rect = ((0, 0), (size, height))
-
-        self._images = {
-            ROTATE_CLOCKWISE: _load_image('images/rotate-cw.png'),
-            ROTATE_COUNTER_CLOCKWISE: _load_image('images/rotate-ccw.png'),
-            SWAP_HORIZONTAL: _load_image('images/swap-horizontal.png'),
-            SWAP_VERTICAL: _load_image('images/swap-vertical.png'),
-            SMASH: _load_image('images/smash.png'),
-            COMBINE: _load_image('images/combine.png'),
-            PAINT: _load_image('images/paint.png'),
-            PASS: _load_image('images/pass.png')
-        }
+        self._clear_rect = pygame.Rect(0, 0, size, height)
+        self._status_rect = pygame.Rect(0, self._status_position[1], size,
+                                        height - self._status_position[1])
+        self._board_size = size
+        self._images = {}
+        self._scaled = OrderedDict()
+        self._texts = OrderedDict()
+
+        self._board = pygame.Surface(self._clear_rect.size)
+        self._board.fill(BACKGROUND_COLOUR)
+        self._board_squares = None
+        self._board_set = set()
+        self._board_shown = False
+        self._snapshot = None
+        self._overlays = []
+        self._status = None
+        self._dirty = None
+        self._needs_base = False
+        self._squares_drawn = 0
 
     def clear(self) -> None:
-        """Clear the screen with BACKGROUND_COLOUR.
+        """Start drawing a new frame.
+
+        If the frame draws the board first, only the parts of the board that
+        are different from the last frame are redrawn. Otherwise, the screen is
+        cleared with BACKGROUND_COLOUR before anything else is drawn.
+        """
+        self._needs_base = True
+        self._squares_drawn = 0
+
+    def squares_drawn(self) -> int:
+        """Return the number of squares of boards drawn since clear was last
+        called, including squares drawn again to update part of the board.
+        """
+        return self._squares_drawn
+
+    def _clear_if_needed(self) -> None:
+        """Clear the screen with BACKGROUND_COLOUR if clear has been called but
+        the board has not been drawn since.
+        """
+        if self._needs_base:
+            self._needs_base = False
+            self._screen.fill(BACKGROUND_COLOUR, self._clear_rect)
+            self._board_shown = False
+            self._snapshot = None
+            self._overlays = []
+            self._status = None
+            self._mark_dirty(self._clear_rect)
+
+    def _mark_dirty(self, rect: pygame.Rect) -> None:
+        """Record that <rect> has changed since the last flip.
+        """
+        if self._dirty is not None:
+            self._dirty.append(rect)
+
+    def flip(self) -> None:
+        """Show everything drawn since the last flip on the display, updating
+        only the parts that changed.
         """
-        self._screen.fill(BACKGROUND_COLOUR, self._clear_rect)
+        if self._dirty is None:
+            pygame.display.flip()
+        elif self._dirty:
+            pygame.display.update(self._dirty)
+        self._dirty = []
 
     def draw_image(self, action: Tuple[str, Optional[int]],
                    pos: Tuple[int, int], size: int) -> None:
@@ -199,43 +392,283 @@ class Renderer:
 
         If the action is not supported, no image is drawn.
         """
-        if action in self._images:
-            image = self._images[action]
-            image = pygame.transform.scale(image, (size, size))
-            self._screen.blit(image, pos)
+        if action in _IMAGE_FILES:
+            self._clear_if_needed()
+            image = self._scaled_image(action, size)
+            self._overlay(self._screen.blit(image, pos))
+
+    def _scaled_image(self, action: Tuple[str, Optional[int]],
+                      size: int) -> pygame.Surface:
+        """Return the image for <action> stretched to <size> by <size>, scaling
+        it only if it is not cached.
+
+        Precondition: action in _IMAGE_FILES
+        """
+        key = (action, size)
+        if key in self._scaled:
+            self._scaled.move_to_end(key)
+            return self._scaled[key]
+
+        if action not in self._images:
+            self._images[action] = load_action_image(action)
+
+        image = pygame.transform.scale(self._images[action], (size, size))
+        self._scaled[key] = image
+        if len(self._scaled) > ICON_CACHE_SIZE:
+            self._scaled.popitem(last=False)
+        return image
+
+    def warm_up(self, max_depth: int) -> None:
+        """Load and scale the image for every action to the size of every
+        block on a board with <max_depth>, so that no image needs to be scaled
+        while the game is played.
+        """
+        size = self._board_size
+        for dummy in range(max_depth + 1):
+            for action in _IMAGE_FILES:
+                self._scaled_image(action, size)
+            size = round(size / 2.0)
+
+    def _overlay(self, rect: pygame.Rect) -> None:
+        """Record that <rect> was drawn over the board.
+        """
+        self._overlays.append(rect)
+        self._mark_dirty(rect)
 
     def draw_board(self, squares: List[Tuple[Tuple[int, int, int],
                                              Tuple[int, int], int]]) -> None:
         """Draw each block in blocks onto the screen.
+
+        The board is kept in an image off the screen, which is only updated
+        when <squares> is a different list from the last one drawn. Then only
+        the changed parts of the image, and the parts of the screen that were
+        drawn over since the board was last drawn, are copied to the screen.
+        """
+        self._needs_base = False
+
+        if squares is not self._board_squares:
+            rects = self._update_board(squares)
+        else:
+            rects = []
+
+        if self._board_shown:
+            rects.extend(self._overlays)
+        else:
+            rects = [self._clear_rect]
+
+        for rect in rects:
+            rect = rect.clip(self._clear_rect)
+            self._screen.blit(self._board, rect, rect)
+            self._mark_dirty(rect)
+            if rect.colliderect(self._status_rect):
+                self._status = None
+
+        self._board_shown = True
+        self._snapshot = None
+        self._overlays = []
+
+    def _update_board(self, squares: List[Tuple[Tuple[int, int, int],
+                                                Tuple[int, int], int]]) -> \
+            List[pygame.Rect]:
+        """Update the image of the board to show <squares>, redrawing only the
+        squares that changed, and return the areas of the image that changed.
+        """
+        new = set(squares)
+        changed = new.symmetric_difference(self._board_set)
+        if self._board_squares is None or len(changed) > len(squares) // 2:
+            rects = [self._clear_rect.copy()]
+            self._board.fill(BACKGROUND_COLOUR)
+            _draw_board_squares(self._board, squares, self._board_size)
+            self._squares_drawn += len(squares)
+        else:
+            rects = [pygame.Rect(pos[0], pos[1], size, size)
+                     for colour, pos, size in changed]
+            for rect in rects:
+                self._board.fill(BACKGROUND_COLOUR, rect)
+
+            # Squares overlap their neighbours by a pixel when sizes are
+            # rounded, so every square touching a changed area is redrawn in
+            # the usual order, clipped to that area.
+            for colour, pos, size in squares:
+                square = pygame.Rect(pos[0], pos[1], size, size)
+                for i in square.collidelistall(rects):
+                    self._board.set_clip(rects[i])
+                    _draw_squares(self._board, [(colour, pos, size)])
+                    self._squares_drawn += 1
+            self._board.set_clip(None)
+
+        self._board_squares = squares
+        self._board_set = new
+        return rects
+
+    def snapshot_board(self, squares: List[Tuple[Tuple[int, int, int],
+                                                 Tuple[int, int], int]]) -> \
+            pygame.Surface:
+        """Return an image of the board made of <squares>, which can be drawn
+        any number of times with draw_snapshot.
         """
-        for colour, pos, size in squares:
-            rect = (pos[0], pos[1], size, size)
-            pygame.draw.rect(self._screen, colour, rect, 0)
-            pygame.draw.rect(self._screen, OUTLINE_COLOUR, rect,
-                             OUTLINE_THICKNESS)
+        size = (self._board_size, self._board_size)
+        if squares is self._board_squares:
+            # The image of the board already shows these squares
+            return self._board.subsurface((0, 0), size).copy()
+
+        snapshot = pygame.Surface(size)
+        snapshot.fill(BACKGROUND_COLOUR)
+        _draw_board_squares(snapshot, squares, self._board_size)
+        self._squares_drawn += len(squares)
+        return snapshot
+
+    def draw_snapshot(self, snapshot: pygame.Surface) -> None:
+        """Draw an image of the board returned by snapshot_board onto the
+        screen.
+
+        If <snapshot> is already on the screen, only the parts of the screen
+        that were drawn over since are copied from it.
+        """
+        self._needs_base = False
+        if snapshot is self._snapshot:
+            area = snapshot.get_rect()
+            for rect in self._overlays:
+                rect = rect.clip(area)
+                self._mark_dirty(self._screen.blit(snapshot, rect, rect))
+        else:
+            self._mark_dirty(self._screen.blit(snapshot, (0, 0)))
+        self._board_shown = False
+        self._snapshot = snapshot
+        self._overlays = []
+
+    def block_image(self, snapshot: pygame.Surface, pos: Tuple[int, int],
+                    size: int) -> pygame.Surface:
+        """Return a copy of the square at <pos> with <size> in <snapshot>, an
+        image of the board returned by snapshot_board, to be drawn with
+        draw_move.
+
+        The copy has per-pixel alpha, so that the areas added around it when
+        it is rotated are transparent.
+        """
+        image = pygame.Surface((size, size), pygame.SRCALPHA)
+        image.blit(snapshot, (0, 0), (pos, (size, size)))
+        return image
+
+    def draw_move(self, action: Tuple[str, Optional[int]],
+                  before: pygame.Surface, after: pygame.Surface,
+                  pos: Tuple[int, int], size: int, progress: float) -> None:
+        """Draw the block at <pos> with <size> <progress> of the way from 0 to
+        1 through the animation of <action>, where <before> and <after> are
+        the images of the block before and after the move, returned by
+        block_image.
+
+        A rotation turns <before>, a swap slides its halves past each other
+        and a smash grows <after> from the centre of the block. Other moves
+        fade from <before> to <after>. The images are transformed rather than
+        drawn again, and nothing is drawn outside the block.
+        """
+        self._clear_if_needed()
+        rect = pygame.Rect(pos[0], pos[1], size, size)
+        self._screen.set_clip(rect)
+        self._screen.fill(BACKGROUND_COLOUR, rect)
+
+        if progress >= 1:
+            self._screen.blit(after, rect)
+        elif action in [ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE]:
+            # pygame turns images counter-clockwise by positive angles
+            angle = 90 * progress
+            if action == ROTATE_CLOCKWISE:
+                angle = -angle
+            image = pygame.transform.rotate(before, angle)
+            self._screen.blit(image, image.get_rect(center=rect.center))
+        elif action in [SWAP_HORIZONTAL, SWAP_VERTICAL]:
+            # The halves are split where Block puts its children
+            half = round(size / 2.0)
+            offset = round(half * progress)
+            if action == SWAP_HORIZONTAL:
+                first = pygame.Rect(0, 0, half, size)
+                second = pygame.Rect(half, 0, size - half, size)
+                shift = (offset, 0)
+            else:
+                first = pygame.Rect(0, 0, size, half)
+                second = pygame.Rect(0, half, size, size - half)
+                shift = (0, offset)
+            self._screen.blit(before, second.move(pos).move(-shift[0],
+                                                             -shift[1]),
+                              second)
+            self._screen.blit(before, first.move(pos).move(shift), first)
+        elif action == SMASH:
+            self._screen.blit(before, rect)
+            grown = max(round(size * progress), 1)
+            image = pygame.transform.scale(after, (grown, grown))
+            self._screen.blit(image, image.get_rect(center=rect.center))
+        else:
+            self._screen.blit(before, rect)
+            after.set_alpha(round(255 * progress))
+            self._screen.blit(after, rect)
+            after.set_alpha(255)
+
+        self._screen.set_clip(None)
+        self._overlay(rect)
 
     def highlight_block(self, pos: Tuple[int, int], size: int) -> None:
         """Draw a highlighted square border at pos with size.
         """
-        rect = (pos[0], pos[1], size, size)
+        self._clear_if_needed()
+        rect = pygame.Rect(pos[0], pos[1], size, size)
         pygame.draw.rect(self._screen, HIGHLIGHT_COLOUR, rect,
                          HIGHLIGHT_THICKNESS)
+        self._overlay(rect)
 
     def text_height(self) -> int:
         """Return the height between lines of text in pixels.
         """
         return self._font.size("Test")[1] + Y_FONT_PADDING
 
+    def _text_image(self, text: str,
+                    colour: Tuple[int, int, int] = TEXT_COLOUR) -> \
+            pygame.Surface:
+        """Return an image of <text> in <colour>, rendering it only if it is
+        not cached.
+        """
+        key = (text, colour)
+        if key in self._texts:
+            self._texts.move_to_end(key)
+            return self._texts[key]
+
+        image = self._font.render(text, 1, colour)
+        self._texts[key] = image
+        if len(self._texts) > TEXT_CACHE_SIZE:
+            self._texts.popitem(last=False)
+        return image
+
     def print(self, text: str, x: int, y: int) -> None:
         """Print <text> to the (<x>, <y>) location on the screen.
         """
-        _print_to_image(text, x, y, self._font, self._screen)
+        self._clear_if_needed()
+        self._overlay(self._screen.blit(self._text_image(text), (x, y)))
+
+    def draw_stats(self, lines: List[str]) -> None:
+        """Draw <lines> of text in a box at the top left corner of the board,
+        such as the statistics of FrameStats.overlay_lines.
+        """
+        self._clear_if_needed()
+        height = self.text_height()
+        images = [self._text_image(line) for line in lines]
+        width = max(image.get_width() for image in images)
+        rect = pygame.Rect(0, 0, width + 2 * STATS_PADDING,
+                           len(lines) * height + 2 * STATS_PADDING)
+        self._screen.fill(BACKGROUND_COLOUR, rect)
+        for i, image in enumerate(images):
+            self._screen.blit(image,
+                              (STATS_PADDING, STATS_PADDING + i * height))
+        self._overlay(rect)
 
     def draw_status(self, message: str) -> None:
-        """Draw the current status of the game.
+        """Draw the current status of the game, unless it is already shown.
         """
-        surface = self._font.render(message, 1, TEXT_COLOUR)
-        self._screen.blit(surface, self._status_position)
+        if message != self._status:
+            self._screen.fill(BACKGROUND_COLOUR, self._status_rect)
+            self._screen.blit(self._text_image(message),
+                              self._status_position)
+            self._mark_dirty(self._status_rect)
+            self._status = message
 
     def save_to_file(self, filename: str) -> None:
         """Save the current graphics on the screen to a file named <filename>.
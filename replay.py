@@ -0,0 +1,414 @@
+"""CSC148 Assignment 2
+
+=== CSC148 Winter 2020 ===
+Department of Computer Science,
+University of Toronto
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+Authors: Diane Horton, David Liu, Mario Badr, Sophia Huynh, Misha Schwartz,
+and Jaisie Sin
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) Diane Horton, David Liu, Mario Badr, Sophia Huynh,
+Misha Schwartz, and Jaisie Sin.
+
+=== Module Description ===
+
+This file contains the classes that record the moves of a Blocky game to a
+replay log, and that recreate the board at any point of a recorded game.
+
+A replay log is a binary file that is only ever appended to. It starts with a
+header, followed by records of two kinds:
+    - a move record for every successful move, in the order they were made,
+    - a checkpoint record with the whole board and penalty counts, before the
+      first move and after every <interval> moves.
+To recreate the board after a number of moves, a Replayer starts from the
+closest checkpoint and redoes at most <interval> moves.
+"""
+from __future__ import annotations
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+import bisect
+import os
+import random
+import struct
+
+from actions import ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, \
+    SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, PASS, PAINT, COMBINE
+from block import Block
+from engine import Engine, GameData, MoveObserver, apply_move
+from player import Player
+from settings import COLOUR_LIST
+
+# The actions, in the order of the codes used for them in a replay log.
+ACTIONS = [ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, SWAP_HORIZONTAL,
+           SWAP_VERTICAL, SMASH, COMBINE, PAINT, PASS]
+
+# The code used for a Block with children when encoding a board.
+_PARENT_CODE = 255
+
+# magic bytes, board size, max depth, checkpoint interval, number of players
+_HEADER = struct.Struct('<8sHBHB')
+_MAGIC = b'BLKYLOG1'
+# tag, move index, player ID, action code, x, y, level, argument
+_MOVE = struct.Struct('<cIBBHHBI')
+# tag, move index, length of the payload that follows
+_CHECKPOINT = struct.Struct('<cII')
+# player ID, smashes, combines, paints
+_COUNTS = struct.Struct('<BHHH')
+
+_MOVE_TAG = b'M'
+_CHECKPOINT_TAG = b'C'
+
+# A recorded move: the player ID, the action, the position and level of the
+# block it was done on, and its argument (the colour code for a PAINT, the
+# seed for a SMASH, and 0 otherwise).
+MoveRecord = Tuple[int, Tuple[str, Optional[int]], Tuple[int, int], int, int]
+
+
+def encode_board(board: Block) -> bytes:
+    """Return a compact encoding of the colours and structure of <board>.
+
+    Each Block is one byte, in pre-order: _PARENT_CODE for a Block with
+    children, or the index of its colour in COLOUR_LIST for a leaf.
+
+    Precondition: every leaf of <board> has a colour from COLOUR_LIST.
+    """
+    codes = bytearray()
+    _encode_block(board, codes)
+    return bytes(codes)
+
+
+def _encode_block(block: Block, codes: bytearray) -> None:
+    """Append the encoding of <block> to <codes>.
+    """
+    if len(block.children) == 0:
+        codes.append(COLOUR_LIST.index(block.colour))
+    else:
+        codes.append(_PARENT_CODE)
+        for child in block.children:
+            _encode_block(child, codes)
+
+
+def decode_board(codes: bytes, size: int, max_depth: int,
+                 position: Tuple[int, int] = (0, 0), level: int = 0) -> Block:
+    """Return the Block encoded in <codes> by encode_board, at <position> and
+    <level>, with dimensions of <size> by <size> and a depth of <max_depth>.
+    """
+    return _decode_block(iter(codes), position, size, level, max_depth)
+
+
+def _decode_block(codes: Iterator[int], position: Tuple[int, int], size: int,
+                  level: int, max_depth: int) -> Block:
+    """Return the Block whose encoding starts at the next code in <codes>,
+    consuming the codes of it and its descendants.
+    """
+    code = next(codes)
+    if code != _PARENT_CODE:
+        return Block(position, size, COLOUR_LIST[code], level, max_depth)
+
+    block = Block(position, size, None, level, max_depth)
+    child_size = round(size / 2.0)
+    x, y = position
+    positions = [(x + child_size, y), (x, y), (x, y + child_size),
+                 (x + child_size, y + child_size)]
+
+    for child_position in positions:
+        block.children.append(_decode_block(codes, child_position, child_size,
+                                            level + 1, max_depth))
+    return block
+
+
+def encoded_squares(codes: bytes, size: int,
+                    position: Tuple[int, int] = (0, 0)) -> \
+        List[Tuple[Tuple[int, int, int], Tuple[int, int], int]]:
+    """Return the squares to draw for the Block encoded in <codes> by
+    encode_board, at <position> with dimensions of <size> by <size>, in the
+    same form and order as Block.squares, without decoding the Block.
+    """
+    squares = []
+    # The positions and sizes of the Blocks whose codes come next, the next
+    # one last
+    blocks = [(position, size)]
+    for code in codes:
+        (x, y), size = blocks.pop()
+        if code != _PARENT_CODE:
+            squares.append((COLOUR_LIST[code], (x, y), size))
+        else:
+            child_size = round(size / 2.0)
+            blocks.extend([((x + child_size, y + child_size), child_size),
+                           ((x, y + child_size), child_size),
+                           ((x, y), child_size),
+                           ((x + child_size, y), child_size)])
+    return squares
+
+
+def find_block(board: Block, position: Tuple[int, int], level: int) -> \
+        Optional[Block]:
+    """Return the Block in <board> with the upper-left corner at <position>
+    and at <level>, or None if there is no such Block.
+    """
+    block = board
+    while block.level < level and block.children != []:
+        x, y = position
+        for child in block.children:
+            child_x, child_y = child.position
+            if child_x <= x < child_x + child.size and \
+                    child_y <= y < child_y + child.size:
+                block = child
+                break
+        else:
+            return None
+
+    if block.level == level and block.position == position:
+        return block
+    return None
+
+
+def move_argument(player: Player, action: Tuple[str, Optional[int]],
+                  seed: Optional[int]) -> int:
+    """Return the argument recorded for <action> done by <player>: the index
+    of the player's colour in COLOUR_LIST for a PAINT, <seed> for a SMASH,
+    and 0 otherwise.
+    """
+    if action == SMASH:
+        return seed
+    elif action == PAINT:
+        return COLOUR_LIST.index(player.goal.colour)
+    return 0
+
+
+def redo_move(board: Block, action: Tuple[str, Optional[int]],
+              position: Tuple[int, int], level: int, argument: int) -> bool:
+    """Do <action> again on the Block of <board> at <position> and <level>,
+    with the <argument> returned by move_argument when it was first done.
+
+    Return True iff the move was successful.
+    """
+    block = find_block(board, position, level)
+    if block is None:
+        return False
+
+    colour = COLOUR_LIST[argument] if action == PAINT else None
+    return apply_move((action[0], action[1], block), colour,
+                      random.Random(argument))
+
+
+class ReplayWriter(MoveObserver):
+    """A MoveObserver that appends every move of a game to a replay log.
+
+    === Public Attributes ===
+    interval:
+        The number of moves between checkpoints.
+    moves:
+        The number of moves recorded so far.
+    """
+    # === Private Attributes ===
+    # _file:
+    #   The replay log being written.
+    interval: int
+    moves: int
+    _file: BinaryIO
+
+    def __init__(self, path: str, data: GameData, interval: int = 50) -> None:
+        """Start a new replay log at <path> for the game in <data>, which has
+        not started yet, with a checkpoint every <interval> moves.
+
+        Precondition: 1 <= interval < 2 ** 16
+        """
+        self.interval = interval
+        self.moves = 0
+        self._file = open(path, 'wb')
+        self._file.write(_HEADER.pack(_MAGIC, data.board.size,
+                                      data.board.max_depth, interval,
+                                      len(data.players)))
+        self._write_checkpoint(data)
+
+    def _write_checkpoint(self, data: GameData) -> None:
+        """Append a checkpoint of the board and penalty counts in <data>.
+        """
+        payload = bytearray()
+        payload.append(len(data.players))
+        for player in data.players:
+            payload.extend(_COUNTS.pack(player.id, data.smashes[player.id],
+                                        data.combines[player.id],
+                                        data.paints[player.id]))
+        payload.extend(encode_board(data.board))
+
+        self._file.write(_CHECKPOINT.pack(_CHECKPOINT_TAG, self.moves,
+                                          len(payload)))
+        self._file.write(payload)
+        self._file.flush()
+
+    def move_done(self, engine: Engine, player: Player,
+                  move: Tuple[str, Optional[int], Block],
+                  seed: Optional[int]) -> None:
+        action = (move[0], move[1])
+        block = move[2]
+        argument = move_argument(player, action, seed)
+
+        self._file.write(_MOVE.pack(_MOVE_TAG, self.moves, player.id,
+                                    ACTIONS.index(action), block.position[0],
+                                    block.position[1], block.level, argument))
+        self.moves += 1
+
+        if self.moves % self.interval == 0:
+            self._write_checkpoint(engine.data)
+        else:
+            self._file.flush()
+
+    def close(self) -> None:
+        """Close the replay log. No more moves can be recorded.
+        """
+        self._file.close()
+
+
+class Replayer:
+    """A recorded game, read from a replay log.
+
+    === Public Attributes ===
+    size:
+        The size of the board.
+    max_depth:
+        The maximum depth of the board.
+    interval:
+        The number of moves between checkpoints.
+    num_players:
+        The number of players in the game.
+    moves:
+        The recorded moves, in the order they were made.
+    """
+    # === Private Attributes ===
+    # _path:
+    #   The path of the replay log.
+    # _checkpoints:
+    #   The number of moves made before each checkpoint, in increasing order.
+    # _offsets:
+    #   The position in the replay log and the length of the payload of each
+    #   checkpoint.
+    size: int
+    max_depth: int
+    interval: int
+    num_players: int
+    moves: List[MoveRecord]
+    _path: str
+    _checkpoints: List[int]
+    _offsets: List[Tuple[int, int]]
+
+    def __init__(self, path: str) -> None:
+        """Read the replay log at <path>, without decoding any boards.
+        """
+        self._path = path
+        self.moves = []
+        self._checkpoints = []
+        self._offsets = []
+
+        with open(path, 'rb') as log:
+            magic, self.size, self.max_depth, self.interval, \
+                self.num_players = _HEADER.unpack(log.read(_HEADER.size))
+            if magic != _MAGIC:
+                raise ValueError(f'{path} is not a Blocky replay log')
+            end = os.fstat(log.fileno()).st_size
+
+            # Stop at the end of the log, or at a record that was cut off
+            # because the game was still being written or was interrupted
+            while True:
+                tag = log.read(1)
+                if tag == _MOVE_TAG:
+                    data = tag + log.read(_MOVE.size - 1)
+                    if len(data) < _MOVE.size:
+                        break
+                    fields = _MOVE.unpack(data)
+                    _, _, player_id, code, x, y, level, argument = fields
+                    self.moves.append((player_id, ACTIONS[code], (x, y),
+                                       level, argument))
+                elif tag == _CHECKPOINT_TAG:
+                    data = tag + log.read(_CHECKPOINT.size - 1)
+                    if len(data) < _CHECKPOINT.size:
+                        break
+                    fields = _CHECKPOINT.unpack(data)
+                    if log.tell() + fields[2] > end:
+                        break
+                    self._checkpoints.append(fields[1])
+                    self._offsets.append((log.tell(), fields[2]))
+                    log.seek(fields[2], 1)
+                else:
+                    break
+
+    def __len__(self) -> int:
+        """Return the number of moves recorded.
+        """
+        return len(self.moves)
+
+    def state_at(self, index: int) -> \
+            Tuple[Block, Dict[int, Tuple[int, int, int]]]:
+        """Return the board after the first <index> moves of the game, and a
+        dictionary mapping each player ID to the number of smashes, combines
+        and paints that player had done by then.
+
+        Precondition: 0 <= index <= len(self)
+        """
+        i = bisect.bisect_right(self._checkpoints, index) - 1
+        board, counts = self._read_checkpoint(*self._offsets[i])
+
+        for player_id, action, position, level, argument in \
+                self.moves[self._checkpoints[i]:index]:
+            redo_move(board, action, position, level, argument)
+
+            smashes, combines, paints = counts[player_id]
+            counts[player_id] = (smashes + int(action == SMASH),
+                                 combines + int(action == COMBINE),
+                                 paints + int(action == PAINT))
+
+        return board, counts
+
+    def board_at(self, index: int) -> Block:
+        """Return the board after the first <index> moves of the game.
+
+        Precondition: 0 <= index <= len(self)
+        """
+        return self.state_at(index)[0]
+
+    def board_at_turn(self, turn: int) -> Block:
+        """Return the board at the start of <turn>, before any player has moved
+        in that turn.
+
+        Precondition: 0 <= turn * self.num_players <= len(self)
+        """
+        return self.board_at(turn * self.num_players)
+
+    def _read_checkpoint(self, offset: int, length: int) -> \
+            Tuple[Block, Dict[int, Tuple[int, int, int]]]:
+        """Return the board and penalty counts of the checkpoint whose payload
+        of <length> bytes is at <offset> in the replay log.
+        """
+        with open(self._path, 'rb') as log:
+            log.seek(offset)
+            payload = log.read(length)
+
+        num_players = payload[0]
+        counts = {}
+        for i in range(num_players):
+            player_id, smashes, combines, paints = \
+                _COUNTS.unpack_from(payload, 1 + i * _COUNTS.size)
+            counts[player_id] = (smashes, combines, paints)
+
+        codes = payload[1 + num_players * _COUNTS.size:]
+        return decode_board(codes, self.size, self.max_depth), counts
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-io': ['__init__', '_read_checkpoint'],
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'typing', '__future__', 'bisect', 'random',
+            'os', 'struct', 'actions', 'block', 'engine', 'player',
+            'settings'
+        ]
+    })
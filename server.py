@@ -0,0 +1,525 @@
+"""CSC148 Assignment 2
+
+=== CSC148 Winter 2020 ===
+Department of Computer Science,
+University of Toronto
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+Authors: Diane Horton, David Liu, Mario Badr, Sophia Huynh, Misha Schwartz,
+and Jaisie Sin
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) Diane Horton, David Liu, Mario Badr, Sophia Huynh,
+Misha Schwartz, and Jaisie Sin.
+
+=== Module Description ===
+
+This file contains a server that hosts many games of Blocky at once, and a
+client that load-tests it.
+
+Clients send requests as lines of JSON over a TCP connection or stdin, and the
+server answers each with a line of JSON on the same connection or stdout.
+Every request may have an "id", which is copied into its response, so that a
+client can send several requests without waiting for their responses.
+Responses to requests about different games can arrive in any order.
+
+The requests are:
+    {"op": "new", "max_depth": 3, "humans": 1, "random": 0, "smart": [5],
+     "turns": 5, "seed": 1}
+        Start a new game. Every key except "op" is optional.
+    {"op": "move", "game": 1, "action": "rotate", "direction": 1,
+     "position": [0, 0], "level": 1}
+        Make a move for the human player whose turn it is, in the game with
+        ID 1. The block is the one at <position> and <level>, as selected by
+        a HumanPlayer.
+    {"op": "state", "game": 1}
+        Get the state of a game.
+    {"op": "close", "game": 1}
+        Stop hosting a game.
+
+After a game starts, and after every move by a human player, the computer
+players make their moves until it is a human player's turn or the game is
+over. Their moves are computed in an executor, so a slow SmartPlayer never
+stops the server from answering requests about other games.
+
+Successful responses contain "ok": true and the state of the game, including
+the board encoded by replay.encode_board in hexadecimal. Failed requests get
+"ok": false and an "error" message.
+
+Run this file to start a server or to load-test one, e.g.:
+    python server.py serve --port 8765
+    python server.py serve --stdio
+    python server.py load --games 200 --concurrency 50
+"""
+from __future__ import annotations
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import statistics
+import sys
+import time
+
+from actions import ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, \
+    SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, PASS, PAINT, COMBINE
+from block import Block, generate_board
+from engine import Engine, GameData
+from player import _get_block, create_players, HumanPlayer
+from replay import decode_board, encode_board
+from settings import BOARD_SIZE
+
+# The actions that can be requested by name and direction
+_ACTIONS = [ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, SWAP_HORIZONTAL,
+            SWAP_VERTICAL, SMASH, COMBINE, PAINT, PASS]
+
+# A request or response
+Message = Dict[str, Any]
+
+
+class _Session:
+    """A game hosted by a GameServer.
+
+    === Public Attributes ===
+    engine:
+        The Engine playing the game.
+    lock:
+        Held while the game is read or changed, so that the moves of the
+        computer players are not seen half done.
+    """
+    engine: Engine
+    lock: asyncio.Lock
+
+    def __init__(self, engine: Engine) -> None:
+        """Initialize this _Session to host the game played by <engine>.
+        """
+        self.engine = engine
+        self.lock = asyncio.Lock()
+
+    def human_turn(self) -> bool:
+        """Return True iff it is a human player's turn.
+        """
+        return isinstance(self.engine.current_player(), HumanPlayer)
+
+    def state(self) -> Message:
+        """Return a response describing the state of this game.
+        """
+        data = self.engine.data
+        over = self.engine.is_over()
+        return {
+            'ok': True,
+            'turn': self.engine.turn,
+            'max_turns': data.max_turns,
+            'over': over,
+            'player': None if over else self.engine.current_player().id,
+            'human': not over and self.human_turn(),
+            'size': data.board.size,
+            'max_depth': data.board.max_depth,
+            'board': encode_board(data.board).hex(),
+            'goals': [p.goal.description() for p in data.players],
+            'scores': [list(score) for score in self.engine.scores()]
+        }
+
+
+class GameServer:
+    """A server that hosts many games of Blocky at once.
+
+    === Public Attributes ===
+    max_games:
+        The most games that can be hosted at once.
+    """
+    # === Private Attributes ===
+    # _games:
+    #   The games being hosted, by ID.
+    # _ids:
+    #   The IDs to give new games.
+    # _executor:
+    #   The executor that computes the moves of computer players. It runs
+    #   them in the same process, since players keep caches between turns.
+    max_games: int
+    _games: Dict[int, _Session]
+    _ids: itertools.count
+    _executor: Executor
+
+    def __init__(self, max_games: int = 1000,
+                 executor: Optional[Executor] = None) -> None:
+        """Initialize this GameServer to host at most <max_games> games, and
+        compute the moves of computer players in <executor>, or a new
+        ThreadPoolExecutor if <executor> is None.
+        """
+        self.max_games = max_games
+        self._games = {}
+        self._ids = itertools.count(1)
+        self._executor = executor or ThreadPoolExecutor()
+
+    def __len__(self) -> int:
+        """Return the number of games being hosted.
+        """
+        return len(self._games)
+
+    async def handle_request(self, request: Message,
+                             owned: Set[int]) -> Message:
+        """Return the response to <request>, adding the IDs of the games it
+        starts to <owned> and removing the IDs of the games it closes.
+        """
+        try:
+            op = request.get('op')
+            if op == 'new':
+                response = await self._new_game(request, owned)
+            elif op in ('move', 'state', 'close'):
+                game_id = request.get('game')
+                if game_id not in self._games:
+                    raise ValueError(f'there is no game {game_id}')
+
+                session = self._games[game_id]
+                async with session.lock:
+                    if op == 'move':
+                        await self._human_move(session, request)
+                    elif op == 'close':
+                        del self._games[game_id]
+                        owned.discard(game_id)
+                    response = session.state()
+                response['game'] = game_id
+            else:
+                raise ValueError(f'unknown op {op!r}')
+        except (KeyError, TypeError, ValueError) as e:
+            response = {'ok': False, 'error': str(e)}
+        except Exception as e:
+            # Any other error is a bug, but only fails this request rather
+            # than every game of the connection
+            response = {'ok': False, 'error': f'internal error: {e!r}'}
+
+        if 'id' in request:
+            response['id'] = request['id']
+        return response
+
+    async def _new_game(self, request: Message, owned: Set[int]) -> Message:
+        """Start the game described by <request> and return its state.
+        """
+        if len(self._games) >= self.max_games:
+            raise ValueError('too many games')
+
+        max_depth = int(request.get('max_depth', 3))
+        humans = int(request.get('humans', 1))
+        smart = [int(level) for level in request.get('smart', [])]
+        num_random = int(request.get('random', 0 if smart else 1))
+        if not 0 <= max_depth <= 5 or \
+                not 1 <= humans + num_random + len(smart) <= 4:
+            raise ValueError('invalid board depth or number of players')
+
+        rng = random.Random(request.get('seed'))
+        board = generate_board(max_depth, BOARD_SIZE, rng)
+        players = create_players(humans, num_random, smart, rng)
+        data = GameData(board, players, rng)
+        data.max_turns = int(request.get('turns', 5))
+
+        game_id = next(self._ids)
+        session = _Session(Engine(data))
+        self._games[game_id] = session
+        owned.add(game_id)
+
+        async with session.lock:
+            await self._computer_moves(session)
+            response = session.state()
+        response['game'] = game_id
+        return response
+
+    async def _human_move(self, session: _Session, request: Message) -> None:
+        """Make the move in <request> for the human player whose turn it is in
+        <session>, then let the computer players move.
+
+        Precondition: the caller holds session.lock.
+        """
+        if session.engine.is_over() or not session.human_turn():
+            raise ValueError('it is not a human player\'s turn')
+
+        action = (request['action'], request.get('direction'))
+        if action not in _ACTIONS:
+            raise ValueError(f'unknown action {action}')
+
+        x, y = request.get('position', (0, 0))
+        block = _get_block(session.engine.data.board, (int(x), int(y)),
+                           int(request.get('level', 0)))
+        if block is None or not session.engine.do_move(
+                (action[0], action[1], block)):
+            raise ValueError('invalid move')
+
+        await self._computer_moves(session)
+
+    async def _computer_moves(self, session: _Session) -> None:
+        """Let the computer players in <session> move until it is a human
+        player's turn or the game is over.
+
+        Precondition: the caller holds session.lock.
+        """
+        loop = asyncio.get_running_loop()
+        engine = session.engine
+        while not engine.is_over() and not session.human_turn():
+            await loop.run_in_executor(self._executor, engine.play_turn)
+
+    async def handle_lines(self, reader: asyncio.StreamReader,
+                           send: Callable[[str], None]) -> None:
+        """Answer every request read from <reader>, passing each response to
+        <send> as a line of JSON, until <reader> is closed.
+
+        Requests are answered concurrently. The games started by these
+        requests are closed when <reader> is closed.
+        """
+        owned = set()
+        pending = set()
+
+        async def answer(line: bytes) -> None:
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError('a request must be a JSON object')
+            except ValueError as e:
+                response = {'ok': False, 'error': str(e)}
+            else:
+                response = await self.handle_request(request, owned)
+            send(json.dumps(response) + '\n')
+
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if line.strip():
+                task = asyncio.ensure_future(answer(line))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+
+        if pending:
+            await asyncio.wait(pending)
+        for game_id in owned:
+            self._games.pop(game_id, None)
+
+    async def serve_tcp(self, host: str, port: int) -> asyncio.AbstractServer:
+        """Start accepting connections on <host> and <port>, and return the
+        asyncio server accepting them.
+        """
+        async def connected(reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter) -> None:
+            await self.handle_lines(reader, lambda text: writer.write(
+                text.encode()))
+            writer.close()
+
+        return await asyncio.start_server(connected, host, port)
+
+    async def serve_stdio(self) -> None:
+        """Answer requests from stdin on stdout until stdin is closed.
+        """
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+        def send(text: str) -> None:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+
+        await self.handle_lines(reader, send)
+
+
+class LoadClient:
+    """A connection to a GameServer that can have many requests in flight.
+    """
+    # === Private Attributes ===
+    # _reader, _writer:
+    #   The two ends of the connection.
+    # _ids:
+    #   The IDs to give requests.
+    # _waiting:
+    #   The futures to set to the responses of requests, by request ID.
+    # _listener:
+    #   The task reading responses.
+    _reader: asyncio.StreamReader
+    _writer: asyncio.StreamWriter
+    _ids: itertools.count
+    _waiting: Dict[int, asyncio.Future]
+    _listener: asyncio.Task
+
+    def __init__(self, reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter) -> None:
+        """Initialize this LoadClient to send requests on <writer> and read
+        their responses from <reader>.
+        """
+        self._reader = reader
+        self._writer = writer
+        self._ids = itertools.count()
+        self._waiting = {}
+        self._listener = asyncio.ensure_future(self._listen())
+
+    async def _listen(self) -> None:
+        """Pass each response to the request waiting for it.
+        """
+        while True:
+            line = await self._reader.readline()
+            if not line:
+                break
+            response = json.loads(line)
+            future = self._waiting.pop(response.get('id'), None)
+            if future is not None:
+                future.set_result(response)
+
+    async def request(self, request: Message) -> Message:
+        """Send <request> and return its response.
+        """
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[request_id] = future
+        self._writer.write((json.dumps(dict(request, id=request_id)) +
+                            '\n').encode())
+        return await future
+
+    async def close(self) -> None:
+        """Close the connection, after the server has answered every request
+        and closed its end.
+        """
+        self._writer.write_eof()
+        await self._listener
+        self._writer.close()
+
+
+async def _play_remote_game(client: LoadClient, game: Message,
+                            rng: random.Random, latencies: List[float]) -> None:
+    """Play a game on the server as a human player that makes random moves,
+    adding the time taken by each request to <latencies>.
+    """
+    async def timed(request: Message) -> Message:
+        start = time.perf_counter()
+        response = await client.request(request)
+        latencies.append(time.perf_counter() - start)
+        if not response['ok'] and request['op'] != 'move':
+            raise RuntimeError(response['error'])
+        return response
+
+    state = await timed(game)
+    game_id = state['game']
+
+    while not state['over']:
+        board = decode_board(bytes.fromhex(state['board']), state['size'],
+                             state['max_depth'])
+        block = _random_block(board, rng)
+        action = rng.choice(_ACTIONS)
+        response = await timed({'op': 'move', 'game': game_id,
+                                'action': action[0], 'direction': action[1],
+                                'position': block.position,
+                                'level': block.level})
+        if not response['ok']:
+            response = await timed({'op': 'move', 'game': game_id,
+                                    'action': 'pass'})
+        state = response
+
+    await timed({'op': 'close', 'game': game_id})
+
+
+def _random_block(board: Block, rng: random.Random) -> Block:
+    """Return a Block of <board> chosen by walking down from its root.
+    """
+    block = board
+    while block.children and rng.random() < 0.6:
+        block = rng.choice(block.children)
+    return block
+
+
+async def load_test(host: str, port: int, games: int, concurrency: int,
+                    connections: int = 4, max_depth: int = 3,
+                    smart: Optional[List[int]] = None,
+                    seed: int = 0) -> Message:
+    """Play <games> games against the server on <host> and <port>, with at
+    most <concurrency> games in progress at once over <connections>
+    connections. Each game has one human player that makes random moves, and
+    a SmartPlayer for each difficulty in <smart>.
+
+    Return a summary of the games played per second and the time taken by
+    the requests.
+    """
+    clients = []
+    for dummy in range(connections):
+        reader, writer = await asyncio.open_connection(host, port)
+        clients.append(LoadClient(reader, writer))
+
+    latencies = []
+    remaining = iter(range(games))
+
+    async def worker(worker_id: int) -> None:
+        rng = random.Random(seed + worker_id)
+        client = clients[worker_id % connections]
+        for game_number in remaining:
+            game = {'op': 'new', 'max_depth': max_depth, 'humans': 1,
+                    'random': 0 if smart else 1, 'smart': smart or [],
+                    'turns': 5, 'seed': seed + game_number}
+            await _play_remote_game(client, game, rng, latencies)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(i) for i in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+    for client in clients:
+        await client.close()
+
+    latencies.sort()
+    return {
+        'games': games,
+        'seconds': elapsed,
+        'games_per_second': games / elapsed,
+        'requests': len(latencies),
+        'median_ms': statistics.median(latencies) * 1000,
+        'p99_ms': latencies[int(0.99 * (len(latencies) - 1))] * 1000
+    }
+
+
+async def _main(args: argparse.Namespace) -> None:
+    """Run the server or load test described by the command line <args>.
+    """
+    server = GameServer(args.max_games)
+
+    if args.command == 'serve' and args.stdio:
+        await server.serve_stdio()
+    elif args.command == 'serve':
+        tcp_server = await server.serve_tcp(args.host, args.port)
+        async with tcp_server:
+            await tcp_server.serve_forever()
+    else:
+        # Start a server in this process unless one was given
+        port = args.port
+        if port is None:
+            tcp_server = await server.serve_tcp(args.host, 0)
+            port = tcp_server.sockets[0].getsockname()[1]
+
+        summary = await load_test(args.host, port, args.games,
+                                  args.concurrency, args.connections,
+                                  args.max_depth, args.smart)
+        print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Host many games of Blocky, or load-test a server.')
+    parser.add_argument('command', choices=['serve', 'load'])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=None,
+                        help='the port to serve on (default 8765), or the '
+                             'port of the server to load-test (default: '
+                             'start one in this process)')
+    parser.add_argument('--stdio', action='store_true',
+                        help='serve on stdin and stdout instead of TCP')
+    parser.add_argument('--max-games', type=int, default=1000)
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--connections', type=int, default=4)
+    parser.add_argument('--max-depth', type=int, default=3)
+    parser.add_argument('--smart', type=int, nargs='*', default=[],
+                        help='difficulties of the SmartPlayers in each game')
+    arguments = parser.parse_args()
+    if arguments.command == 'serve' and arguments.port is None:
+        arguments.port = 8765
+
+    asyncio.run(_main(arguments))
@@ -54,6 +54,8 @@ HIGHLIGHT_THICKNESS = 5
 
 # The number of seconds a move is animated for.
 ANIMATION_DURATION = 1
+# The most frames per second that are drawn while a move is animated.
+ANIMATION_FPS = 60
 
 
 def colour_name(colour: Tuple[int, int, int]) -> str:
@@ -0,0 +1,205 @@
+"""CSC148 Assignment 2
+
+=== CSC148 Winter 2020 ===
+Department of Computer Science,
+University of Toronto
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+Authors: Diane Horton, David Liu, Mario Badr, Sophia Huynh, Misha Schwartz,
+and Jaisie Sin
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) Diane Horton, David Liu, Mario Badr, Sophia Huynh,
+Misha Schwartz, and Jaisie Sin.
+
+=== Module Description ===
+
+This file contains functions that draw small thumbnails of many boards into
+PNG image atlases, using a pool of processes, e.g.:
+    python thumbnails.py boards.txt thumbnails/ --size 64
+
+The boards are read from a file with a board per line, encoded by
+replay.encode_board in hexadecimal, like the boards sent to bots. Each atlas
+is a grid of <columns> by <rows> thumbnails, filled row by row, so board i is
+in atlas i // (columns * rows). The layout and the names of the atlases are
+written to atlases.json in the output directory.
+"""
+from __future__ import annotations
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import struct
+import zlib
+import numpy
+
+from raster import draw_squares, PALETTE
+from replay import encoded_squares
+
+# The width and height of a thumbnail, in pixels.
+THUMBNAIL_SIZE = 64
+
+# The thickness of the outline of blocks in a thumbnail.
+THUMBNAIL_OUTLINE = 1
+
+# The number of thumbnails in each row and column of an atlas.
+ATLAS_COLUMNS = 32
+ATLAS_ROWS = 32
+
+# The most atlases that are waiting to be drawn by each process, which bounds
+# the number of boards in memory however many there are.
+_QUEUED_PER_PROCESS = 2
+
+# How the processes are started. Forking a process that has started other
+# threads, such as pygame's, can leave the new process waiting for a lock
+# forever, so the processes are started afresh.
+_START_METHOD = 'spawn'
+
+
+def write_png(file: BinaryIO, frame: numpy.ndarray,
+              palette: List[Tuple[int, int, int]]) -> None:
+    """Write <frame>, an array of indices in <palette> indexed by row, then
+    column, to <file> as a PNG image with 8-bit palette indices.
+    """
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data \
+            + struct.pack('>I', zlib.crc32(kind + data))
+
+    height, width = frame.shape
+    # Every row starts with the number of its filter, 0 for none
+    rows = numpy.zeros((height, width + 1), dtype=numpy.uint8)
+    rows[:, 1:] = frame
+
+    file.write(b'\x89PNG\r\n\x1a\n'
+               + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 3,
+                                            0, 0, 0))
+               + chunk(b'PLTE', b''.join(bytes(colour) for colour in palette))
+               + chunk(b'IDAT', zlib.compress(rows.tobytes(), 6))
+               + chunk(b'IEND', b''))
+
+
+def draw_atlas(boards: List[bytes], size: int = THUMBNAIL_SIZE,
+               columns: int = ATLAS_COLUMNS) -> numpy.ndarray:
+    """Return an atlas of thumbnails of <boards>, encoded by
+    replay.encode_board, each <size> by <size> pixels, <columns> to a row.
+
+    The atlas is an array of indices in raster.PALETTE indexed by row, then
+    column, with as many rows of thumbnails as <boards> need.
+    """
+    num_rows = max((len(boards) + columns - 1) // columns, 1)
+    # Index 0 of PALETTE is the background colour
+    atlas = numpy.zeros((num_rows * size, columns * size), dtype=numpy.uint8)
+    for i, codes in enumerate(boards):
+        row, column = divmod(i, columns)
+        draw_squares(atlas, encoded_squares(codes, size, (column * size,
+                                                          row * size)),
+                     THUMBNAIL_OUTLINE)
+    return atlas
+
+
+def _write_atlas(task: Tuple[str, List[bytes], int, int]) -> int:
+    """Draw the atlas of a task made by make_atlases, and write it to a PNG
+    file. Return the number of thumbnails in the atlas.
+
+    <task> is the path of the file, the encoded boards, the size of the
+    thumbnails and the number of columns.
+    """
+    path, boards, size, columns = task
+    atlas = draw_atlas(boards, size, columns)
+    with open(path, 'wb') as file:
+        write_png(file, atlas, PALETTE)
+    return len(boards)
+
+
+def read_boards(path: str) -> Iterator[bytes]:
+    """Yield the boards in the file at <path>, one per line, encoded by
+    replay.encode_board in hexadecimal.
+    """
+    with open(path) as file:
+        for line in file:
+            line = line.strip()
+            if line != '':
+                yield bytes.fromhex(line)
+
+
+def _atlas_tasks(boards: Iterable[bytes], directory: str, size: int,
+                 columns: int, rows: int) -> \
+        Iterator[Tuple[str, List[bytes], int, int]]:
+    """Yield the tasks for _write_atlas that draw thumbnails of <boards> into
+    atlases in <directory>, as described by make_atlases.
+    """
+    atlas = []
+    number = 0
+    for codes in boards:
+        atlas.append(codes)
+        if len(atlas) == columns * rows:
+            yield os.path.join(directory, f'atlas{number:05}.png'), atlas, \
+                size, columns
+            atlas = []
+            number += 1
+
+    if len(atlas) > 0:
+        yield os.path.join(directory, f'atlas{number:05}.png'), atlas, size, \
+            columns
+
+
+def make_atlases(boards: Iterable[bytes], directory: str,
+                 size: int = THUMBNAIL_SIZE, columns: int = ATLAS_COLUMNS,
+                 rows: int = ATLAS_ROWS,
+                 processes: Optional[int] = None) -> int:
+    """Write thumbnails of <boards>, encoded by replay.encode_board, to PNG
+    atlases in <directory>, using a pool of <processes> processes, or one per
+    CPU if <processes> is None. Return the number of boards.
+
+    Each thumbnail is <size> by <size> pixels, and each atlas holds
+    <columns> by <rows> of them. The layout and the names of the atlases are
+    written to atlases.json in <directory>.
+
+    <boards> are read as the atlases are drawn, so they can come from a
+    generator of any length.
+    """
+    os.makedirs(directory, exist_ok=True)
+    limit = _QUEUED_PER_PROCESS * (processes or os.cpu_count() or 1)
+    names = []
+    count = 0
+
+    context = multiprocessing.get_context(_START_METHOD)
+    with context.Pool(processes) as pool:
+        waiting = collections.deque()
+        for task in _atlas_tasks(boards, directory, size, columns, rows):
+            names.append(os.path.basename(task[0]))
+            waiting.append(pool.apply_async(_write_atlas, (task,)))
+            if len(waiting) >= limit:
+                count += waiting.popleft().get()
+
+        while len(waiting) > 0:
+            count += waiting.popleft().get()
+
+    with open(os.path.join(directory, 'atlases.json'), 'w') as file:
+        json.dump({'thumbnail_size': size, 'columns': columns, 'rows': rows,
+                   'count': count, 'atlases': names}, file)
+    return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Draw thumbnails of boards into PNG atlases.')
+    parser.add_argument('boards',
+                        help='a file of boards in hexadecimal, one per line')
+    parser.add_argument('directory', help='where to write the atlases')
+    parser.add_argument('--size', type=int, default=THUMBNAIL_SIZE)
+    parser.add_argument('--columns', type=int, default=ATLAS_COLUMNS)
+    parser.add_argument('--rows', type=int, default=ATLAS_ROWS)
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args()
+
+    total = make_atlases(read_boards(args.boards), args.directory, args.size,
+                         args.columns, args.rows, args.processes)
+    print(f'{total} thumbnails written to {args.directory}')
@@ -0,0 +1,157 @@
+"""CSC148 Assignment 2
+
+=== CSC148 Winter 2020 ===
+Department of Computer Science,
+University of Toronto
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+Authors: Diane Horton, David Liu, Mario Badr, Sophia Huynh, Misha Schwartz,
+and Jaisie Sin
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) Diane Horton, David Liu, Mario Badr, Sophia Huynh,
+Misha Schwartz, and Jaisie Sin.
+
+=== Module Description ===
+
+This file contains functions for running tournaments of many games between
+computer players, spread over several processes.
+
+Each game in a tournament is identified by a seed, so that any game can be
+played again with the same board, goals and moves.
+
+Run this file to play a tournament from the command line, e.g.:
+    python tournament.py --depths 3 4 --mixes 0:2 1:1 --difficulties 5 10
+"""
+from __future__ import annotations
+from typing import Dict, Iterator, List, Optional, Tuple
+import argparse
+import json
+import multiprocessing
+import random
+import time
+
+from block import generate_board
+from engine import Engine, GameData
+from player import create_players
+from settings import BOARD_SIZE
+
+# A game to play: its seed, the maximum depth of its board, the number of
+# random players, the difficulty of each smart player, and the number of turns.
+Task = Tuple[int, int, int, Tuple[int, ...], int]
+
+
+def play_game(task: Task) -> Dict:
+    """Play the game described by <task> without a display and return a
+    dictionary describing its result.
+    """
+    seed, max_depth, num_random, smart_players, num_turns = task
+
+    rng = random.Random(seed)
+    board = generate_board(max_depth, BOARD_SIZE, rng)
+    players = create_players(0, num_random, list(smart_players), rng)
+
+    data = GameData(board, players, rng)
+    data.max_turns = num_turns
+    engine = Engine(data)
+
+    start = time.perf_counter()
+    scores = engine.play()
+    elapsed = time.perf_counter() - start
+
+    return {
+        'seed': seed,
+        'max_depth': max_depth,
+        'num_random': num_random,
+        'smart_players': list(smart_players),
+        'num_turns': num_turns,
+        'goal': type(players[0].goal).__name__,
+        'scores': [[player_id, score, penalty]
+                   for player_id, score, penalty in scores],
+        'winner': engine.winner(),
+        'seconds': elapsed
+    }
+
+
+def generate_tasks(depths: List[int], mixes: List[Tuple[int, int]],
+                   difficulties: List[int], games: int, num_turns: int,
+                   seed: int = 0) -> Iterator[Task]:
+    """Yield the games of a tournament over every combination of a maximum
+    depth in <depths>, a mix of players in <mixes> and a difficulty in
+    <difficulties>, playing <games> games of <num_turns> turns each.
+
+    Each mix is a pair of the number of random players and the number of smart
+    players, who all get the same difficulty. Games are given consecutive
+    seeds, starting from <seed>.
+
+    Precondition: every mix has between 1 and 4 players.
+    """
+    for max_depth in depths:
+        for num_random, num_smart in mixes:
+            # The difficulty is irrelevant when there are no smart players
+            levels = difficulties if num_smart > 0 else difficulties[:1]
+            for difficulty in levels:
+                for dummy in range(games):
+                    yield (seed, max_depth, num_random,
+                           (difficulty,) * num_smart, num_turns)
+                    seed += 1
+
+
+def run_tournament(tasks: Iterator[Task], output_path: str,
+                   processes: Optional[int] = None,
+                   chunk_size: int = 4) -> float:
+    """Play every game in <tasks> using a pool of <processes> processes, or
+    one per CPU if <processes> is None. Append the result of each game to the
+    file at <output_path> as a line of JSON as soon as it is done.
+
+    Results are written in the order games finish, not the order of <tasks>.
+    Return the number of games played per second.
+    """
+    count = 0
+    start = time.perf_counter()
+
+    with open(output_path, 'a') as output, \
+            multiprocessing.Pool(processes) as pool:
+        for result in pool.imap_unordered(play_game, tasks, chunk_size):
+            output.write(json.dumps(result) + '\n')
+            output.flush()
+            count += 1
+
+    elapsed = time.perf_counter() - start
+    return count / elapsed if elapsed > 0 else 0.0
+
+
+def _parse_mix(text: str) -> Tuple[int, int]:
+    """Return the mix of players described by <text>, which has the form
+    '<number of random players>:<number of smart players>'.
+    """
+    num_random, num_smart = text.split(':')
+    return int(num_random), int(num_smart)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Play a tournament of Blocky games between computer '
+                    'players.')
+    parser.add_argument('--depths', type=int, nargs='+', default=[3])
+    parser.add_argument('--mixes', type=_parse_mix, nargs='+',
+                        default=[(1, 1)],
+                        help='random:smart player counts, e.g. 1:1')
+    parser.add_argument('--difficulties', type=int, nargs='+', default=[5])
+    parser.add_argument('--games', type=int, default=10,
+                        help='games per combination of the options above')
+    parser.add_argument('--turns', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--output', default='tournament.jsonl')
+    args = parser.parse_args()
+
+    game_tasks = generate_tasks(args.depths, args.mixes, args.difficulties,
+                                args.games, args.turns, args.seed)
+    rate = run_tournament(game_tasks, args.output, args.processes)
+    print(f'{rate:.2f} games/sec, results appended to {args.output}')